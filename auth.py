@@ -1,52 +1,65 @@
 import webbrowser
 import logging
-from fyers_apiv3 import fyersModel
 from config import config
+from paths import LOG_FILE_PATH
 
-logging.basicConfig(filename="fyers_auth_log.txt", level=logging.INFO, format="%(asctime)s - %(message)s")
+logger = logging.getLogger("fyers_auth")
+_session = None
 
-session = fyersModel.SessionModel(
-    client_id=config.CLIENT_ID,
-    secret_key=config.SECRET_KEY,
-    redirect_uri=config.REDIRECT_URI,
-    response_type=config.RESPONSE_TYPE,
-    grant_type=config.GRANT_TYPE
-)
+def _get_session():
+    """Build the SessionModel (and file logging) on first use rather than at import."""
+    global _session
+    if _session is None:
+        from fyers_apiv3 import fyersModel
+        if not logger.handlers:
+            handler = logging.FileHandler(LOG_FILE_PATH)
+            handler.setFormatter(logging.Formatter("%(asctime)s - %(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+        _session = fyersModel.SessionModel(
+            client_id=config.CLIENT_ID,
+            secret_key=config.SECRET_KEY,
+            redirect_uri=config.REDIRECT_URI,
+            response_type=config.RESPONSE_TYPE,
+            grant_type=config.GRANT_TYPE
+        )
+    return _session
 
 def authenticate():
-    url = session.generate_authcode()
+    url = _get_session().generate_authcode()
     webbrowser.open(url)
-    logging.info("Opened Fyers login URL in browser.")
+    logger.info("Opened Fyers login URL in browser.")
 
 def generate_token(auth_code: str):
+    session = _get_session()
     if not auth_code:
-        logging.warning("No auth code entered.")
+        logger.warning("No auth code entered.")
         return False
 
     session.set_token(auth_code)
     response = session.generate_token()
-    logging.info("Attempted to generate token.")
+    logger.info("Attempted to generate token.")
 
     if response.get("s") == "ok":
         access = response["access_token"]
         refresh = response["refresh_token"]
         config.set_tokens(access, refresh)
         config.save_tokens_to_file(access, refresh)
-        logging.info("Tokens saved successfully.")
+        logger.info("Tokens saved successfully.")
         return True
     else:
-        logging.error(f"Token generation failed: {response.get('message')}")
+        logger.error(f"Token generation failed: {response.get('message')}")
         return False
 
 def refresh_token():
-    response = session.refresh_token()
+    response = _get_session().refresh_token()
     if response.get("s") == "ok":
         access = response["access_token"]
         refresh = response["refresh_token"]
         config.set_tokens(access, refresh)
         config.save_tokens_to_file(access, refresh)
-        logging.info("Token refreshed successfully.")
+        logger.info("Token refreshed successfully.")
         return True
     else:
-        logging.error("Token refresh failed.")
-        return False
\ No newline at end of file
+        logger.error("Token refresh failed.")
+        return False
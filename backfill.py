@@ -0,0 +1,372 @@
+"""
+Gap detection and historical backfill.
+
+Finds per-symbol intervals the collector missed, either by scanning `ticks`
+for silent stretches inside the session or from the collector_outages table
+written by CollectorSupervisor, and fills them with 1-minute candles from the
+Fyers history endpoint into `minute_bars`.
+
+    python backfill.py --since 2025-06-02 --outages --scan
+    python backfill.py --mock          # planted gaps against a stub history client
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import db
+import trading_calendar
+from rate_limit import RateLimiter
+
+Interval = Tuple[int, int]
+
+BAR_SECONDS = 60
+# Fyers allows up to 100 days of 1-minute history per request; keep requests small
+# so a single failure only loses one chunk.
+MAX_CHUNK_SECONDS = 5 * 86400
+
+
+def merge_intervals(intervals: List[Interval]) -> List[Interval]:
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _clip_to_sessions(start: int, end: int) -> List[Interval]:
+    """Split [start, end] into the parts that fall inside trading sessions."""
+    out = []
+    day = trading_calendar.ist_day_number(start)
+    last_day = trading_calendar.ist_day_number(end)
+    while day <= last_day:
+        midnight = day * trading_calendar.SECONDS_PER_DAY - trading_calendar.IST_OFFSET
+        bounds = trading_calendar.get_calendar(midnight).session_bounds(midnight)
+        if bounds is not None:
+            lo, hi = max(start, bounds[0]), min(end, bounds[1])
+            if lo < hi:
+                out.append((lo, hi))
+        day += 1
+    return out
+
+
+def find_gaps_in_ticks(start_epoch: int, end_epoch: int, min_gap: int = 180, db_path: str = db.DB_PATH) -> Dict[str, List[Interval]]:
+    """
+    Per-symbol stretches of at least min_gap seconds inside trading sessions
+    with no stored ticks: between consecutive ticks, and from each session's
+    open to the symbol's first tick and from its last tick to the close
+    (clipped to [start_epoch, end_epoch]).
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    rows = conn.execute(
+        """
+        SELECT symbol, prev_time, exch_feed_time FROM (
+            SELECT symbol, exch_feed_time,
+                   LAG(exch_feed_time) OVER (PARTITION BY symbol ORDER BY exch_feed_time) AS prev_time
+            FROM ticks
+            WHERE exch_feed_time>=? AND exch_feed_time<=?
+        )
+        WHERE prev_time IS NOT NULL AND exch_feed_time - prev_time >= ?
+        """,
+        (start_epoch, end_epoch, min_gap),
+    ).fetchall()
+    edges = conn.execute(
+        """
+        SELECT symbol, MIN(exch_feed_time), MAX(exch_feed_time)
+        FROM ticks
+        WHERE exch_feed_time>=? AND exch_feed_time<=?
+        GROUP BY symbol, (exch_feed_time + ?) / ?
+        """,
+        (start_epoch, end_epoch, trading_calendar.IST_OFFSET, trading_calendar.SECONDS_PER_DAY),
+    ).fetchall()
+    conn.close()
+    gaps: Dict[str, List[Interval]] = {}
+    for symbol, prev_time, next_time in rows:
+        for lo, hi in _clip_to_sessions(prev_time, next_time):
+            if hi - lo >= min_gap:
+                gaps.setdefault(symbol, []).append((lo, hi))
+    for symbol, first_time, last_time in edges:
+        bounds = trading_calendar.get_calendar(first_time).session_bounds(first_time)
+        if bounds is None:
+            continue
+        for lo, hi in ((max(bounds[0], start_epoch), first_time), (last_time, min(bounds[1], end_epoch))):
+            if hi - lo >= min_gap:
+                gaps.setdefault(symbol, []).append((lo, hi))
+    return {symbol: merge_intervals(iv) for symbol, iv in gaps.items()}
+
+
+def find_gaps_from_outages(since_epoch: int, symbols: List[str], db_path: str = db.DB_PATH) -> Dict[str, List[Interval]]:
+    """Per-symbol intervals from recorded collector outages. Global outages apply to every symbol."""
+    db.init_outage_table(db_path)
+    now = int(time.time())
+    gaps: Dict[str, List[Interval]] = {}
+    for outage in db.get_outages(since_epoch, db_path):
+        start, end = outage["start_time"], outage["end_time"] or now
+        targets = symbols if outage["scope"] == "global" else [outage["scope"]]
+        for lo, hi in _clip_to_sessions(start, end):
+            for symbol in targets:
+                gaps.setdefault(symbol, []).append((lo, hi))
+    return {symbol: merge_intervals(iv) for symbol, iv in gaps.items()}
+
+
+class Backfiller:
+    """
+    Fetches 1-minute candles for gap intervals on a thread pool, throttled by a
+    shared token bucket, and bulk-upserts them from the calling thread.
+
+    history_client is anything with a FyersModel-style history(data=...) method,
+    so a local stub can stand in for the API.
+    """
+
+    def __init__(self, history_client, db_path: str = db.DB_PATH, max_workers: int = 4,
+                 requests_per_second: float = 8.0, batch_size: int = 5000, retries: int = 3):
+        self.client = history_client
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.limiter = RateLimiter(requests_per_second, burst=max_workers)
+        self.batch_size = batch_size
+        self.retries = retries
+        self.requests_made = 0
+        self.failed_requests = 0
+        self.bars_written = 0
+        self._count_lock = threading.Lock()
+
+    @staticmethod
+    def _chunks(intervals: Dict[str, List[Interval]]):
+        for symbol, spans in intervals.items():
+            for start, end in spans:
+                start = start - start % BAR_SECONDS
+                while start <= end:
+                    chunk_end = min(end, start + MAX_CHUNK_SECONDS - 1)
+                    yield symbol, start, chunk_end
+                    start = chunk_end + 1
+
+    def _fetch(self, symbol: str, start: int, end: int):
+        request = {
+            "symbol": symbol,
+            "resolution": "1",
+            "date_format": "0",
+            "range_from": str(start),
+            "range_to": str(end),
+            "cont_flag": "1",
+        }
+        for attempt in range(self.retries):
+            self.limiter.acquire()
+            with self._count_lock:
+                self.requests_made += 1
+            try:
+                response = self.client.history(data=request)
+            except Exception as e:
+                response = {"s": "error", "message": str(e)}
+            if response.get("s") == "ok":
+                return [
+                    (symbol, int(c[0]), c[1], c[2], c[3], c[4], int(c[5]))
+                    for c in response.get("candles", [])
+                    if start <= c[0] <= end
+                ]
+            if response.get("s") == "no_data":
+                return []
+            time.sleep(0.5 * (2 ** attempt))
+        with self._count_lock:
+            self.failed_requests += 1
+        print(f"[Backfiller] Giving up on {symbol} {start}-{end}: {response.get('message')}")
+        return []
+
+    def backfill(self, intervals: Dict[str, List[Interval]]) -> int:
+        """Fill the given per-symbol intervals; returns the number of bars written."""
+        started = time.perf_counter()
+        db.init_db(self.db_path)
+        conn = sqlite3.connect(self.db_path)
+        pending = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self._fetch, *chunk) for chunk in self._chunks(intervals)]
+            for future in as_completed(futures):
+                pending.extend(future.result())
+                if len(pending) >= self.batch_size:
+                    db.upsert_minute_bars(pending, conn=conn)
+                    self.bars_written += len(pending)
+                    pending = []
+        db.upsert_minute_bars(pending, conn=conn)
+        self.bars_written += len(pending)
+        conn.close()
+        print(f"[Backfiller] {self.bars_written} bars from {self.requests_made} requests "
+              f"({self.failed_requests} failed) in {time.perf_counter() - started:.1f}s")
+        return self.bars_written
+
+
+def backfill_recent(history_client, since_epoch: int, symbols: List[str], use_outages: bool = True,
+                    scan_ticks: bool = True, db_path: str = db.DB_PATH, **kwargs) -> int:
+    gaps: Dict[str, List[Interval]] = {}
+    sources = []
+    if use_outages:
+        sources.append(find_gaps_from_outages(since_epoch, symbols, db_path))
+    if scan_ticks:
+        sources.append(find_gaps_in_ticks(since_epoch, int(time.time()), db_path=db_path))
+    for source in sources:
+        for symbol, spans in source.items():
+            gaps.setdefault(symbol, []).extend(spans)
+    gaps = {symbol: merge_intervals(spans) for symbol, spans in gaps.items()}
+    if not gaps:
+        print("[Backfiller] No gaps found.")
+        return 0
+    return Backfiller(history_client, db_path=db_path, **kwargs).backfill(gaps)
+
+
+def backfill_today(history_client, db_path: str = db.DB_PATH) -> int:
+    """End-of-day job: fill today's recorded outages and tick gaps."""
+    from ws_collector import load_symbols
+    since = trading_calendar.ist_day_start(time.time())
+    return backfill_recent(history_client, since, load_symbols(), db_path=db_path)
+
+
+# --- Local stub client ---
+
+class StubHistoryClient:
+    """
+    Stands in for FyersModel.history: deterministic 1-minute candles for the
+    session minutes in the requested range. Every `fail_every`-th request
+    returns an error, so a run also exercises the Backfiller's retries.
+    """
+
+    def __init__(self, fail_every: int = 7, latency: float = 0.005):
+        self.fail_every = fail_every
+        self.latency = latency
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def history(self, data: dict) -> dict:
+        with self._lock:
+            self.requests += 1
+            fail = self.fail_every and self.requests % self.fail_every == 0
+            if fail:
+                self.errors += 1
+        time.sleep(self.latency)
+        if fail:
+            return {"s": "error", "code": 429, "message": "request limit reached"}
+        start, end = int(data["range_from"]), int(data["range_to"])
+        seed = sum(map(ord, data["symbol"]))
+        candles = []
+        for lo, hi in _clip_to_sessions(start, end):
+            for t in range(lo - lo % BAR_SECONDS, hi + 1, BAR_SECONDS):
+                if t < lo:
+                    continue
+                price = 100 + (seed + t // BAR_SECONDS) % 50 / 10
+                candles.append([t, price, price + 0.5, price - 0.5, price + 0.1, 100])
+        return {"s": "ok" if candles else "no_data", "candles": candles}
+
+
+def _last_complete_session():
+    day = trading_calendar.ist_day_number(time.time()) - 1
+    for _ in range(30):
+        midnight = day * trading_calendar.SECONDS_PER_DAY - trading_calendar.IST_OFFSET
+        bounds = trading_calendar.get_calendar(midnight).session_bounds(midnight)
+        if bounds is not None:
+            return midnight, bounds
+        day -= 1
+    raise RuntimeError("No trading session in the last 30 days")
+
+
+def run_mock(symbols: int, workers: int, rate: float) -> bool:
+    """
+    Plant one tick gap per symbol (plus a late first tick or an early last tick
+    for some symbols) and a global collector outage in the last complete
+    session, backfill them from StubHistoryClient, then backfill again and
+    check minute_bars is unchanged.
+    """
+    import tempfile
+
+    db_path = os.path.join(tempfile.mkdtemp(), "backfill_mock.db")
+    db.init_db(db_path)
+    midnight, (session_open, session_close) = _last_complete_session()
+    names = [f"NSE:MOCK{i}-EQ" for i in range(symbols)]
+    outage = (session_open + 5 * 3600, session_open + 5 * 3600 + 600)
+    planted: Dict[str, List[Interval]] = {}
+    rows = []
+    for i, symbol in enumerate(names):
+        gap_start = session_open + 3600 + (i % 60) * 60
+        planted[symbol] = [(gap_start, gap_start + 1200)]
+        if i % 10 == 3:
+            planted[symbol].append((session_open, session_open + 900))
+        elif i % 10 == 7:
+            planted[symbol].append((session_close - 900, session_close))
+        for t in range(session_open, session_close, 30):
+            if any(lo <= t < hi for lo, hi in planted[symbol]) or outage[0] <= t < outage[1]:
+                continue
+            rows.append((symbol, t, 100.0, t))
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO ticks (symbol, exch_feed_time, ltp, received_time) VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+    db.init_outage_table(db_path)
+    db.close_outage(db.open_outage("global", outage[0], "mock outage", db_path), outage[1], db_path)
+
+    gaps = find_gaps_in_ticks(midnight, session_close, db_path=db_path)
+    total = sum(len(spans) for spans in planted.values())
+    found = sum(1 for symbol, spans in planted.items() for lo, hi in spans
+                if any(a <= lo and hi <= b for a, b in gaps.get(symbol, [])))
+    print(f"[Mock] {len(rows)} ticks for {symbols} symbols on "
+          f"{datetime.fromtimestamp(midnight, trading_calendar.IST):%Y-%m-%d}; "
+          f"tick scan found {found}/{total} planted gaps")
+
+    client = StubHistoryClient()
+    counts = []
+    for run in (1, 2):
+        written = backfill_recent(client, midnight, names, db_path=db_path, max_workers=workers,
+                                  requests_per_second=rate)
+        conn = sqlite3.connect(db_path)
+        counts.append(conn.execute("SELECT COUNT(*) FROM minute_bars").fetchone()[0])
+        covered = sum(
+            1 for symbol, spans in planted.items() for lo, hi in spans
+            if conn.execute("SELECT COUNT(*) FROM minute_bars WHERE symbol=? AND time>=? AND time<?",
+                            (symbol, lo, hi)).fetchone()[0] >= (hi - lo) // BAR_SECONDS
+        )
+        conn.close()
+        print(f"[Mock] Run {run}: {written} bars upserted, {counts[-1]} rows in minute_bars, "
+              f"{covered}/{total} planted gaps fully covered")
+    print(f"[Mock] Stub served {client.requests} requests ({client.errors} injected errors, retried)")
+    ok = found == total and counts[0] > 0 and counts[0] == counts[1]
+    print(f"[Mock] {'OK' if ok else 'FAILED'}: minute_bars {counts[0]} -> {counts[1]} rows after re-running the backfill")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect tick gaps and backfill them from Fyers history.")
+    parser.add_argument("--since", help="Start date (YYYY-MM-DD)")
+    parser.add_argument("--db", default=db.DB_PATH)
+    parser.add_argument("--outages", action="store_true", help="Use recorded collector outages")
+    parser.add_argument("--scan", action="store_true", help="Scan stored ticks for gaps")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=8.0, help="History requests per second")
+    parser.add_argument("--mock", action="store_true", help="Backfill planted gaps from a local stub client")
+    parser.add_argument("--symbols", type=int, default=50, help="Mock symbol count")
+    args = parser.parse_args()
+
+    if args.mock:
+        raise SystemExit(0 if run_mock(args.symbols, args.workers, max(args.rate, 50.0)) else 1)
+    if not args.since:
+        parser.error("--since is required (or use --mock)")
+
+    from fyers_service import FyersService
+    from ws_collector import load_symbols
+
+    since = trading_calendar.ist_midnight_epoch(datetime.strptime(args.since, "%Y-%m-%d").date())
+    service = FyersService()
+    if not service.fyers:
+        print("Fyers session not initialized or token is missing.")
+        return
+    backfill_recent(
+        service.fyers, since, load_symbols(),
+        use_outages=args.outages or not args.scan, scan_ticks=args.scan or not args.outages,
+        db_path=args.db, max_workers=args.workers, requests_per_second=args.rate,
+    )
+
+
+if __name__ == "__main__":
+    main()
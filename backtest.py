@@ -0,0 +1,291 @@
+"""
+Offline screener backtest.
+
+Replays stored ticks from ticks_data.db in exch_feed_time order through the
+Screener detection logic using a simulated clock, so threshold changes can be
+evaluated without waiting for a live session.
+
+    python backtest.py --date 2025-06-10
+    python backtest.py --date 2025-06-10 --threshold 0.5 1.0 --week-min-days 3 4 --processes 4
+
+Circuit bands come from the replayed ticks, as in a live session, with
+daily_circuits.csv as a seed; --circuit-override makes the file's bands win.
+"""
+import argparse
+import csv
+import itertools
+import math
+import sqlite3
+import time
+from collections import Counter
+from datetime import date, datetime, time as dtime
+from multiprocessing import Pool
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+import analytics
+import db
+from circuit_bands import CIRCUIT_FILE
+from screener import Screener
+
+EVENT_FIELDS = ["timestamp", "symbol", "event_type", "ltp", "high", "low", "period"]
+
+
+class SimulatedClock:
+    """Callable clock whose time only moves when the replay advances it."""
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class BacktestResult:
+    def __init__(self, params: dict, events: List[dict], ticks_processed: int, cycles: int, elapsed: float):
+        self.params = params
+        self.events = events
+        self.ticks_processed = ticks_processed
+        self.cycles = cycles
+        self.elapsed = elapsed
+        self.counts = Counter(e["event_type"] for e in events)
+
+    def summary(self) -> str:
+        lines = [
+            f"params={self.params} ticks={self.ticks_processed} cycles={self.cycles} "
+            f"events={len(self.events)} elapsed={self.elapsed:.2f}s"
+        ]
+        for event_type, count in sorted(self.counts.items()):
+            lines.append(f"  {event_type:<32} {count}")
+        return "\n".join(lines)
+
+    def write_events(self, path: str):
+        with open(path, mode="w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=EVENT_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.events)
+
+
+class Backtest:
+    """
+    Replays one trading day.
+
+    Screening cycles are run every poll_interval seconds of simulated time, and
+    weekly/monthly high/lows are refreshed every Screener.PERIODIC_HIGHLOW_REFRESH
+    seconds, mirroring Screener.run. The high/lows come from the period's ticks
+    before the replay day merged with the intraday range seen so far, so the
+    database is only queried once per period.
+    """
+
+    def __init__(
+        self,
+        trade_date: date,
+        db_path: str = db.DB_PATH,
+        proximity_threshold_percent: float = 1.0,
+        week_min_days: int = Screener.WEEK_MIN_DAYS,
+        month_min_days: int = Screener.MONTH_MIN_DAYS,
+        poll_interval: float = 2.0,
+        circuit_file: str = CIRCUIT_FILE,
+        circuit_override: bool = False,
+        session_start: str = Screener.SESSION_START,
+        session_end: str = Screener.SESSION_END,
+    ):
+        self.trade_date = trade_date
+        self.db_path = db_path
+        self.params = {
+            "threshold": proximity_threshold_percent,
+            "week_min_days": week_min_days,
+            "month_min_days": month_min_days,
+        }
+        self.events: List[dict] = []
+        self.clock = SimulatedClock()
+        self.screener = Screener(
+            db_path=db_path,
+            notice_callback=lambda event: None,
+            proximity_threshold_percent=proximity_threshold_percent,
+            poll_interval=poll_interval,
+            circuit_file=circuit_file,
+            circuit_file_override=circuit_override,
+            session_start=session_start,
+            session_end=session_end,
+            clock=self.clock,
+            event_sink=self.events.append,
+        )
+        self.screener.WEEK_MIN_DAYS = week_min_days
+        self.screener.MONTH_MIN_DAYS = month_min_days
+
+        self.session_open = analytics.ist_epoch_for_date_time(
+            trade_date, datetime.strptime(session_start, "%H:%M:%S").time())
+        self.session_close = analytics.ist_epoch_for_date_time(
+            trade_date, datetime.strptime(session_end, "%H:%M:%S").time())
+        self.day_start = analytics.ist_epoch_for_date_time(trade_date, dtime(0, 0, 0))
+        self.day_end = analytics.ist_epoch_for_date_time(trade_date, dtime(23, 59, 59))
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+
+    def _prior_high_lows(self, conn, period: str) -> Dict[str, tuple]:
+        ref = datetime.combine(self.trade_date, dtime(12, 0, 0), tzinfo=ZoneInfo("Asia/Kolkata"))
+        start_epoch, _ = analytics.get_period_epochs(period, ref)
+        if start_epoch >= self.day_start:
+            return {}
+        return db.get_high_low_days_by_symbol(start_epoch, self.day_start - 1, conn=conn)
+
+    @staticmethod
+    def _merge(prior, intraday):
+        if prior is None:
+            return (intraday[0], intraday[1], 1)
+        return (max(prior[0], intraday[0]), min(prior[1], intraday[1]), prior[2] + 1)
+
+    def _refresh_high_lows(self, prior_week, prior_month, intraday):
+        screener = self.screener
+        old_weekly, old_monthly = screener.weekly_high_low, screener.monthly_high_low
+        weekly = dict(prior_week)
+        monthly = dict(prior_month)
+        for symbol, hl in intraday.items():
+            weekly[symbol] = self._merge(prior_week.get(symbol), hl)
+            monthly[symbol] = self._merge(prior_month.get(symbol), hl)
+        screener.weekly_high_low = weekly
+        screener.monthly_high_low = monthly
+        for symbol, new_highlow in weekly.items():
+            screener._reset_alert_flags_if_period_changed(symbol, old_weekly.get(symbol), new_highlow, "WEEKLY_")
+        for symbol, new_highlow in monthly.items():
+            screener._reset_alert_flags_if_period_changed(symbol, old_monthly.get(symbol), new_highlow, "MONTHLY_")
+
+    def run(self) -> BacktestResult:
+        started = time.perf_counter()
+        screener = self.screener
+        circuit_bands = screener.circuit_bands
+        poll = screener.poll_interval
+        refresh_every = screener.PERIODIC_HIGHLOW_REFRESH
+
+        conn = self._connect()
+        prior_week = self._prior_high_lows(conn, "week")
+        prior_month = self._prior_high_lows(conn, "month")
+        cursor = conn.execute(
+            """
+            SELECT symbol, exch_feed_time, ltp, lower_ckt, upper_ckt
+            FROM ticks
+            WHERE exch_feed_time>=? AND exch_feed_time<=?
+            ORDER BY exch_feed_time
+            """,
+            (max(self.day_start, self.session_open), min(self.day_end, self.session_close)),
+        )
+
+        latest: Dict[str, dict] = {}
+        intraday: Dict[str, list] = {}
+        dirty = set()
+        carry = set()
+        ticks_processed = 0
+        cycles = 0
+        next_cycle = None
+        next_refresh = None
+
+        def run_cycle(at):
+            nonlocal next_refresh, cycles, dirty, carry
+            self.clock.now = at
+            full = False
+            if next_refresh is None or at >= next_refresh:
+                self._refresh_high_lows(prior_week, prior_month, intraday)
+                next_refresh = at + refresh_every
+                full = True
+            symbols = latest.keys() if full else (dirty | carry)
+            screener.screen_ticks({s: latest[s] for s in symbols})
+            # A symbol screened with a new ltp can still change state on the following
+            # cycle (e.g. CROSSING -> CROSSED), so it is screened once more.
+            carry, dirty = dirty, set()
+            cycles += 1
+
+        for symbol, feed_time, ltp, lower_ckt, upper_ckt in cursor:
+            if ltp is None:
+                continue
+            if next_cycle is None:
+                next_cycle = feed_time
+            while feed_time >= next_cycle:
+                if dirty or carry or (next_refresh is not None and next_cycle >= next_refresh):
+                    run_cycle(next_cycle)
+                    next_cycle += poll
+                else:
+                    # Nothing changed since the last cycle; jump to the first cycle that
+                    # picks up this tick, or the next high/low refresh if that is sooner.
+                    target = feed_time if next_refresh is None else min(feed_time, next_refresh)
+                    next_cycle += max(1, math.ceil((target - next_cycle) / poll)) * poll
+            tick = latest.get(symbol)
+            if tick is None:
+                latest[symbol] = {"ltp": ltp}
+                intraday[symbol] = [ltp, ltp]
+            else:
+                tick["ltp"] = ltp
+                hl = intraday[symbol]
+                if ltp > hl[0]:
+                    hl[0] = ltp
+                elif ltp < hl[1]:
+                    hl[1] = ltp
+            circuit_bands.update(symbol, lower_ckt, upper_ckt)
+            dirty.add(symbol)
+            ticks_processed += 1
+        conn.close()
+
+        # Drain: screen the final state until nothing is left to settle
+        while next_cycle is not None and (dirty or carry):
+            run_cycle(next_cycle)
+            next_cycle += poll
+
+        return BacktestResult(self.params, self.events, ticks_processed, cycles, time.perf_counter() - started)
+
+
+def _run_one(args):
+    trade_date, db_path, circuit_file, circuit_override, params = args
+    bt = Backtest(
+        trade_date,
+        db_path=db_path,
+        circuit_file=circuit_file,
+        circuit_override=circuit_override,
+        proximity_threshold_percent=params["threshold"],
+        week_min_days=params["week_min_days"],
+        month_min_days=params["month_min_days"],
+    )
+    return bt.run()
+
+
+def run_sweep(trade_date: date, grid: List[dict], db_path: str = db.DB_PATH,
+              circuit_file: str = CIRCUIT_FILE, processes: Optional[int] = None,
+              circuit_override: bool = False) -> List[BacktestResult]:
+    """Run one backtest per parameter set, in parallel worker processes."""
+    jobs = [(trade_date, db_path, circuit_file, circuit_override, params) for params in grid]
+    if processes == 1 or len(jobs) == 1:
+        return [_run_one(job) for job in jobs]
+    with Pool(processes=processes) as pool:
+        return pool.map(_run_one, jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay stored ticks through the screener.")
+    parser.add_argument("--date", required=True, help="Trading date to replay (YYYY-MM-DD)")
+    parser.add_argument("--db", default=db.DB_PATH)
+    parser.add_argument("--circuit-file", default=CIRCUIT_FILE)
+    parser.add_argument("--circuit-override", action="store_true",
+                        help="Use the circuit file's bands instead of the ones carried on the ticks")
+    parser.add_argument("--threshold", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--week-min-days", type=int, nargs="+", default=[Screener.WEEK_MIN_DAYS])
+    parser.add_argument("--month-min-days", type=int, nargs="+", default=[Screener.MONTH_MIN_DAYS])
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--out", default=None, help="Write events CSV (single run) or prefix (sweep)")
+    args = parser.parse_args()
+
+    trade_date = datetime.strptime(args.date, "%Y-%m-%d").date()
+    grid = [
+        {"threshold": t, "week_min_days": w, "month_min_days": m}
+        for t, w, m in itertools.product(args.threshold, args.week_min_days, args.month_min_days)
+    ]
+    results = run_sweep(trade_date, grid, db_path=args.db, circuit_file=args.circuit_file, processes=args.processes,
+                          circuit_override=args.circuit_override)
+    for i, result in enumerate(results):
+        print(result.summary())
+        if args.out:
+            path = args.out if len(results) == 1 else f"{args.out}_{i}.csv"
+            result.write_events(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+"""
+Screener scalability benchmark on synthetic universes.
+
+For each universe size a synthetic ticks_data.db (random-walk ticks over the
+last --days trading days, --minutes-per-day of session each at --ticks-per-sec
+across the universe) and a matching daily_circuits.csv are generated under
+--workdir, then every screener stage is timed per cycle:
+
+    latest_ticks_db        db.get_latest_ticks (screener without an in-process collector)
+    latest_ticks_buffers   TickRingBuffers.latest_ticks (screener next to the collector)
+    detect_event           circuit band checks for every symbol
+    check_highlow_alert    weekly/monthly high/low checks for every symbol
+    screen_ticks           one full Screener.screen_ticks pass
+    refresh_high_lows      weekly + monthly aggregation and flag resets
+
+The data is anchored to a fixed --reference-date (recorded in the baseline),
+and the screener runs with its clock and the analytics period bounds pinned to
+it, so reruns on later days time exactly the same work. Medians are compared
+with bench_baseline.json and the run fails (exit 1) if any stage is slower than
+baseline * (1 + --tolerance) by more than --min-delta-ms. Timings only compare
+on the same machine, so the baseline is local and not committed: the first run
+(or any universe size it does not have yet) is recorded instead of compared.
+A memory pass with tracemalloc follows the timing pass, so tracing does not
+skew the timings.
+
+    python bench_screener.py --record                 # (re)write bench_baseline.json
+    python bench_screener.py                          # compare against it
+    python bench_screener.py --symbols 500 2000 --cycles 50
+"""
+import argparse
+import contextlib
+import csv
+import gc
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import analytics
+import db
+import latency
+import trading_calendar
+from screener import Screener
+from tick_buffer import TickRingBuffers
+
+BASELINE_PATH = "bench_baseline.json"
+# Friday; the synthetic history is the last --days weekdays up to this date
+DEFAULT_REFERENCE_DATE = "2025-06-13"
+DEFAULT_SYMBOLS = (500, 2000, 5000)
+STAGES = (
+    "latest_ticks_db",
+    "latest_ticks_buffers",
+    "detect_event",
+    "check_highlow_alert",
+    "screen_ticks",
+    "refresh_high_lows",
+)
+
+
+def _symbol(i: int) -> str:
+    return f"NSE:BENCH{i:05d}-EQ"
+
+
+def _reference_epoch(date_str: str) -> int:
+    """11:00 IST on date_str (YYYY-MM-DD), or the weekday before it if it falls on a weekend."""
+    day = trading_calendar.ist_day_number(datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=trading_calendar.IST).timestamp())
+    while (day + 3) % 7 >= 5:  # 1970-01-01 was a Thursday
+        day -= 1
+    return day * trading_calendar.SECONDS_PER_DAY - trading_calendar.IST_OFFSET + 11 * 3600
+
+
+@contextlib.contextmanager
+def _pinned_to(reference: int):
+    """
+    Run the analytics helpers Screener.refresh_high_lows uses as if it were the
+    reference time: the market counts as open and the week/month bounds are
+    those containing the reference, not the real current time.
+    """
+    is_market_open, get_period_epochs = analytics.is_market_open, analytics.get_period_epochs
+    pinned = datetime.fromtimestamp(reference, trading_calendar.IST)
+    analytics.is_market_open = lambda *args, **kwargs: True
+    analytics.get_period_epochs = lambda period, reference_dt=None: get_period_epochs(period, reference_dt or pinned)
+    try:
+        yield
+    finally:
+        analytics.is_market_open, analytics.get_period_epochs = is_market_open, get_period_epochs
+
+
+def _trading_days(reference: int, days: int) -> List[int]:
+    """IST day numbers of the last `days` weekdays up to and including the reference day."""
+    out = []
+    day = trading_calendar.ist_day_number(reference)
+    while len(out) < days:
+        if (day + 3) % 7 < 5:
+            out.append(day)
+        day -= 1
+    return sorted(out)
+
+
+def generate_dataset(db_path: str, circuit_path: str, symbols: int, days: int, minutes_per_day: int,
+                     ticks_per_sec: int, reference: int, seed: int = 1) -> Dict[str, float]:
+    """Write the synthetic database and circuit file. Returns the last ltp per symbol."""
+    for path in (db_path, db_path + "-wal", db_path + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+    rng = random.Random(seed)
+    names = [_symbol(i) for i in range(symbols)]
+    prices = {s: rng.uniform(50, 2000) for s in names}
+    prev_close = dict(prices)
+    volumes = dict.fromkeys(names, 0)
+    db.init_db(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA synchronous=OFF")
+    sql = ("INSERT OR IGNORE INTO ticks (symbol, exch_feed_time, ltp, vol_traded_today, lower_ckt, upper_ckt, "
+           "received_time) VALUES (?, ?, ?, ?, ?, ?, ?)")
+    per_second = min(ticks_per_sec, symbols)
+    bands = {}
+    for day in _trading_days(reference, days):
+        session_open = day * trading_calendar.SECONDS_PER_DAY - trading_calendar.IST_OFFSET + 9 * 3600 + 15 * 60
+        bands = {s: (round(p * 0.9, 2), round(p * 1.1, 2)) for s, p in prev_close.items()}
+        volumes = dict.fromkeys(names, 0)
+        rows = []
+        for second in range(minutes_per_day * 60):
+            t = session_open + second
+            for s in rng.sample(names, per_second):
+                price = prices[s] * (1 + rng.gauss(0, 0.002))
+                lower, upper = bands[s]
+                price = min(max(price, lower), upper)
+                prices[s] = price
+                volumes[s] += rng.randint(1, 500)
+                rows.append((s, t, round(price, 2), volumes[s], lower, upper, t))
+            if len(rows) >= 50000:
+                conn.executemany(sql, rows)
+                rows = []
+        conn.executemany(sql, rows)
+        conn.commit()
+        prev_close = dict(prices)
+    conn.close()
+    with open(circuit_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["symbol", "lower_ckt", "upper_ckt"])
+        for s in names:
+            writer.writerow([s, *bands[s]])
+    return prices
+
+
+def _dataset(workdir: str, args, symbols: int, reference: int) -> Tuple[str, str]:
+    """Paths of the universe's database and circuit file, generated if missing or built with other parameters."""
+    os.makedirs(workdir, exist_ok=True)
+    db_path = os.path.join(workdir, f"bench_{symbols}.db")
+    circuit_path = os.path.join(workdir, f"circuits_{symbols}.csv")
+    meta_path = os.path.join(workdir, f"bench_{symbols}.json")
+    params = {"symbols": symbols, "days": args.days, "minutes_per_day": args.minutes_per_day,
+              "ticks_per_sec": args.ticks_per_sec, "reference": reference}
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            current = json.load(f)
+    except (OSError, ValueError):
+        current = None
+    if args.regenerate or current != params or not os.path.exists(db_path):
+        started = time.perf_counter()
+        generate_dataset(db_path, circuit_path, symbols, args.days, args.minutes_per_day, args.ticks_per_sec, reference)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(params, f)
+        print(f"[Bench] Generated {db_path} in {time.perf_counter() - started:.1f}s")
+    return db_path, circuit_path
+
+
+def _make_screener(db_path: str, circuit_path: str, reference: int) -> Screener:
+    return Screener(
+        db_path=db_path,
+        notice_callback=lambda event: None,
+        circuit_file=circuit_path,
+        clock=lambda: reference,
+        event_sink=lambda event: None,
+    )
+
+
+def _setup(db_path: str, circuit_path: str, reference: int):
+    """Call inside _pinned_to(reference)."""
+    screener = _make_screener(db_path, circuit_path, reference)
+    latest = db.get_latest_ticks(db_path)
+    buffers = TickRingBuffers(max_symbols=max(len(latest), 1))
+    for tick in latest.values():
+        buffers.append_tick(tick)
+    screener.refresh_high_lows()
+    if not screener.weekly_high_low:
+        raise RuntimeError(f"No weekly high/lows at the reference time; regenerate {db_path}")
+    return screener, latest, buffers
+
+
+def _cycle_ltps(latest: Dict[str, dict], cycles: int, rng: random.Random) -> List[Dict[str, float]]:
+    """Per-cycle ltp for every symbol: a random walk from the stored latest ticks, generated up front."""
+    ltps = {s: t["ltp"] for s, t in latest.items()}
+    out = []
+    for _ in range(cycles):
+        for s in rng.sample(list(ltps), len(ltps) // 4):
+            ltps[s] *= 1 + rng.gauss(0, 0.005)
+        out.append(dict(ltps))
+    return out
+
+
+def _timed(samples: Dict[str, List[float]], stage: str, fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    samples[stage].append((time.perf_counter() - started) * 1000)
+    return result
+
+
+def time_universe(db_path: str, circuit_path: str, reference: int, cycles: int, refresh_cycles: int) -> Dict[str, dict]:
+    with _pinned_to(reference):
+        return _time_universe(db_path, circuit_path, reference, cycles, refresh_cycles)
+
+
+def _time_universe(db_path: str, circuit_path: str, reference: int, cycles: int, refresh_cycles: int) -> Dict[str, dict]:
+    screener, latest, buffers = _setup(db_path, circuit_path, reference)
+    samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    circuits = screener.circuits
+    prev = {s: t["ltp"] for s, t in latest.items()}
+
+    def detect_all(ltps):
+        for symbol, ltp in ltps.items():
+            circuit = circuits.get(symbol)
+            if circuit:
+                screener.detect_event(symbol, ltp, prev[symbol], circuit["upper"], circuit["lower"])
+
+    def highlow_all(ltps):
+        for symbol, ltp in ltps.items():
+            screener.check_highlow_alert(symbol, ltp)
+
+    # One untimed pass first, so per-symbol state (alert flags, caches) is already allocated
+    screener.screen_ticks(latest)
+    gc.collect()
+    for ltps in _cycle_ltps(latest, cycles, random.Random(2)):
+        _timed(samples, "latest_ticks_db", db.get_latest_ticks, db_path)
+        _timed(samples, "latest_ticks_buffers", buffers.latest_ticks)
+        _timed(samples, "detect_event", detect_all, ltps)
+        _timed(samples, "check_highlow_alert", highlow_all, ltps)
+        ticks = {s: {"symbol": s, "ltp": ltp} for s, ltp in ltps.items()}
+        _timed(samples, "screen_ticks", screener.screen_ticks, ticks)
+        prev = ltps
+    for _ in range(refresh_cycles):
+        _timed(samples, "refresh_high_lows", screener.refresh_high_lows)
+
+    results = {}
+    for stage, values in samples.items():
+        values.sort()
+        results[stage] = {
+            "median_ms": statistics.median(values),
+            "p95_ms": values[min(len(values) - 1, int(len(values) * 0.95))],
+            "runs": len(values),
+        }
+    return results
+
+
+def memory_universe(db_path: str, circuit_path: str, reference: int) -> dict:
+    """Traced allocations for a screener with circuits, high/lows, alert flags and ring buffers loaded."""
+    gc.collect()
+    tracemalloc.start(10)
+    before = tracemalloc.take_snapshot()
+    with _pinned_to(reference):
+        screener, latest, buffers = _setup(db_path, circuit_path, reference)
+        screener.screen_ticks(latest)
+    after = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    top = after.compare_to(before, "filename")[:5]
+    symbols = max(len(latest), 1)
+    return {
+        "traced_current_mb": current / 1e6,
+        "traced_peak_mb": peak / 1e6,
+        "bytes_per_symbol": current / symbols,
+        "ring_buffer_mb": buffers.memory_bytes() / 1e6,
+        "top_files": [f"{stat.traceback[0].filename}: {stat.size_diff / 1e6:.2f} MB" for stat in top],
+    }
+
+
+def compare(results: Dict[str, Dict[str, dict]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float, min_delta_ms: float) -> List[str]:
+    regressions = []
+    for symbols, stages in results.items():
+        recorded = baseline.get(symbols) or {}
+        for stage, stats in stages.items():
+            base = recorded.get(stage)
+            if base is None:
+                continue
+            median = stats["median_ms"]
+            if median > base * (1 + tolerance) and median - base > min_delta_ms:
+                regressions.append(f"{symbols} symbols / {stage}: {median:.2f} ms vs baseline {base:.2f} ms "
+                                   f"(+{(median / base - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time screener stages on synthetic universes.")
+    parser.add_argument("--symbols", type=int, nargs="+", default=list(DEFAULT_SYMBOLS))
+    parser.add_argument("--days", type=int, default=5, help="Trading days of synthetic history")
+    parser.add_argument("--minutes-per-day", type=int, default=5, help="Session minutes generated per day")
+    parser.add_argument("--ticks-per-sec", type=int, default=500, help="Ticks per second across the universe")
+    parser.add_argument("--cycles", type=int, default=20, help="Screening cycles timed per universe")
+    parser.add_argument("--refresh-cycles", type=int, default=3, help="High/low refreshes timed per universe")
+    parser.add_argument("--workdir", default="bench_data")
+    parser.add_argument("--reference-date", default=None,
+                        help=f"Last day of synthetic history, YYYY-MM-DD (default: the baseline's, else {DEFAULT_REFERENCE_DATE})")
+    parser.add_argument("--regenerate", action="store_true", help="Rebuild the synthetic datasets")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--record", action="store_true", help="Write the medians of this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Allowed slowdown over baseline (0.3 = 30%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Ignore slowdowns smaller than this")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass")
+    parser.add_argument("--out", default=None, help="Write the full results as JSON")
+    args = parser.parse_args()
+
+    try:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        baseline = None
+    recorded_date = (baseline or {}).get("reference_date")
+    reference_date = args.reference_date or recorded_date or DEFAULT_REFERENCE_DATE
+    if baseline is not None and not args.record and recorded_date and reference_date != recorded_date:
+        print(f"[Bench] --reference-date {reference_date} differs from the baseline's {recorded_date}; "
+              f"timings would not be comparable.")
+        sys.exit(2)
+    reference = _reference_epoch(reference_date)
+
+    latency.TRACKER.enabled = False
+    results: Dict[str, Dict[str, dict]] = {}
+    memory: Dict[str, dict] = {}
+    for symbols in args.symbols:
+        db_path, circuit_path = _dataset(args.workdir, args, symbols, reference)
+        results[str(symbols)] = time_universe(db_path, circuit_path, reference, args.cycles, args.refresh_cycles)
+        if not args.no_memory:
+            memory[str(symbols)] = memory_universe(db_path, circuit_path, reference)
+
+    print(f"\n{'symbols':>8}  {'stage':<22}{'median ms':>12}{'p95 ms':>10}")
+    for symbols, stages in results.items():
+        for stage, stats in stages.items():
+            print(f"{symbols:>8}  {stage:<22}{stats['median_ms']:12.2f}{stats['p95_ms']:10.2f}")
+    if memory:
+        print(f"\n{'symbols':>8}{'traced MB':>12}{'peak MB':>10}{'B/symbol':>10}{'ring MB':>10}")
+        for symbols, m in memory.items():
+            print(f"{symbols:>8}{m['traced_current_mb']:12.1f}{m['traced_peak_mb']:10.1f}"
+                  f"{m['bytes_per_symbol']:10.0f}{m['ring_buffer_mb']:10.1f}")
+            for line in m["top_files"]:
+                print(f"{'':>10}{line}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"timings": results, "memory": memory}, f, indent=2)
+
+    medians = {symbols: {stage: stats["median_ms"] for stage, stats in stages.items()}
+               for symbols, stages in results.items()}
+    # Medians recorded against another reference date are not comparable with these
+    if baseline is None or recorded_date != reference_date:
+        baseline = {}
+    new = medians if args.record else {symbols: m for symbols, m in medians.items() if symbols not in baseline}
+    if new:
+        baseline.update(new)
+        baseline["reference_date"] = reference_date
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\n[Bench] Recorded {', '.join(new)} symbols to {args.baseline}; later runs on this machine compare against it.")
+    if args.record:
+        return
+    compared = {symbols: r for symbols, r in results.items() if symbols not in new}
+    if not compared:
+        return
+    regressions = compare(compared, baseline, args.tolerance, args.min_delta_ms)
+    if regressions:
+        print("\n[Bench] Regressions beyond baseline:")
+        for line in regressions:
+            print("  " + line)
+        sys.exit(1)
+    print(f"\n[Bench] All stages within {args.tolerance * 100:.0f}% of baseline.")
+
+
+if __name__ == "__main__":
+    main()
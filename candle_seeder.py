@@ -0,0 +1,267 @@
+"""
+Daily candle seeding.
+
+Bulk-loads completed daily candles for every symbol in symbols.txt (and the
+lite profile's symbols_lite.txt) into the daily_bars table, so weekly/monthly
+high/low alerts have enough history from the first session instead of waiting
+for WEEK_MIN_DAYS/MONTH_MIN_DAYS days of our own ticks. Ranges already fetched are remembered per symbol, so reruns
+only request the days that are missing.
+
+    python candle_seeder.py --days 366
+    python candle_seeder.py --mock --symbols 2000   # local stub API, no Fyers session
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+import db
+import trading_calendar
+from rate_limit import RateLimiter
+
+# Fyers returns at most 366 days of daily candles per request
+MAX_DAYS_PER_REQUEST = 366
+DEFAULT_LOOKBACK_DAYS = 366
+
+
+def _day_epoch(day: int) -> int:
+    """IST midnight epoch for a day number (days since 1970-01-01 IST)."""
+    return day * trading_calendar.SECONDS_PER_DAY - trading_calendar.IST_OFFSET
+
+
+class CandleSeeder:
+    """
+    Fetches daily candles for many symbols concurrently through a rate-limited
+    thread pool and writes them to daily_bars in batches.
+
+    history_client is anything with a FyersModel-style history(data=...) method.
+    """
+
+    def __init__(self, history_client, db_path: str = db.DB_PATH, max_workers: int = 8,
+                 requests_per_second: float = 8.0, batch_symbols: int = 100, retries: int = 3):
+        self.client = history_client
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.limiter = RateLimiter(requests_per_second, burst=max_workers)
+        self.batch_symbols = batch_symbols
+        self.retries = retries
+        self.requests_made = 0
+        self._count_lock = threading.Lock()
+        self.failed_symbols: List[str] = []
+
+    def _missing_ranges(self, fetched: Optional[Tuple[int, int]], first_day: int, last_day: int) -> List[Tuple[int, int]]:
+        if fetched is None:
+            return [(first_day, last_day)]
+        ranges = []
+        if first_day < fetched[0]:
+            ranges.append((first_day, fetched[0] - 1))
+        if last_day > fetched[1]:
+            ranges.append((fetched[1] + 1, last_day))
+        return ranges
+
+    def _request(self, symbol: str, first_day: int, last_day: int) -> Optional[list]:
+        request = {
+            "symbol": symbol,
+            "resolution": "D",
+            "date_format": "0",
+            "range_from": str(_day_epoch(first_day)),
+            "range_to": str(_day_epoch(last_day + 1) - 1),
+            "cont_flag": "1",
+        }
+        response = {}
+        for attempt in range(self.retries):
+            self.limiter.acquire()
+            with self._count_lock:
+                self.requests_made += 1
+            try:
+                response = self.client.history(data=request)
+            except Exception as e:
+                response = {"s": "error", "message": str(e)}
+            if response.get("s") == "ok":
+                return response.get("candles", [])
+            if response.get("s") == "no_data":
+                return []
+            time.sleep(0.5 * (2 ** attempt))
+        print(f"[CandleSeeder] Failed to fetch {symbol}: {response.get('message')}")
+        return None
+
+    def _fetch_symbol(self, symbol: str, ranges: List[Tuple[int, int]]):
+        """Returns (bars, fetched_ok) for one symbol, splitting long ranges into API-sized requests."""
+        bars = []
+        for first_day, last_day in ranges:
+            day = first_day
+            while day <= last_day:
+                chunk_last = min(last_day, day + MAX_DAYS_PER_REQUEST - 1)
+                candles = self._request(symbol, day, chunk_last)
+                if candles is None:
+                    return bars, False
+                for c in candles:
+                    bar_day = trading_calendar.ist_day_start(c[0])
+                    bars.append((symbol, bar_day, c[1], c[2], c[3], c[4], int(c[5])))
+                day = chunk_last + 1
+        return bars, True
+
+    def seed(self, symbols: List[str], lookback_days: int = DEFAULT_LOOKBACK_DAYS) -> int:
+        """Seed completed daily bars (up to yesterday) for the symbols; returns bars written."""
+        started = time.perf_counter()
+        db.init_db(self.db_path)
+        today = trading_calendar.ist_day_number(time.time())
+        first_day, last_day = today - lookback_days, today - 1
+        fetched = db.get_daily_bars_fetched(self.db_path)
+
+        work: Dict[str, List[Tuple[int, int]]] = {}
+        for symbol in symbols:
+            ranges = self._missing_ranges(fetched.get(symbol), first_day, last_day)
+            if ranges:
+                work[symbol] = ranges
+        if not work:
+            print(f"[CandleSeeder] All {len(symbols)} symbols already seeded.")
+            return 0
+
+        conn = sqlite3.connect(self.db_path)
+        written = 0
+        pending_bars, pending_ranges = [], []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self._fetch_symbol, symbol, ranges): symbol for symbol, ranges in work.items()}
+            for future in as_completed(futures):
+                symbol = futures[future]
+                bars, ok = future.result()
+                pending_bars.extend(bars)
+                if ok:
+                    prev = fetched.get(symbol)
+                    lo = first_day if prev is None else min(prev[0], first_day)
+                    hi = last_day if prev is None else max(prev[1], last_day)
+                    pending_ranges.append((symbol, lo, hi))
+                else:
+                    self.failed_symbols.append(symbol)
+                if len(pending_ranges) >= self.batch_symbols:
+                    # Bars go in before the fetched ranges, so a crash never marks unsaved days as done
+                    db.upsert_daily_bars(pending_bars, conn=conn)
+                    db.set_daily_bars_fetched(pending_ranges, conn=conn)
+                    written += len(pending_bars)
+                    pending_bars, pending_ranges = [], []
+        db.upsert_daily_bars(pending_bars, conn=conn)
+        db.set_daily_bars_fetched(pending_ranges, conn=conn)
+        written += len(pending_bars)
+        conn.close()
+        print(f"[CandleSeeder] Seeded {written} daily bars for {len(work)} symbols with {self.requests_made} "
+              f"requests in {time.perf_counter() - started:.1f}s ({len(self.failed_symbols)} failed).")
+        return written
+
+
+def seed_from_symbols_file(history_client, db_path: str = db.DB_PATH, lookback_days: int = DEFAULT_LOOKBACK_DAYS, **kwargs) -> int:
+    """Seed symbols.txt plus the lite profile's symbols_lite.txt (if present), which are screened the same way."""
+    from ws_collector import LITE_SYMBOLS_FILE, load_symbols
+    symbols = load_symbols()
+    if os.path.exists(LITE_SYMBOLS_FILE):
+        symbols = list(dict.fromkeys(symbols + load_symbols(LITE_SYMBOLS_FILE)))
+    return CandleSeeder(history_client, db_path=db_path, **kwargs).seed(symbols, lookback_days)
+
+
+class StubHistoryClient:
+    """
+    Stands in for FyersModel.history with resolution "D": one deterministic
+    candle per trading day in the requested range, stamped at IST midnight like
+    Fyers daily candles. Every `fail_every`-th request returns an error, so a
+    run also exercises the seeder's retries.
+    """
+
+    def __init__(self, fail_every: int = 50, latency: float = 0.005):
+        self.fail_every = fail_every
+        self.latency = latency
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._days: Dict[Tuple[int, int], List[int]] = {}
+
+    def _trading_days(self, start: int, end: int) -> List[int]:
+        key = (start, end)
+        days = self._days.get(key)
+        if days is None:
+            days = []
+            for day in range(trading_calendar.ist_day_number(start), trading_calendar.ist_day_number(end) + 1):
+                midnight = _day_epoch(day)
+                if start <= midnight <= end and trading_calendar.get_calendar(midnight).is_trading_day(midnight):
+                    days.append(midnight)
+            self._days[key] = days
+        return days
+
+    def history(self, data: dict) -> dict:
+        if data.get("resolution") != "D":
+            return {"s": "error", "code": -50, "message": f"unsupported resolution {data.get('resolution')}"}
+        with self._lock:
+            self.requests += 1
+            fail = self.fail_every and self.requests % self.fail_every == 0
+            if fail:
+                self.errors += 1
+        time.sleep(self.latency)
+        if fail:
+            return {"s": "error", "code": 429, "message": "request limit reached"}
+        seed = sum(map(ord, data["symbol"]))
+        candles = []
+        for t in self._trading_days(int(data["range_from"]), int(data["range_to"])):
+            price = 100 + (seed + t // trading_calendar.SECONDS_PER_DAY) % 50
+            candles.append([t, price, price + 2.0, price - 2.0, price + 0.5, 100000])
+        return {"s": "ok" if candles else "no_data", "candles": candles}
+
+
+def run_mock(symbols: int, days: int, workers: int, rate: float) -> bool:
+    """
+    Seed daily bars for `symbols` stub symbols into a scratch database, then
+    seed again and check the rerun requests nothing and leaves daily_bars unchanged.
+    """
+    import tempfile
+
+    db_path = os.path.join(tempfile.mkdtemp(), "candle_seeder_mock.db")
+    names = [f"NSE:MOCK{i}-EQ" for i in range(symbols)]
+    client = StubHistoryClient()
+    counts, requests = [], []
+    for run in (1, 2):
+        seeder = CandleSeeder(client, db_path=db_path, max_workers=workers, requests_per_second=rate)
+        started = time.perf_counter()
+        written = seeder.seed(names, days)
+        elapsed = time.perf_counter() - started
+        conn = sqlite3.connect(db_path)
+        counts.append(conn.execute("SELECT COUNT(*) FROM daily_bars").fetchone()[0])
+        seeded = conn.execute("SELECT COUNT(*) FROM daily_bars_fetched").fetchone()[0]
+        conn.close()
+        requests.append(seeder.requests_made)
+        print(f"[Mock] Run {run}: {written} bars written with {seeder.requests_made} requests in {elapsed:.1f}s, "
+              f"{counts[-1]} rows in daily_bars, {seeded}/{symbols} symbols marked fetched, "
+              f"{len(seeder.failed_symbols)} failed")
+    print(f"[Mock] Stub served {client.requests} requests ({client.errors} injected errors, retried)")
+    ok = counts[0] > 0 and counts[0] == counts[1] and requests[1] == 0
+    print(f"[Mock] {'OK' if ok else 'FAILED'}: daily_bars {counts[0]} -> {counts[1]} rows, "
+          f"{requests[1]} requests on the rerun")
+    return ok
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Seed daily candles for all symbols in symbols.txt and symbols_lite.txt.")
+    parser.add_argument("--db", default=db.DB_PATH)
+    parser.add_argument("--days", type=int, default=DEFAULT_LOOKBACK_DAYS, help="Calendar days of history")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=8.0, help="History requests per second")
+    parser.add_argument("--mock", action="store_true", help="Seed stub symbols from a local stub client")
+    parser.add_argument("--symbols", type=int, default=2000, help="Mock symbol count")
+    args = parser.parse_args()
+
+    if args.mock:
+        raise SystemExit(0 if run_mock(args.symbols, args.days, args.workers, max(args.rate, 1000.0)) else 1)
+
+    from fyers_service import FyersService
+
+    service = FyersService()
+    if not service.fyers:
+        print("Fyers session not initialized or token is missing.")
+        return
+    seed_from_symbols_file(service.fyers, db_path=args.db, lookback_days=args.days,
+                           max_workers=args.workers, requests_per_second=args.rate)
+
+
+if __name__ == "__main__":
+    main()
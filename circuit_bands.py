@@ -0,0 +1,119 @@
+"""
+Circuit bands per symbol, maintained from the tick stream.
+
+Every full-mode tick carries lower_ckt/upper_ckt, so the collector feeds each
+one into a CircuitBandStore. A tick whose band equals the stored one costs a
+dict lookup and a tuple compare; a changed band is stored and reported to the
+listeners (the screener) straight away, so a revised band is used from the
+next screening cycle.
+
+daily_circuits.csv is optional: loaded as a seed it provides bands until the
+first tick for a symbol arrives; loaded as overrides its bands win over the
+ticks for the symbols it lists.
+"""
+import csv
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+CIRCUIT_FILE = "daily_circuits.csv"
+
+Band = Tuple[float, float]  # (lower, upper)
+
+
+def load_circuit_file(path: str = CIRCUIT_FILE) -> Dict[str, Band]:
+    """Bands from a CSV with symbol, upper_ckt and lower_ckt columns; {} if the file is missing or unreadable."""
+    bands = {}
+    try:
+        with open(path, newline='') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                symbol = row["symbol"].strip()
+                try:
+                    upper = float(row["upper_ckt"].replace(",", ""))
+                    lower = float(row["lower_ckt"].replace(",", ""))
+                    bands[symbol] = (lower, upper)
+                except Exception:
+                    continue
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"[CircuitBands] Failed to load circuit file: {e}")
+    return bands
+
+
+class CircuitBandStore:
+    def __init__(self):
+        self._bands: Dict[str, Band] = {}
+        self._overrides: Dict[str, Band] = {}
+        self._listeners: List[Callable[[str, float, float], None]] = []
+        self._lock = threading.Lock()
+        self.changes = 0
+
+    def __len__(self):
+        return len(self._bands.keys() | self._overrides.keys())
+
+    def add_listener(self, callback: Callable[[str, float, float], None]):
+        """callback(symbol, lower, upper) is called on the updating thread whenever a symbol's band changes."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def get(self, symbol) -> Optional[Band]:
+        band = self._overrides.get(symbol)
+        return band if band is not None else self._bands.get(symbol)
+
+    def snapshot(self) -> Dict[str, Band]:
+        with self._lock:
+            bands = dict(self._bands)
+            bands.update(self._overrides)
+        return bands
+
+    def update(self, symbol, lower, upper) -> bool:
+        """Record the band carried on a tick. Returns True if it changed the symbol's effective band."""
+        if not lower or not upper:
+            return False
+        band = (lower, upper)
+        if self._bands.get(symbol) == band:
+            return False
+        with self._lock:
+            self._bands[symbol] = band
+            if symbol in self._overrides:
+                return False
+            self.changes += 1
+        self._notify(symbol, band)
+        return True
+
+    def update_from_tick(self, tick: dict) -> bool:
+        return self.update(tick.get("symbol"), tick.get("lower_ckt"), tick.get("upper_ckt"))
+
+    def seed(self, bands: Dict[str, Band]):
+        """Bands for symbols that have not ticked yet; never replaces a band already seen on a tick."""
+        for symbol, (lower, upper) in bands.items():
+            if symbol not in self._bands:
+                self.update(symbol, lower, upper)
+
+    def set_overrides(self, bands: Dict[str, Band]):
+        """Replace the override set; listed symbols ignore the bands on their ticks."""
+        with self._lock:
+            previous = self._overrides
+            self._overrides = dict(bands)
+        for symbol in previous.keys() | self._overrides.keys():
+            band = self.get(symbol)
+            if band is not None and band != previous.get(symbol):
+                self._notify(symbol, band)
+
+    def load_csv(self, path: str = CIRCUIT_FILE, override: bool = False) -> int:
+        bands = load_circuit_file(path)
+        if override:
+            self.set_overrides(bands)
+        elif bands:
+            self.seed(bands)
+        if bands:
+            print(f"[CircuitBands] Loaded {len(bands)} bands from {path} as {'overrides' if override else 'seed'}.")
+        return len(bands)
+
+    def _notify(self, symbol, band: Band):
+        for callback in list(self._listeners):
+            try:
+                callback(symbol, band[0], band[1])
+            except Exception as e:
+                print("[CircuitBands] Listener failed:", e)
@@ -1,22 +1,63 @@
+import os
 import threading
+import time
 import ws_collector
-from datetime import datetime
-from zoneinfo import ZoneInfo
+import trading_calendar
+from tick_buffer import TickRingBuffers
+from latest_ticks import LatestTickStore
+from circuit_bands import CircuitBandStore
+from collector_supervisor import CollectorSupervisor
+from symbol_watcher import SymbolFileWatcher
+
+def universe_size():
+    """Distinct symbols across symbols.txt, symbols_lite.txt and symbols_rest.txt (all share the ring buffers)."""
+    from rest_poller import REST_SYMBOLS_FILE
+    symbols = set()
+    for path in (ws_collector.SYMBOLS_FILE, ws_collector.LITE_SYMBOLS_FILE, REST_SYMBOLS_FILE):
+        if os.path.exists(path):
+            symbols.update(ws_collector.load_symbols(path))
+    return len(symbols)
 
 class CollectorManager:
-    def __init__(self, end_time_str="15:30:05"):
+    def __init__(self, end_time_str="15:30:05", tick_buffers=None, stop_timeout=10.0, supervise=True, indicators=None):
         self.thread = None
         self.collector_instance = None
         self.db_worker = None
         self.ws_thread = None
         self.end_time_str = end_time_str
         self.closed_callback = None  # Optional callback for UI message
+        # Recent ticks per symbol (full, lite and REST), shared with the screener for in-memory
+        # window queries; sized for the whole universe plus headroom for hot-reloaded additions
+        if tick_buffers is None:
+            tick_buffers = TickRingBuffers(max_symbols=max(5000, int(universe_size() * 1.1)))
+        self.tick_buffers = tick_buffers
+        # Latest tick per symbol for live views (watchlist)
+        self.latest_ticks = LatestTickStore()
+        # Circuit bands from the full-mode ticks, shared with the screener
+        self.circuit_bands = CircuitBandStore()
+        # Optional indicators.IndicatorEngine, updated by every full-mode and REST tick
+        self.indicators = indicators
+        self.stop_timeout = stop_timeout
+        self.supervise = supervise
+        self.supervisor = None
+        self.rest_poller = None
+        self.rest_db_worker = None
+        # Lite profile (symbols_lite.txt): LTP-only sockets sharing one LiteTickDBWorker
+        self.lite_collectors = []
+        self.lite_threads = []
+        self.lite_db_worker = None
+        # Extra full-profile sockets for symbols beyond ws_collector.MAX_SYMBOLS_PER_SOCKET
+        self.extra_collectors = []
+        self.extra_threads = []
+        self._symbols_listeners = []  # callbacks(added, removed) after a universe change
+        self.symbol_watcher = None
+        self._lock = threading.Lock()
+        self._restarting = False
 
     def _is_past_end_time(self):
-        TZ = ZoneInfo("Asia/Kolkata")
-        now = datetime.now(TZ).time()
-        end_time = datetime.strptime(self.end_time_str, "%H:%M:%S").time()
-        return now >= end_time
+        # Also true all day on weekends and exchange holidays
+        cal = trading_calendar.get_calendar(session_end=self.end_time_str)
+        return cal.is_past_close()
 
     def set_closed_callback(self, cb):
         """Register a callback to be called when session is over and start is refused."""
@@ -24,7 +65,10 @@ class CollectorManager:
 
     def start(self):
         if self._is_past_end_time():
-            msg = f"[CollectorManager] Refusing to start: current time is past end time ({self.end_time_str} IST)."
+            if trading_calendar.get_calendar(session_end=self.end_time_str).is_trading_day():
+                msg = f"[CollectorManager] Refusing to start: current time is past end time ({self.end_time_str} IST)."
+            else:
+                msg = "[CollectorManager] Refusing to start: today is not a trading day."
             print(msg)
             if self.closed_callback:
                 self.closed_callback()
@@ -35,10 +79,21 @@ class CollectorManager:
             return
 
         def run_collector():
-            result = ws_collector.main(return_collector=True)
+            result = ws_collector.main(return_collector=True, tick_buffers=self.tick_buffers, latest_ticks=self.latest_ticks,
+                                       circuit_bands=self.circuit_bands, indicators=self.indicators)
             if result is not None:
                 self.collector_instance, self.db_worker, self.ws_thread = result
-                self.ws_thread.join()
+                self._start_lite_collectors(self.collector_instance.ws_access_token)
+                # Spill symbols beyond the first socket's cap onto extra sockets
+                self.reload_symbols(lite=False)
+                # Keep waiting across supervisor restarts, which swap in a new ws_thread
+                while True:
+                    ws_thread = self.ws_thread
+                    ws_thread.join()
+                    if self._restarting or self.ws_thread is not ws_thread:
+                        time.sleep(0.1)
+                        continue
+                    break
                 print("[CollectorManager] Collector thread exiting.")
             else:
                 print("[CollectorManager] Collector failed to start.")
@@ -47,15 +102,247 @@ class CollectorManager:
         self.thread.start()
         print("[CollectorManager] Collector started.")
 
+        self._start_rest_poller()
+
+        if self.supervise and (self.supervisor is None or not self.supervisor.is_alive()):
+            self.supervisor = CollectorSupervisor(self, session_end=self.end_time_str)
+            self.supervisor.start()
+
+        if self.symbol_watcher is None or not self.symbol_watcher.is_alive():
+            self.symbol_watcher = SymbolFileWatcher(self)
+            self.symbol_watcher.start()
+
+    def _start_lite_collectors(self, ws_access_token):
+        if self.lite_db_worker is not None:
+            return
+        result = ws_collector.start_lite_collectors(
+            ws_access_token, tick_buffers=self.tick_buffers, latest_ticks=self.latest_ticks, indicators=self.indicators
+        )
+        if result is not None:
+            self.lite_collectors, self.lite_db_worker, self.lite_threads = result
+
+    def _start_rest_poller(self):
+        """Poll symbols_rest.txt (symbols not on the WebSocket) over REST, if the file exists."""
+        if self.rest_poller is not None and self.rest_poller.is_alive():
+            return
+        import rest_poller
+        if not rest_poller.load_rest_symbols():
+            return
+        from db import TickDBWorker
+        self.rest_db_worker = TickDBWorker(db_path=ws_collector.DB_PATH, batch_size=50, label="rest")
+        self.rest_db_worker.start()
+        self.rest_poller = rest_poller.start_rest_poller(
+            self.rest_db_worker, tick_buffers=self.tick_buffers, latest_ticks=self.latest_ticks,
+            circuit_bands=self.circuit_bands, indicators=self.indicators
+        )
+        if self.rest_poller is None:
+            self.rest_db_worker.stop()
+            self.rest_db_worker = None
+
+    def restart_collector(self):
+        """Replace the websocket connection, keeping the DB worker and buffers. Called by the supervisor."""
+        with self._lock:
+            old = self.collector_instance
+            if old is None or self.db_worker is None:
+                # Never came up (e.g. token/symbol load failure): retry a full start
+                if not self.is_running():
+                    self.start()
+                return
+            self._restarting = True
+            try:
+                old.stop()
+                if self.ws_thread and not self._join(self.ws_thread, self.stop_timeout):
+                    print("[CollectorManager] Old websocket thread did not exit in time; abandoning it.")
+                collector = ws_collector.TickCollector(
+                    old.symbols, old.ws_access_token, self.db_worker,
+                    tick_buffers=self.tick_buffers, latest_ticks=self.latest_ticks,
+                    depth_symbols=old.depth_symbols, depth_worker=old.depth_worker, circuit_bands=self.circuit_bands,
+                    indicators=self.indicators
+                )
+                ws_thread = threading.Thread(target=collector.run, daemon=True)
+                ws_thread.start()
+                self.collector_instance, self.ws_thread = collector, ws_thread
+                print("[CollectorManager] Collector restarted.")
+            finally:
+                self._restarting = False
+
+    def add_symbols_listener(self, callback):
+        """Register callback(added, removed), called after symbols are added to or removed from the live sockets."""
+        self._symbols_listeners.append(callback)
+
+    def reload_symbols(self, lite=False):
+        """Re-read symbols.txt (or symbols_lite.txt) and apply the difference to the live sockets."""
+        path = ws_collector.LITE_SYMBOLS_FILE if lite else ws_collector.SYMBOLS_FILE
+        try:
+            symbols = ws_collector.load_symbols(path)
+        except FileNotFoundError:
+            symbols = []
+        if not symbols and not lite:
+            # Most likely a half-written file; never unsubscribe the whole universe
+            print(f"[CollectorManager] {path} is empty or missing; keeping current symbols.")
+            return [], []
+        return self.update_symbols(symbols, lite=lite)
+
+    def update_symbols(self, symbols, lite=False):
+        """
+        Make the live full (or lite) profile sockets cover exactly `symbols`.
+
+        Removed symbols are unsubscribed; added symbols are subscribed on the least
+        loaded socket with room, and new sockets are opened once every socket holds
+        MAX_SYMBOLS_PER_SOCKET. Returns (added, removed).
+        """
+        with self._lock:
+            main = self.collector_instance
+            if main is None:
+                return [], []
+            wanted = list(dict.fromkeys(symbols))
+            if lite:
+                full = set(main.symbols).union(*(c.symbols for c in self.extra_collectors))
+                wanted = [s for s in wanted if s not in full]
+                if self.lite_db_worker is None:
+                    if wanted:
+                        self.tick_buffers.reserve(len(self.tick_buffers) + len(wanted))
+                        self._start_lite_collectors(main.ws_access_token)
+                        added = [s for c in self.lite_collectors for s in c.symbols]
+                        self._notify_symbols(added, [])
+                        return added, []
+                    return [], []
+                collectors, threads = self.lite_collectors, self.lite_threads
+            else:
+                collectors, threads = [main] + self.extra_collectors, self.extra_threads
+            wanted_set = set(wanted)
+            current = [s for c in collectors for s in c.symbols]
+            current_set = set(current)
+            removed = [s for s in current if s not in wanted_set]
+            added = [s for s in wanted if s not in current_set]
+            if not added and not removed:
+                return [], []
+            # Every added symbol may need its own ring-buffer row; the screener reads only the buffers
+            self.tick_buffers.reserve(len(self.tick_buffers) + len(added))
+
+            removed_set = set(removed)
+            for collector in collectors:
+                gone = [s for s in collector.symbols if s in removed_set]
+                if gone:
+                    collector.remove_symbols(gone)
+            if not lite and self.lite_collectors:
+                # Symbols promoted to the full profile leave the lite sockets (their buffers,
+                # latest tick and indicators carry over), so they are not collected twice
+                added_set = set(added)
+                for collector in list(self.lite_collectors):
+                    moved = [s for s in collector.symbols if s in added_set]
+                    if moved:
+                        collector.remove_symbols(moved)
+                    if not collector.symbols:
+                        i = self.lite_collectors.index(collector)
+                        collector.stop()
+                        del self.lite_collectors[i]
+                        del self.lite_threads[i]
+
+            cap = ws_collector.MAX_SYMBOLS_PER_SOCKET
+            pending = list(added)
+            for collector in sorted(collectors, key=lambda c: len(c.symbols)):
+                room = cap - len(collector.symbols)
+                if pending and room > 0:
+                    collector.add_symbols(pending[:room])
+                    pending = pending[room:]
+            while pending:
+                collector, thread = self._open_socket(pending[:cap], main.ws_access_token, lite)
+                collectors.append(collector)
+                threads.append(thread)
+                pending = pending[cap:]
+
+            # Close sockets left empty, except the supervised main one
+            for collector, thread in list(zip(collectors[1 if not lite else 0:], threads)):
+                if not collector.symbols:
+                    collector.stop()
+                    collectors.remove(collector)
+                    threads.remove(thread)
+            if not lite:
+                self.extra_collectors = collectors[1:]
+
+            kept = set()
+            if not lite and removed and os.path.exists(ws_collector.LITE_SYMBOLS_FILE):
+                # Going back to the lite profile below: keep their buffers, latest tick and indicators
+                kept = set(ws_collector.load_symbols(ws_collector.LITE_SYMBOLS_FILE))
+            for symbol in removed:
+                if symbol in kept:
+                    continue
+                self.tick_buffers.remove(symbol)
+                self.latest_ticks.remove(symbol)
+                if self.indicators is not None:
+                    self.indicators.remove(symbol)
+            if self.supervisor is not None and not lite:
+                self.supervisor.forget_symbols(removed)
+        print(f"[CollectorManager] {'Lite' if lite else 'Full'} symbols updated: +{len(added)} -{len(removed)} "
+              f"across {len(collectors)} socket(s).")
+        self._notify_symbols(added, removed)
+        if not lite and removed and os.path.exists(ws_collector.LITE_SYMBOLS_FILE):
+            # Symbols dropped from the full profile but still listed in symbols_lite.txt go back to lite
+            self.reload_symbols(lite=True)
+        return added, removed
+
+    def _open_socket(self, symbols, ws_access_token, lite):
+        if lite:
+            collector = ws_collector.LiteTickCollector(symbols, ws_access_token, self.lite_db_worker,
+                                                       tick_buffers=self.tick_buffers, latest_ticks=self.latest_ticks,
+                                                       indicators=self.indicators)
+        else:
+            collector = ws_collector.TickCollector(symbols, ws_access_token, self.db_worker,
+                                                   tick_buffers=self.tick_buffers, latest_ticks=self.latest_ticks,
+                                                   circuit_bands=self.circuit_bands, indicators=self.indicators)
+        thread = threading.Thread(target=collector.run, daemon=True)
+        thread.start()
+        return collector, thread
+
+    def _notify_symbols(self, added, removed):
+        for callback in self._symbols_listeners:
+            try:
+                callback(added, removed)
+            except Exception as e:
+                print("[CollectorManager] Symbols listener failed:", e)
+
+    @staticmethod
+    def _join(thread, timeout):
+        thread.join(timeout=timeout)
+        return not thread.is_alive()
+
     def stop(self):
+        if self.symbol_watcher:
+            self.symbol_watcher.stop()
+            self.symbol_watcher = None
+        if self.supervisor:
+            self.supervisor.stop()
+            self.supervisor = None
+        deadline = time.monotonic() + self.stop_timeout
         if self.collector_instance:
             self.collector_instance.stop()
             print("[CollectorManager] Collector stop signal sent.")
-        if self.ws_thread:
-            self.ws_thread.join(timeout=10)
+        for collector in self.lite_collectors + self.extra_collectors:
+            collector.stop()
+        if self.ws_thread and not self._join(self.ws_thread, max(0.0, deadline - time.monotonic())):
+            print(f"[CollectorManager] Websocket thread still alive after {self.stop_timeout}s; flushing anyway.")
+        for thread in self.lite_threads + self.extra_threads:
+            self._join(thread, max(0.0, deadline - time.monotonic()))
+        self.extra_collectors, self.extra_threads = [], []
         if self.db_worker:
             self.db_worker.stop()
             print("[CollectorManager] DB worker stop signal sent.")
+        if self.collector_instance and self.collector_instance.depth_worker:
+            self.collector_instance.depth_worker.stop()
+            print("[CollectorManager] Depth worker stopped.")
+        if self.lite_db_worker:
+            self.lite_db_worker.stop()
+            print("[CollectorManager] Lite DB worker stopped.")
+        self.lite_collectors, self.lite_threads, self.lite_db_worker = [], [], None
+        if self.rest_poller:
+            self.rest_poller.stop(timeout=max(0.0, deadline - time.monotonic()))
+            self.rest_poller = None
+        if self.rest_db_worker:
+            self.rest_db_worker.stop()
+            self.rest_db_worker = None
+        import latency
+        latency.TRACKER.save()
 
     def is_running(self):
-        return self.thread is not None and self.thread.is_alive()
\ No newline at end of file
+        return self.thread is not None and self.thread.is_alive()
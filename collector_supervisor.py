@@ -0,0 +1,192 @@
+import threading
+import time
+from typing import Dict
+
+import db
+import trading_calendar
+
+
+class CollectorSupervisor(threading.Thread):
+    """
+    Watches a CollectorManager's live collector and recovers it.
+
+    Every check_interval seconds during market hours it compares tick activity
+    against what is expected:
+    - no ticks at all for stall_timeout seconds (or the socket thread died)
+      -> restart the socket, with exponential backoff between attempts
+    - smoothed feed lag (received_time - exch_feed_time) above lag_threshold
+      for lag_checks consecutive checks -> restart the socket
+    - a symbol silent for symbol_stall_factor times its usual inter-tick gap
+      (at least min_symbol_stall seconds) while others tick -> resubscribe it
+
+    Every outage is recorded in the collector_outages table with the time of
+    the last tick before it and the time ticks resumed, so the affected ranges
+    can be backfilled.
+    """
+
+    def __init__(
+        self,
+        manager,
+        db_path=db.DB_PATH,
+        check_interval=5.0,
+        stall_timeout=30.0,
+        lag_threshold=10.0,
+        lag_checks=3,
+        symbol_stall_factor=20.0,
+        min_symbol_stall=120.0,
+        backoff_base=5.0,
+        backoff_max=300.0,
+        session_start="09:14:58",
+        session_end="15:30:05"
+    ):
+        super().__init__(daemon=True)
+        self.manager = manager
+        self.db_path = db_path
+        self.check_interval = check_interval
+        self.stall_timeout = stall_timeout
+        self.lag_threshold = lag_threshold
+        self.lag_checks = lag_checks
+        self.symbol_stall_factor = symbol_stall_factor
+        self.min_symbol_stall = min_symbol_stall
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session_start = session_start
+        self.session_end = session_end
+        self._stop_event = threading.Event()
+
+        self.restart_count = 0
+        self._consecutive_failures = 0
+        self._next_restart_allowed = 0.0
+        self._lag_strikes = 0
+        self._prev_counts: Dict[str, int] = {}
+        self._prev_total = 0
+        self.global_rate = 0.0  # ticks/sec, smoothed
+        self.symbol_rates: Dict[str, float] = {}  # ticks/sec per symbol, smoothed
+        self._global_outage = None  # (outage_id, start_time)
+        self._symbol_outages: Dict[str, tuple] = {}
+        db.init_outage_table(db_path)
+
+    def run(self):
+        while not self._stop_event.wait(self.check_interval):
+            try:
+                if trading_calendar.is_market_open(self.session_start, self.session_end):
+                    self.check()
+            except Exception as e:
+                print("[CollectorSupervisor] Check failed:", e)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _backoff_delay(self):
+        return min(self.backoff_base * (2 ** self._consecutive_failures), self.backoff_max)
+
+    def check(self):
+        now = time.time()
+        collector = self.manager.collector_instance
+        ws_thread = self.manager.ws_thread
+
+        if collector is None and self.manager.is_running():
+            return  # Still starting up
+        if collector is None or ws_thread is None or not ws_thread.is_alive():
+            self._handle_global_stall(now, collector, "collector not running")
+            return
+
+        self._update_rates(collector)
+
+        last_tick = collector.last_tick_time or collector.started_time or now
+        if now - last_tick >= self.stall_timeout:
+            self._handle_global_stall(now, collector, f"no ticks for {now - last_tick:.0f}s")
+            return
+
+        if collector.lag_ewma is not None and collector.lag_ewma > self.lag_threshold:
+            self._lag_strikes += 1
+            if self._lag_strikes >= self.lag_checks:
+                self._handle_global_stall(now, collector, f"feed lag {collector.lag_ewma:.1f}s")
+                return
+        else:
+            self._lag_strikes = 0
+
+        # Healthy: close any open global outage at the first tick after it
+        if self._global_outage is not None and collector.last_tick_time:
+            outage_id, start = self._global_outage
+            resumed = collector.first_tick_time if collector.first_tick_time > start else collector.last_tick_time
+            db.close_outage(outage_id, resumed, self.db_path)
+            print("[CollectorSupervisor] Ticks resumed; outage closed.")
+            self._global_outage = None
+            self._consecutive_failures = 0
+
+        self._check_symbols(now, collector)
+
+    def _update_rates(self, collector):
+        counts = dict(collector.symbol_tick_counts)
+        total = sum(counts.values())
+        if total < self._prev_total:
+            # New collector instance after a restart; counts start from zero
+            self._prev_counts = {}
+            self._prev_total = 0
+        self.global_rate = 0.8 * self.global_rate + 0.2 * (total - self._prev_total) / self.check_interval
+        for symbol, count in counts.items():
+            rate = (count - self._prev_counts.get(symbol, 0)) / self.check_interval
+            self.symbol_rates[symbol] = 0.8 * self.symbol_rates.get(symbol, rate) + 0.2 * rate
+        self._prev_counts = counts
+        self._prev_total = total
+
+    def _check_symbols(self, now, collector):
+        stalled = []
+        for symbol, last in list(collector.symbol_last_tick.items()):
+            rate = self.symbol_rates.get(symbol, 0.0)
+            expected_gap = (1.0 / rate) if rate > 0 else float("inf")
+            limit = max(self.min_symbol_stall, self.symbol_stall_factor * expected_gap)
+            outage = self._symbol_outages.get(symbol)
+            if now - last >= limit:
+                if outage is None:
+                    outage_id = db.open_outage(symbol, last, "symbol stalled", self.db_path)
+                    self._symbol_outages[symbol] = (outage_id, last)
+                    stalled.append(symbol)
+            elif outage is not None and last > outage[1]:
+                db.close_outage(outage[0], last, self.db_path)
+                del self._symbol_outages[symbol]
+        if stalled:
+            print(f"[CollectorSupervisor] Resubscribing {len(stalled)} stalled symbol(s): {stalled[:10]}")
+            try:
+                collector.resubscribe(stalled)
+            except Exception as e:
+                print("[CollectorSupervisor] Resubscribe failed:", e)
+
+    def forget_symbols(self, symbols):
+        """Stop tracking symbols removed from the universe, closing any open outage for them."""
+        now = int(time.time())
+        for symbol in symbols:
+            outage = self._symbol_outages.pop(symbol, None)
+            if outage is not None:
+                db.close_outage(outage[0], now, self.db_path)
+            self.symbol_rates.pop(symbol, None)
+            self._prev_total -= self._prev_counts.pop(symbol, 0)
+
+    def _handle_global_stall(self, now, collector, reason):
+        if self._global_outage is None:
+            start = now
+            if collector is not None:
+                start = collector.last_tick_time or collector.started_time or now
+            outage_id = db.open_outage("global", start, reason, self.db_path)
+            self._global_outage = (outage_id, start)
+            print(f"[CollectorSupervisor] Outage detected: {reason}")
+        if now < self._next_restart_allowed:
+            return
+        self._lag_strikes = 0
+        self._consecutive_failures += 1
+        self._next_restart_allowed = now + self._backoff_delay()
+        self.restart_count += 1
+        print(f"[CollectorSupervisor] Restarting collector (attempt {self._consecutive_failures}, reason: {reason}).")
+        try:
+            self.manager.restart_collector()
+        except Exception as e:
+            print("[CollectorSupervisor] Restart failed:", e)
+
+    def status(self) -> dict:
+        return {
+            "global_rate": self.global_rate,
+            "restart_count": self.restart_count,
+            "in_outage": self._global_outage is not None,
+            "stalled_symbols": sorted(self._symbol_outages),
+        }
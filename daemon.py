@@ -0,0 +1,178 @@
+"""
+Headless runtime: collector, scheduler and screener without Tk.
+
+    python main.py --headless
+
+start_services() is also used by the GUI, so both front ends wire the same
+jobs. Heavy modules (fyers_apiv3, numpy, tkinter) are only imported when the
+component that needs them is constructed.
+"""
+import os
+import signal
+import threading
+import time
+
+SESSION_START = "09:14:58"
+SESSION_END = "15:30:05"
+
+
+class StartupTimer:
+    """Records elapsed wall time per startup phase, from process start to ready."""
+
+    def __init__(self, t0=None):
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self._last = self.t0
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def report(self, label="Startup"):
+        total = self._last - self.t0
+        parts = ", ".join(f"{name} {secs * 1000:.0f}ms" for name, secs in self.phases)
+        print(f"[{label}] Ready in {total * 1000:.0f}ms ({parts})")
+        return total
+
+
+class Services:
+    def __init__(self, collector_manager, scheduler, screener, metrics_server=None, indicators=None):
+        self.collector_manager = collector_manager
+        self.scheduler = scheduler
+        self.screener = screener
+        self.metrics_server = metrics_server  # (server, thread) or None
+        self.indicators = indicators
+
+    def stop(self):
+        self.scheduler.stop()
+        self.collector_manager.stop()
+        if self.indicators is not None:
+            self.indicators.save()
+        if self.metrics_server:
+            import metrics
+            metrics.stop_metrics_server(*self.metrics_server)
+            self.metrics_server = None
+
+
+def register_maintenance_jobs(scheduler, db_path, indicators=None):
+    """Pre-open seeding and end-of-day backfill/maintenance jobs."""
+    from db import optimize_db
+    from fyers_service import get_service
+
+    def history_client():
+        service = get_service()
+        service.ensure_session()
+        return service.fyers
+
+    def run_candle_seeding():
+        import candle_seeder
+        client = history_client()
+        if client:
+            candle_seeder.seed_from_symbols_file(client, db_path=db_path)
+            if indicators is not None:
+                indicators.seed_from_db(db_path)
+
+    def run_eod_backfill():
+        import backfill
+        client = history_client()
+        if client:
+            backfill.backfill_today(client, db_path)
+
+    scheduler.add_daily_job("seed_daily_bars", run_candle_seeding, "08:45:00", threaded=True)
+    scheduler.add_daily_job("eod_backfill", run_eod_backfill, "15:35:00", threaded=True)
+    scheduler.add_daily_job("eod_db_maintenance", lambda: optimize_db(db_path), "15:45:00", threaded=True)
+    if indicators is not None:
+        scheduler.add_daily_job("indicator_checkpoint", indicators.save, "15:40:00", threaded=True)
+
+    # PROFILE_AT_OPEN=<seconds> profiles the first seconds of every session (see profiling.py)
+    profile_seconds = float(os.getenv("PROFILE_AT_OPEN", "0") or 0)
+    if profile_seconds > 0:
+        from profiling import PROFILER
+        scheduler.add_daily_job("profile_open", lambda: PROFILER.start(profile_seconds), SESSION_START)
+
+
+def start_services(notice_callback, closed_callback=None, timer=None) -> Services:
+    """Construct and start the collector schedule, maintenance jobs and screener."""
+    timer = timer or StartupTimer()
+    import trading_calendar
+    import ws_scheduler
+    from collector_manager import CollectorManager
+    from db import DB_PATH, init_db
+    from screener import Screener
+    timer.mark("imports")
+
+    init_db(DB_PATH)
+
+    import metrics
+    try:
+        metrics_server = metrics.start_metrics_server()
+    except OSError as e:
+        print(f"[Metrics] Could not start metrics server on port {metrics.METRICS_PORT}: {e}")
+        metrics_server = None
+
+    import indicators as indicators_module
+    indicators = indicators_module.load_or_seed(DB_PATH)
+    timer.mark("indicators")
+
+    collector_manager = CollectorManager(end_time_str=SESSION_END, indicators=indicators)
+    if closed_callback:
+        collector_manager.set_closed_callback(closed_callback)
+    timer.mark("collector manager")
+
+    scheduler = ws_scheduler.run_ws_collector_at_schedule(
+        start_time_str=SESSION_START,
+        end_time_str=SESSION_END,
+        start_callback=collector_manager.start,
+        stop_callback=collector_manager.stop
+    )
+    register_maintenance_jobs(scheduler, DB_PATH, indicators)
+    timer.mark("scheduler")
+
+    screener = Screener(db_path=DB_PATH, notice_callback=notice_callback, proximity_threshold_percent=1.0,
+                        poll_interval=2.0, tick_buffers=collector_manager.tick_buffers,
+                        circuit_bands=collector_manager.circuit_bands, indicators=indicators)
+    collector_manager.add_symbols_listener(screener.update_symbols)
+
+    def start_screener():
+        if not screener.is_alive():
+            screener.start()
+
+    # The screener thread idles outside market hours on its own, so it only
+    # needs starting once, at the first session open
+    if trading_calendar.is_market_open(SESSION_START, SESSION_END):
+        start_screener()
+    else:
+        scheduler.add_daily_job("screener_start", start_screener, SESSION_START)
+    timer.mark("screener")
+    return Services(collector_manager, scheduler, screener, metrics_server, indicators)
+
+
+def print_event(event):
+    print(f"[{event.get('timestamp')}] {event.get('symbol')}: {event.get('event_type')} "
+          f"(ltp={event.get('ltp')}, high={event.get('high')}, low={event.get('low')}, period={event.get('period')})")
+
+
+def run_headless(timer=None):
+    timer = timer or StartupTimer()
+    services = start_services(print_event, timer=timer)
+    timer.report("Daemon")
+    for job in services.scheduler.stats():
+        print(f"[Daemon] Job {job['name']}: next run {job['next_run']}")
+
+    stop_event = threading.Event()
+
+    def on_signal(signum, frame):
+        print(f"[Daemon] Received signal {signum}, shutting down.")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    while not stop_event.wait(1.0):
+        pass
+    services.stop()
+    print("[Daemon] Stopped.")
+
+
+if __name__ == "__main__":
+    run_headless()
@@ -1,9 +1,16 @@
 import sqlite3
 import threading
+import time
 from typing import Dict, Any, List, Optional, Tuple
 
+from profiling import TimedConnection, checkpoint
+
 DB_PATH = "ticks_data.db"
 
+def _connect(database, **kwargs) -> sqlite3.Connection:
+    # TimedConnection times statements while a profiling window is open
+    return sqlite3.connect(database, factory=TimedConnection, **kwargs)
+
 TICK_FIELDS = [
     "symbol",
     "exch_feed_time",  # Exchange feed time as IST epoch (seconds since 1970-01-01 05:30:00 IST)
@@ -23,7 +30,9 @@ TICK_FIELDS = [
 ]
 
 def init_db(db_path: str = DB_PATH):
-    conn = sqlite3.connect(db_path)
+    conn = _connect(db_path)
+    # WAL lets read-only readers (query_server.py, the GUI) run alongside the ingest writer
+    conn.execute("PRAGMA journal_mode=WAL")
     cursor = conn.cursor()
     cursor.execute(f"""
         CREATE TABLE IF NOT EXISTS ticks (
@@ -49,6 +58,56 @@ def init_db(db_path: str = DB_PATH):
     cursor.execute("""
         CREATE INDEX IF NOT EXISTS idx_symbol_time ON ticks(symbol, exch_feed_time);
     """)
+    # 1-minute candles backfilled from the history API for intervals the collector missed
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS minute_bars (
+            symbol TEXT NOT NULL,
+            time INTEGER NOT NULL,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            volume INTEGER,
+            PRIMARY KEY (symbol, time)
+        ) WITHOUT ROWID;
+    """)
+    # Daily candles seeded from the history API (day = IST midnight epoch)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_bars (
+            symbol TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            volume INTEGER,
+            PRIMARY KEY (symbol, day)
+        ) WITHOUT ROWID;
+    """)
+    # Integer ids for lite-profile symbols, so lite_ticks rows stay narrow
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS symbol_ids (
+            id INTEGER PRIMARY KEY,
+            symbol TEXT NOT NULL UNIQUE
+        );
+    """)
+    # LTP-only ticks for lite-profile symbols (time = receive time, epoch seconds); last LTP per second wins
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS lite_ticks (
+            symbol_id INTEGER NOT NULL,
+            time INTEGER NOT NULL,
+            ltp REAL NOT NULL,
+            PRIMARY KEY (symbol_id, time)
+        ) WITHOUT ROWID;
+    """)
+    # Day range already requested per symbol, so reseeding only fetches what is missing
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_bars_fetched (
+            symbol TEXT PRIMARY KEY,
+            first_day INTEGER NOT NULL,
+            last_day INTEGER NOT NULL
+        );
+    """)
     conn.commit()
     conn.close()
 
@@ -61,7 +120,7 @@ def insert_tick(tick: Dict[str, Any], conn: Optional[sqlite3.Connection] = None,
         conn.execute(sql, values)
         conn.commit()
     else:
-        with sqlite3.connect(db_path) as _conn:
+        with _connect(db_path) as _conn:
             _conn.execute(sql, values)
             _conn.commit()
 
@@ -76,36 +135,53 @@ def insert_ticks_batch(ticks: List[Dict[str, Any]], conn: Optional[sqlite3.Conne
         conn.executemany(sql, values)
         conn.commit()
     else:
-        with sqlite3.connect(db_path) as _conn:
+        with _connect(db_path) as _conn:
             _conn.executemany(sql, values)
             _conn.commit()
 
 class TickDBWorker(threading.Thread):
-    def __init__(self, db_path=DB_PATH, batch_size=1):
+    def __init__(self, db_path=DB_PATH, batch_size=1, label="ticks"):
         super().__init__(daemon=True)
         import queue
+        import latency
+        import metrics
         self.db_path = db_path
         self.queue = queue.Queue()
         self._stop_signal = object()
         self.batch_size = batch_size
+        self.label = label  # Metrics label, one per worker role
+        metrics.DB_QUEUE_DEPTH.labels(label).set_function(self.queue.qsize)
+        self._batch_size_metric = metrics.DB_BATCH_SIZE.labels(label)
+        self._commit_seconds_metric = metrics.DB_COMMIT_SECONDS.labels(label)
+        self._latency = latency.TRACKER
+        self._profile_name = f"TickDBWorker.{label}"
+
+    def _flush(self, buffer, conn):
+        started = time.perf_counter()
+        insert_ticks_batch(buffer, conn=conn)
+        self._commit_seconds_metric.observe(time.perf_counter() - started)
+        self._batch_size_metric.observe(len(buffer))
+        if self._latency.enabled:
+            self._latency.committed(buffer)
 
     def run(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = _connect(self.db_path)
         buffer = []
         while True:
+            checkpoint(self._profile_name)
             try:
                 item = self.queue.get(timeout=0.2)
                 if item is self._stop_signal:
                     if buffer:
-                        insert_ticks_batch(buffer, conn=conn)
+                        self._flush(buffer, conn)
                     break
                 buffer.append(item)
                 if len(buffer) >= self.batch_size:
-                    insert_ticks_batch(buffer, conn=conn)
+                    self._flush(buffer, conn)
                     buffer.clear()
             except Exception:
                 if buffer:
-                    insert_ticks_batch(buffer, conn=conn)
+                    self._flush(buffer, conn)
                     buffer.clear()
         conn.close()
 
@@ -116,8 +192,64 @@ class TickDBWorker(threading.Thread):
         self.queue.put(self._stop_signal)
         self.join()
 
+def get_symbol_ids(symbols: List[str], conn: Optional[sqlite3.Connection] = None, db_path: str = DB_PATH) -> Dict[str, int]:
+    """Integer ids for the symbols, assigning new ones as needed."""
+    _conn = conn if conn is not None else _connect(db_path)
+    _conn.executemany("INSERT OR IGNORE INTO symbol_ids (symbol) VALUES (?)", [(s,) for s in symbols])
+    _conn.commit()
+    ids = {}
+    for i in range(0, len(symbols), 500):
+        chunk = symbols[i:i + 500]
+        placeholders = ", ".join(["?"] * len(chunk))
+        ids.update(_conn.execute(f"SELECT symbol, id FROM symbol_ids WHERE symbol IN ({placeholders})", chunk).fetchall())
+    if conn is None:
+        _conn.close()
+    return ids
+
+def insert_lite_ticks_batch(rows: List[Tuple[int, int, float]], conn: Optional[sqlite3.Connection] = None, db_path: str = DB_PATH):
+    """Rows are (symbol_id, time, ltp)."""
+    if not rows:
+        return
+    sql = "INSERT OR REPLACE INTO lite_ticks (symbol_id, time, ltp) VALUES (?, ?, ?)"
+    if conn is not None:
+        conn.executemany(sql, rows)
+        conn.commit()
+    else:
+        with _connect(db_path) as _conn:
+            _conn.executemany(sql, rows)
+            _conn.commit()
+
+class LiteTickDBWorker(TickDBWorker):
+    """TickDBWorker for lite-profile ticks: put((symbol, time, ltp)) and rows land in lite_ticks."""
+
+    def __init__(self, db_path=DB_PATH, batch_size=500, label="lite"):
+        super().__init__(db_path=db_path, batch_size=batch_size, label=label)
+        self._symbol_ids: Dict[str, int] = {}
+
+    def _flush(self, buffer, conn):
+        started = time.perf_counter()
+        missing = list({symbol for symbol, _, _ in buffer if symbol not in self._symbol_ids})
+        if missing:
+            self._symbol_ids.update(get_symbol_ids(missing, conn=conn))
+        ids = self._symbol_ids
+        insert_lite_ticks_batch([(ids[symbol], t, ltp) for symbol, t, ltp in buffer], conn=conn)
+        self._commit_seconds_metric.observe(time.perf_counter() - started)
+        self._batch_size_metric.observe(len(buffer))
+
+def get_lite_ticks(symbol: str, start_epoch: int, end_epoch: int, db_path: str = DB_PATH) -> List[Tuple[int, float]]:
+    conn = _connect(db_path)
+    rows = conn.execute(
+        """
+        SELECT l.time, l.ltp FROM lite_ticks l JOIN symbol_ids s ON s.id = l.symbol_id
+        WHERE s.symbol=? AND l.time>=? AND l.time<=? ORDER BY l.time
+        """,
+        (symbol, start_epoch, end_epoch),
+    ).fetchall()
+    conn.close()
+    return rows
+
 def get_latest_ticks(db_path: str = DB_PATH) -> Dict[str, dict]:
-    conn = sqlite3.connect(db_path)
+    conn = _connect(db_path)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     cursor.execute("""
@@ -139,34 +271,52 @@ def get_latest_ticks(db_path: str = DB_PATH) -> Dict[str, dict]:
     return ticks
 
 def get_all_symbols(db_path: str = DB_PATH) -> List[str]:
-    conn = sqlite3.connect(db_path)
+    conn = _connect(db_path)
     cursor = conn.cursor()
     cursor.execute("SELECT DISTINCT symbol FROM ticks")
     symbols = [row[0] for row in cursor.fetchall()]
     conn.close()
     return symbols
 
-def get_high_low_days_for_period(symbol: str, start_epoch: int, end_epoch: int, db_path: str = DB_PATH) -> Optional[Tuple[Optional[float], Optional[float], int]]:
+def get_high_low_days_for_period(symbol: str, start_epoch: int, end_epoch: int, db_path: str = DB_PATH,
+                                 conn: Optional[sqlite3.Connection] = None) -> Optional[Tuple[Optional[float], Optional[float], int]]:
     """
     Return (high, low, num_days) for symbol between start_epoch and end_epoch, inclusive.
     - high: max ltp
     - low: min ltp
     - num_days: number of unique calendar days with data in this period (IST)
+    Backfilled minute_bars, seeded daily_bars and lite-profile lite_ticks are merged with the raw ticks.
     If there is no data in that period, returns (None, None, 0)
     """
     # 19800 = 5.5h IST offset in seconds
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    _conn = conn if conn is not None else _connect(db_path)
+    cursor = _conn.cursor()
     cursor.execute(
         """
-        SELECT MAX(ltp), MIN(ltp), COUNT(DISTINCT date((exch_feed_time + 19800), 'unixepoch'))
-        FROM ticks
-        WHERE symbol=? AND exch_feed_time>=? AND exch_feed_time<=?
+        SELECT MAX(high), MIN(low), COUNT(DISTINCT date((t + 19800), 'unixepoch'))
+        FROM (
+            SELECT ltp AS high, ltp AS low, exch_feed_time AS t
+            FROM ticks
+            WHERE symbol=? AND exch_feed_time>=? AND exch_feed_time<=?
+            UNION ALL
+            SELECT high, low, time
+            FROM minute_bars
+            WHERE symbol=? AND time>=? AND time<=?
+            UNION ALL
+            SELECT high, low, day
+            FROM daily_bars
+            WHERE symbol=? AND day>=? AND day<=?
+            UNION ALL
+            SELECT l.ltp, l.ltp, l.time
+            FROM lite_ticks l JOIN symbol_ids s ON s.id = l.symbol_id
+            WHERE s.symbol=? AND l.time>=? AND l.time<=?
+        )
         """,
-        (symbol, start_epoch, end_epoch)
+        (symbol, start_epoch, end_epoch) * 4
     )
     row = cursor.fetchone()
-    conn.close()
+    if conn is None:
+        _conn.close()
     if not row or (row[0] is None or row[1] is None):
         return (None, None, 0)
     return (row[0], row[1], row[2])
@@ -176,4 +326,127 @@ def get_high_low_days_for_period_all_symbols(start_epoch: int, end_epoch: int, d
     output = {}
     for symbol in symbols:
         output[symbol] = get_high_low_days_for_period(symbol, start_epoch, end_epoch, db_path)
-    return output
\ No newline at end of file
+    return output
+
+def get_high_low_days_by_symbol(start_epoch: int, end_epoch: int, db_path: str = DB_PATH, conn: Optional[sqlite3.Connection] = None) -> Dict[str, Tuple[float, float, int]]:
+    """
+    Single-query variant of get_high_low_days_for_period_all_symbols.
+    Symbols without data in the period are omitted rather than mapped to (None, None, 0).
+    """
+    sql = """
+        SELECT symbol, MAX(high), MIN(low), COUNT(DISTINCT date((t + 19800), 'unixepoch'))
+        FROM (
+            SELECT symbol, ltp AS high, ltp AS low, exch_feed_time AS t
+            FROM ticks
+            WHERE exch_feed_time>=? AND exch_feed_time<=? AND ltp IS NOT NULL
+            UNION ALL
+            SELECT symbol, high, low, time
+            FROM minute_bars
+            WHERE time>=? AND time<=?
+            UNION ALL
+            SELECT symbol, high, low, day
+            FROM daily_bars
+            WHERE day>=? AND day<=?
+            UNION ALL
+            SELECT s.symbol, l.ltp, l.ltp, l.time
+            FROM lite_ticks l JOIN symbol_ids s ON s.id = l.symbol_id
+            WHERE l.time>=? AND l.time<=?
+        )
+        GROUP BY symbol
+    """
+    params = (start_epoch, end_epoch) * 4
+    if conn is not None:
+        rows = conn.execute(sql, params).fetchall()
+    else:
+        _conn = _connect(db_path)
+        rows = _conn.execute(sql, params).fetchall()
+        _conn.close()
+    return {row[0]: (row[1], row[2], row[3]) for row in rows}
+
+def optimize_db(db_path: str = DB_PATH):
+    """End-of-day maintenance: refresh query planner statistics."""
+    conn = _connect(db_path)
+    conn.execute("PRAGMA optimize")
+    conn.close()
+
+# --- Collector outage windows (recorded by CollectorSupervisor, consumed by backfill) ---
+def init_outage_table(db_path: str = DB_PATH):
+    conn = _connect(db_path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS collector_outages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scope TEXT NOT NULL,            -- 'global' or a symbol
+            start_time INTEGER NOT NULL,    -- IST epoch of the last tick before the outage
+            end_time INTEGER,               -- IST epoch when ticks resumed; NULL while ongoing
+            reason TEXT
+        );
+    """)
+    conn.commit()
+    conn.close()
+
+def open_outage(scope: str, start_time: int, reason: str, db_path: str = DB_PATH) -> int:
+    with _connect(db_path) as conn:
+        cursor = conn.execute(
+            "INSERT INTO collector_outages (scope, start_time, reason) VALUES (?, ?, ?)",
+            (scope, int(start_time), reason)
+        )
+        return cursor.lastrowid
+
+def close_outage(outage_id: int, end_time: int, db_path: str = DB_PATH):
+    with _connect(db_path) as conn:
+        conn.execute("UPDATE collector_outages SET end_time=? WHERE id=?", (int(end_time), outage_id))
+
+def get_outages(since_epoch: int = 0, db_path: str = DB_PATH) -> List[dict]:
+    conn = _connect(db_path)
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(
+        "SELECT * FROM collector_outages WHERE COALESCE(end_time, start_time)>=? ORDER BY start_time",
+        (since_epoch,)
+    ).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def upsert_minute_bars(bars: List[Tuple[str, int, float, float, float, float, int]], conn: Optional[sqlite3.Connection] = None, db_path: str = DB_PATH):
+    """Insert or replace (symbol, time, open, high, low, close, volume) rows; re-running a backfill is idempotent."""
+    if not bars:
+        return
+    sql = "INSERT OR REPLACE INTO minute_bars (symbol, time, open, high, low, close, volume) VALUES (?, ?, ?, ?, ?, ?, ?)"
+    if conn is not None:
+        conn.executemany(sql, bars)
+        conn.commit()
+    else:
+        with _connect(db_path) as _conn:
+            _conn.executemany(sql, bars)
+            _conn.commit()
+
+def upsert_daily_bars(bars: List[Tuple[str, int, float, float, float, float, int]], conn: Optional[sqlite3.Connection] = None, db_path: str = DB_PATH):
+    """Insert or replace (symbol, day, open, high, low, close, volume) rows."""
+    if not bars:
+        return
+    sql = "INSERT OR REPLACE INTO daily_bars (symbol, day, open, high, low, close, volume) VALUES (?, ?, ?, ?, ?, ?, ?)"
+    if conn is not None:
+        conn.executemany(sql, bars)
+        conn.commit()
+    else:
+        with _connect(db_path) as _conn:
+            _conn.executemany(sql, bars)
+            _conn.commit()
+
+def get_daily_bars_fetched(db_path: str = DB_PATH) -> Dict[str, Tuple[int, int]]:
+    conn = _connect(db_path)
+    rows = conn.execute("SELECT symbol, first_day, last_day FROM daily_bars_fetched").fetchall()
+    conn.close()
+    return {row[0]: (row[1], row[2]) for row in rows}
+
+def set_daily_bars_fetched(ranges: List[Tuple[str, int, int]], conn: Optional[sqlite3.Connection] = None, db_path: str = DB_PATH):
+    """Record (symbol, first_day, last_day) ranges that have been requested."""
+    if not ranges:
+        return
+    sql = "INSERT OR REPLACE INTO daily_bars_fetched (symbol, first_day, last_day) VALUES (?, ?, ?)"
+    if conn is not None:
+        conn.executemany(sql, ranges)
+        conn.commit()
+    else:
+        with _connect(db_path) as _conn:
+            _conn.executemany(sql, ranges)
+            _conn.commit()
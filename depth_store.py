@@ -0,0 +1,210 @@
+"""
+Compact market depth storage.
+
+Depth updates for the symbols in symbols_depth.txt are written to their own
+database (depth_data.db) by DepthDBWorker, so order-book volume never competes
+with the main `ticks` ingest for the writer lock.
+
+Each update is 5 bid and 5 ask levels of (price in paise, size, orders). A
+level is packed into a fixed 10-byte record; a row stores either a keyframe
+with all 10 levels, or a delta with a 16-bit mask of the levels that changed
+since the symbol's previous update followed by just those records. Keyframes
+are written every KEYFRAME_INTERVAL updates per symbol, so reading a range
+only needs to go back to the nearest keyframe.
+"""
+import queue
+import sqlite3
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+
+DEPTH_SYMBOLS_FILE = "symbols_depth.txt"
+DEPTH_DB_PATH = "depth_data.db"
+
+DEPTH_LEVELS = 5
+LEVEL_COUNT = 2 * DEPTH_LEVELS  # bids 0-4, asks 5-9
+LEVEL = struct.Struct("<iIH")  # price (paise), size, orders
+MASK = struct.Struct("<H")
+KEYFRAME_INTERVAL = 100
+
+Level = Tuple[int, int, int]
+
+
+def init_depth_db(db_path: str = DEPTH_DB_PATH):
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS depth (
+            symbol TEXT NOT NULL,
+            time INTEGER NOT NULL,      -- receive time, epoch milliseconds
+            seq INTEGER NOT NULL,       -- per-symbol update counter
+            keyframe INTEGER NOT NULL,  -- 1: all levels, 0: changed levels only
+            levels BLOB NOT NULL,
+            PRIMARY KEY (symbol, time, seq)
+        ) WITHOUT ROWID;
+    """)
+    conn.commit()
+    conn.close()
+
+
+def levels_from_message(message: dict) -> Tuple[Level, ...]:
+    """The 10 (price paise, size, orders) levels of a DepthUpdate message, bids first."""
+    levels = []
+    for side in ("bid", "ask"):
+        for i in range(1, DEPTH_LEVELS + 1):
+            price = message.get(f"{side}_price{i}") or 0
+            levels.append((
+                int(round(price * 100)),
+                int(message.get(f"{side}_size{i}") or 0),
+                min(int(message.get(f"{side}_order{i}") or 0), 0xFFFF),
+            ))
+    return tuple(levels)
+
+
+class DepthEncoder:
+    """Keeps the previous levels per symbol and encodes each update as a keyframe or delta."""
+
+    def __init__(self, keyframe_interval: int = KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self._last: Dict[str, Tuple[Level, ...]] = {}
+        self._seq: Dict[str, int] = {}
+
+    def encode(self, symbol: str, levels: Tuple[Level, ...]) -> Optional[Tuple[int, int, bytes]]:
+        """Returns (seq, keyframe, blob), or None when nothing changed."""
+        previous = self._last.get(symbol)
+        if previous == levels:
+            return None
+        seq = self._seq.get(symbol, -1) + 1
+        self._seq[symbol] = seq
+        self._last[symbol] = levels
+        if previous is None or seq % self.keyframe_interval == 0:
+            return seq, 1, b"".join(LEVEL.pack(*level) for level in levels)
+        mask = 0
+        parts = []
+        for i, (old, new) in enumerate(zip(previous, levels)):
+            if old != new:
+                mask |= 1 << i
+                parts.append(LEVEL.pack(*new))
+        return seq, 0, MASK.pack(mask) + b"".join(parts)
+
+    def reset(self, symbols):
+        """Forget the previous levels, so each symbol's next update is encoded as a keyframe."""
+        for symbol in symbols:
+            self._last.pop(symbol, None)
+
+
+def decode(blob: bytes, keyframe: int, previous: Optional[List[Level]]) -> Optional[List[Level]]:
+    """Apply one stored row to the previous levels. Returns None for a delta with no base."""
+    if keyframe:
+        return [LEVEL.unpack_from(blob, i * LEVEL.size) for i in range(LEVEL_COUNT)]
+    if previous is None:
+        return None
+    levels = list(previous)
+    (mask,) = MASK.unpack_from(blob, 0)
+    offset = MASK.size
+    for i in range(LEVEL_COUNT):
+        if mask & (1 << i):
+            levels[i] = LEVEL.unpack_from(blob, offset)
+            offset += LEVEL.size
+    return levels
+
+
+def get_depth(symbol: str, start_ms: int, end_ms: int, db_path: str = DEPTH_DB_PATH) -> List[dict]:
+    """
+    Depth snapshots for a symbol between start_ms and end_ms, each as
+    {"time": ms, "bids": [(price, size, orders)...], "asks": [...]} with prices in rupees.
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    row = conn.execute(
+        "SELECT MAX(time) FROM depth WHERE symbol=? AND time<=? AND keyframe=1", (symbol, start_ms)
+    ).fetchone()
+    base = row[0] if row and row[0] is not None else start_ms
+    rows = conn.execute(
+        "SELECT time, keyframe, levels FROM depth WHERE symbol=? AND time>=? AND time<=? ORDER BY time, seq",
+        (symbol, base, end_ms),
+    ).fetchall()
+    conn.close()
+    snapshots = []
+    levels = None
+    for t, keyframe, blob in rows:
+        levels = decode(blob, keyframe, levels)
+        if levels is None or t < start_ms:
+            continue
+        book = [(price / 100.0, size, orders) for price, size, orders in levels]
+        snapshots.append({"time": t, "bids": book[:DEPTH_LEVELS], "asks": book[DEPTH_LEVELS:]})
+    return snapshots
+
+
+class DepthDBWorker(threading.Thread):
+    """
+    Encodes and writes depth updates on its own thread and connection. Flushes
+    every batch_size rows or flush_interval seconds, whichever comes first.
+    """
+
+    def __init__(self, db_path: str = DEPTH_DB_PATH, batch_size: int = 1000, flush_interval: float = 0.5,
+                 keyframe_interval: int = KEYFRAME_INTERVAL):
+        super().__init__(daemon=True)
+        self.db_path = db_path
+        self.queue = queue.Queue()
+        self._stop_signal = object()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.encoder = DepthEncoder(keyframe_interval)
+        self.updates = 0
+        self.rows_written = 0
+        self.bytes_written = 0
+        metrics.DB_QUEUE_DEPTH.labels("depth").set_function(self.queue.qsize)
+        self._batch_size_metric = metrics.DB_BATCH_SIZE.labels("depth")
+        self._commit_seconds_metric = metrics.DB_COMMIT_SECONDS.labels("depth")
+
+    def put(self, message: dict, received_ms: Optional[int] = None):
+        self.queue.put((message, received_ms if received_ms is not None else int(time.time() * 1000)))
+
+    def _flush(self, rows, conn):
+        started = time.perf_counter()
+        conn.executemany("INSERT OR IGNORE INTO depth (symbol, time, seq, keyframe, levels) VALUES (?, ?, ?, ?, ?)", rows)
+        conn.commit()
+        self._commit_seconds_metric.observe(time.perf_counter() - started)
+        self._batch_size_metric.observe(len(rows))
+        self.rows_written += len(rows)
+        self.bytes_written += sum(len(r[4]) for r in rows)
+
+    def run(self):
+        init_depth_db(self.db_path)
+        conn = sqlite3.connect(self.db_path)
+        rows = []
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+            if item is self._stop_signal:
+                break
+            if item is not None:
+                message, received_ms = item
+                self.updates += 1
+                symbol = message.get("symbol")
+                encoded = self.encoder.encode(symbol, levels_from_message(message))
+                if encoded is not None:
+                    seq, keyframe, blob = encoded
+                    rows.append((symbol, received_ms, seq, keyframe, blob))
+            if rows and (len(rows) >= self.batch_size or time.monotonic() - last_flush >= self.flush_interval):
+                try:
+                    self._flush(rows, conn)
+                except Exception as e:
+                    print("[DepthDBWorker] Write failed:", e)
+                    # The dropped rows may hold keyframes the next deltas build on
+                    self.encoder.reset({row[0] for row in rows})
+                rows = []
+                last_flush = time.monotonic()
+        if rows:
+            self._flush(rows, conn)
+        conn.close()
+
+    def stop(self):
+        self.queue.put(self._stop_signal)
+        self.join()
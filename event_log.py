@@ -12,14 +12,14 @@ def get_today_logfile():
     today = datetime.now().strftime("%Y%m%d")
     return os.path.join(EVENT_LOG_DIR, f"events_{today}.csv")
 
+EVENT_FIELDS = ["timestamp", "symbol", "event_type", "ltp", "high", "low", "period"]
+
 def log_event(event: dict):
     """Append an event dict to today's log file. Header written automatically if file is new."""
     logfile = get_today_logfile()
     file_exists = os.path.isfile(logfile)
     with open(logfile, mode="a", newline='', encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=[
-            "timestamp", "symbol", "event_type", "ltp", "high", "low", "period"
-        ])
+        writer = csv.DictWriter(f, fieldnames=EVENT_FIELDS)
         if not file_exists:
             writer.writeheader()
         writer.writerow(event)
@@ -33,4 +33,28 @@ def read_today_events():
             reader = csv.DictReader(f)
             for row in reader:
                 events.append(row)
-    return events
\ No newline at end of file
+    return events
+
+def read_events_since(offset=0, logfile=None):
+    """
+    Read events appended to a log file after byte offset `offset`.
+    Returns (events, new_offset) so callers can load incrementally.
+    """
+    if logfile is None:
+        logfile = get_today_logfile()
+    events = []
+    if not os.path.isfile(logfile):
+        return events, 0
+    with open(logfile, mode="rb") as f:
+        f.seek(offset)
+        data = f.read()
+    # Only consume complete lines; a partially written row is picked up next time
+    end = data.rfind(b"\n") + 1
+    if end == 0:
+        return events, offset
+    lines = data[:end].decode("utf-8").splitlines()
+    if offset == 0 and lines:
+        lines = lines[1:]  # header
+    for row in csv.DictReader(lines, fieldnames=EVENT_FIELDS):
+        events.append(row)
+    return events, offset + end
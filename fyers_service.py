@@ -1,9 +1,57 @@
-from fyers_apiv3 import fyersModel
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
 from config import config
 
-class FyersService:
+# Fyers accepts up to 50 symbols per quotes request
+QUOTES_CHUNK_SIZE = 50
+DEPTH_CHUNK_SIZE = 50
+
+# Seconds a successful response is reused, per endpoint
+DEFAULT_TTLS = {
+    "profile": 300.0,
+    "funds": 10.0,
+    "quotes": 1.0,
+    "depth": 1.0,
+}
+
+def _default_client_factory(access_token):
+    from fyers_apiv3 import fyersModel
+    return fyersModel.FyersModel(
+        client_id=config.CLIENT_ID,
+        is_async=False,
+        token=access_token,
+        log_path=""
+    )
+
+class _InFlight:
     def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class FyersService:
+    """
+    REST access through one FyersModel client, rebuilt only when the access token changes.
+
+    Successful responses are cached per endpoint for a short TTL, and concurrent
+    identical requests share a single API call. quotes/depth are cached per symbol
+    and only the missing symbols are fetched, in as few chunked calls as possible.
+    client_factory(access_token) can be replaced to run against a local stub.
+    """
+
+    def __init__(self, client_factory: Optional[Callable] = None, ttls: Optional[Dict[str, float]] = None,
+                 clock: Callable[[], float] = time.monotonic):
         self.fyers = None
+        self._token = None
+        self._client_factory = client_factory or _default_client_factory
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.clock = clock
+        self._cache = {}      # (endpoint, key) -> (expires_at, value)
+        self._inflight = {}   # (endpoint, key) -> _InFlight
+        self._lock = threading.Lock()
+        self.api_calls = 0
         self.ensure_session()
 
     def ensure_session(self):
@@ -11,22 +59,230 @@ class FyersService:
         access, _ = config.get_tokens()
         if not access:
             self.fyers = None
-        else:
-            self.fyers = fyersModel.FyersModel(
-                client_id=config.CLIENT_ID,
-                is_async=False,
-                token=access,
-                log_path=""
-            )
+            self._token = None
+        elif access != self._token or self.fyers is None:
+            self.fyers = self._client_factory(access)
+            self._token = access
+            self.clear_cache()
 
-    def get_profile(self):
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _require_client(self):
         self.ensure_session()
         if not self.fyers:
             raise Exception("Fyers session not initialized or token is missing.")
-        return self.fyers.get_profile()
+        return self.fyers
+
+    def _cache_get(self, cache_key):
+        entry = self._cache.get(cache_key)
+        if entry is not None and entry[0] > self.clock():
+            return True, entry[1]
+        return False, None
+
+    def _call(self, endpoint: str, key, fetch: Callable[[], dict], ttl: Optional[float] = None):
+        """Cached, single-flight API call. Only responses with s == 'ok' are cached."""
+        cache_key = (endpoint, key)
+        with self._lock:
+            hit, value = self._cache_get(cache_key)
+            if hit:
+                return value
+            flight = self._inflight.get(cache_key)
+            leader = flight is None
+            if leader:
+                flight = _InFlight()
+                self._inflight[cache_key] = flight
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            self.api_calls += 1
+            result = fetch()
+            flight.result = result
+            if isinstance(result, dict) and result.get("s") == "ok":
+                ttl = self.ttls.get(endpoint, 0.0) if ttl is None else ttl
+                with self._lock:
+                    self._cache[cache_key] = (self.clock() + ttl, result)
+            return result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(cache_key, None)
+            flight.done.set()
+
+    def get_profile(self):
+        client = self._require_client()
+        return self._call("profile", None, client.get_profile)
 
     def get_funds(self):
-        self.ensure_session()
-        if not self.fyers:
-            raise Exception("Fyers session not initialized or token is missing.")
-        return self.fyers.funds()
\ No newline at end of file
+        client = self._require_client()
+        return self._call("funds", None, client.funds)
+
+    def _batched(self, endpoint: str, symbols: List[str], chunk_size: int, fetch_chunk: Callable[[List[str]], dict],
+                 split: Callable[[dict], Dict[str, object]]) -> Dict[str, object]:
+        """Per-symbol cached results; missing symbols are fetched in chunks of chunk_size."""
+        ttl = self.ttls.get(endpoint, 0.0)
+        results = {}
+        missing = []
+        with self._lock:
+            for symbol in dict.fromkeys(symbols):
+                hit, value = self._cache_get((endpoint, symbol))
+                if hit:
+                    results[symbol] = value
+                else:
+                    missing.append(symbol)
+        for i in range(0, len(missing), chunk_size):
+            chunk = missing[i:i + chunk_size]
+            # A zero TTL here: the chunk response is shared by concurrent callers but
+            # cached per symbol below, not per chunk
+            response = self._call(endpoint + "_batch", tuple(chunk), lambda c=chunk: fetch_chunk(c), ttl=0.0)
+            if not isinstance(response, dict) or response.get("s") != "ok":
+                raise Exception(f"Fyers {endpoint} request failed: {response.get('message') if isinstance(response, dict) else response}")
+            per_symbol = split(response)
+            expires = self.clock() + ttl
+            with self._lock:
+                for symbol, value in per_symbol.items():
+                    self._cache[(endpoint, symbol)] = (expires, value)
+            results.update(per_symbol)
+        return results
+
+    def get_quotes(self, symbols: List[str]) -> Dict[str, dict]:
+        """Quote ('v' payload) per symbol, in ceil(n / 50) API calls for uncached symbols."""
+        client = self._require_client()
+        return self._batched(
+            "quotes", symbols, QUOTES_CHUNK_SIZE,
+            lambda chunk: client.quotes(data={"symbols": ",".join(chunk)}),
+            lambda response: {item.get("n"): item.get("v") for item in response.get("d", []) if item.get("s") == "ok"},
+        )
+
+    def get_market_depth(self, symbols: List[str]) -> Dict[str, dict]:
+        """Market depth per symbol, fetched in chunks for uncached symbols."""
+        client = self._require_client()
+        return self._batched(
+            "depth", symbols, DEPTH_CHUNK_SIZE,
+            lambda chunk: client.depth(data={"symbol": ",".join(chunk), "ohlcv_flag": "1"}),
+            lambda response: dict(response.get("d", {})),
+        )
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_service() -> FyersService:
+    """Shared FyersService, constructed on first use."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = FyersService()
+    return _service
+
+
+# --- Local stub client ---
+
+class StubFyersClient:
+    """
+    Stands in for FyersModel in FyersService(client_factory=...): canned
+    responses after a short delay, with every call and quotes chunk recorded.
+    """
+
+    def __init__(self, access_token, latency: float = 0.05):
+        self.access_token = access_token
+        self.latency = latency
+        self.calls: Dict[str, int] = {}
+        self.quote_chunks: List[int] = []
+        self._lock = threading.Lock()
+
+    def _record(self, method):
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        time.sleep(self.latency)
+
+    def get_profile(self):
+        self._record("get_profile")
+        return {"s": "ok", "code": 200, "data": {"fy_id": "MOCK", "name": "Mock User"}}
+
+    def funds(self):
+        self._record("funds")
+        return {"s": "ok", "code": 200, "fund_limit": [{"title": "Available Balance", "equityAmount": 100000.0}]}
+
+    def quotes(self, data):
+        symbols = data["symbols"].split(",")
+        with self._lock:
+            self.quote_chunks.append(len(symbols))
+        self._record("quotes")
+        return {"s": "ok", "code": 200, "d": [
+            {"n": s, "s": "ok", "v": {"symbol": s, "lp": 100.0, "tt": int(time.time())}} for s in symbols
+        ]}
+
+    def depth(self, data):
+        symbols = data["symbol"].split(",")
+        self._record("depth")
+        return {"s": "ok", "code": 200, "d": {s: {"bids": [], "ask": []} for s in symbols}}
+
+
+def run_mock(symbols: int, threads: int) -> bool:
+    """Concurrent callers against StubFyersClient: shows session reuse, single-flight and quote chunking."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    clients: List[StubFyersClient] = []
+
+    def factory(access_token):
+        clients.append(StubFyersClient(access_token))
+        return clients[-1]
+
+    config.set_tokens("mock-access-1", "mock-refresh")
+    service = FyersService(client_factory=factory)
+    names = [f"NSE:MOCK{i}-EQ" for i in range(symbols)]
+    expected_chunks = -(-symbols // QUOTES_CHUNK_SIZE)
+    checks = []
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda _: service.get_profile(), range(threads)))
+        profile_calls = clients[0].calls.get("get_profile", 0)
+        print(f"[Mock] {threads} concurrent get_profile -> {profile_calls} API call(s), {len(clients)} client(s) built")
+        checks.append(profile_calls == 1 and len(clients) == 1)
+
+        results = list(pool.map(lambda _: service.get_quotes(names), range(threads)))
+        chunks = sorted(clients[0].quote_chunks, reverse=True)
+        print(f"[Mock] {threads} concurrent get_quotes({symbols}) -> {len(chunks)} API call(s), chunk sizes {chunks}")
+        checks.append(len(chunks) == expected_chunks and all(len(r) == symbols for r in results))
+
+    before = len(clients[0].quote_chunks)
+    service.get_quotes(names)
+    service.get_quotes(names + ["NSE:EXTRA-EQ"])
+    extra = len(clients[0].quote_chunks) - before
+    print(f"[Mock] Repeat within TTL plus one new symbol -> {extra} API call(s)")
+    checks.append(extra == 1)
+
+    service.get_funds()
+    config.set_tokens("mock-access-2", "mock-refresh")
+    service.get_funds()
+    print(f"[Mock] Token change -> {len(clients)} clients built; funds calls per client "
+          f"{[c.calls.get('funds', 0) for c in clients]}")
+    checks.append(len(clients) == 2 and clients[1].calls.get("funds") == 1)
+
+    ok = all(checks)
+    print(f"[Mock] {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Exercise FyersService against a local stub client.")
+    parser.add_argument("--mock", action="store_true", help="Run against StubFyersClient")
+    parser.add_argument("--symbols", type=int, default=230, help="Symbols per quotes request")
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent callers")
+    args = parser.parse_args()
+    if not args.mock:
+        parser.error("only --mock runs are supported from the command line")
+    raise SystemExit(0 if run_mock(args.symbols, args.threads) else 1)
+
+
+if __name__ == "__main__":
+    main()
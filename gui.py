@@ -1,80 +1,318 @@
 from tkinter import *
 from tkinter import ttk, messagebox
-from fyers_service import FyersService
-from collector_manager import CollectorManager
+import queue
+from collections import deque
+from fyers_service import get_service
 from auth import authenticate, generate_token
 import local_auth_server
-import ws_scheduler
-from screener import Screener
 import event_log
-
-from datetime import datetime, time
-from zoneinfo import ZoneInfo
+from trading_calendar import is_market_open
 
 auth_http_server = None
 auth_http_thread = None
-fyers_service = FyersService()
-collector_manager = CollectorManager(end_time_str="15:30:05")
-
-def is_market_open(session_start="09:14:58", session_end="15:30:05"):
-    TZ = ZoneInfo("Asia/Kolkata")
-    now = datetime.now(TZ).time()
-    start = datetime.strptime(session_start, "%H:%M:%S").time()
-    end = datetime.strptime(session_end, "%H:%M:%S").time()
-    return start <= now <= end
 
 class NoticeBoard(Toplevel):
+    """
+    Today's events. add_event() may be called from any thread: events are queued
+    and drained on the Tk thread every FRAME_MS in batches, and the view only
+    ever holds the latest MAX_ROWS events that match the current filter.
+    """
+    FRAME_MS = 100
+    MAX_BATCH = 500
+    MAX_ROWS = 500
+    MAX_EVENTS = 20000
+    COLUMNS = ("timestamp", "symbol", "event_type", "ltp", "high", "low", "period")
+    ALL_TYPES = "All events"
+
     def __init__(self, parent):
         super().__init__(parent)
         self.title("Event Noticeboard - Today's Events")
         self.geometry("900x400")
         self.resizable(True, True)
+        # Closing only hides the window, so queued events keep draining
+        self.protocol("WM_DELETE_WINDOW", self.withdraw)
 
-        columns = ("timestamp", "symbol", "event_type", "ltp", "high", "low", "period")
-        self.tree = ttk.Treeview(self, columns=columns, show="headings")
-        for col in columns:
+        self._pending = queue.Queue()
+        self.events = deque(maxlen=self.MAX_EVENTS)
+        self._seen = set()
+        self._event_types = set()
+        self._logfile = None
+        self._log_offset = 0
+
+        filter_bar = Frame(self)
+        filter_bar.pack(fill=X)
+        Label(filter_bar, text="Symbol:").pack(side=LEFT, padx=4)
+        self.symbol_filter = StringVar()
+        Entry(filter_bar, textvariable=self.symbol_filter, width=20).pack(side=LEFT)
+        Label(filter_bar, text="Event:").pack(side=LEFT, padx=4)
+        self.type_filter = StringVar(value=self.ALL_TYPES)
+        self.type_box = ttk.Combobox(filter_bar, textvariable=self.type_filter, values=[self.ALL_TYPES], state="readonly", width=32)
+        self.type_box.pack(side=LEFT)
+        Button(filter_bar, text="Clear", command=self._clear_filters).pack(side=LEFT, padx=4)
+        self.symbol_filter.trace_add("write", lambda *_: self._refilter())
+        self.type_filter.trace_add("write", lambda *_: self._refilter())
+
+        body = Frame(self)
+        body.pack(fill=BOTH, expand=True)
+        self.tree = ttk.Treeview(body, columns=self.COLUMNS, show="headings")
+        for col in self.COLUMNS:
             self.tree.heading(col, text=col.replace("_", " ").capitalize())
             self.tree.column(col, anchor="center", width=120)
-        self.tree.pack(fill=BOTH, expand=True)
-
-        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
+        self.scrollbar = ttk.Scrollbar(body, orient="vertical", command=self.tree.yview)
         self.tree.configure(yscrollcommand=self.scrollbar.set)
         self.scrollbar.pack(side=RIGHT, fill=Y)
+        self.tree.pack(fill=BOTH, expand=True)
 
         # Load today's events at startup
         self.load_events()
+        self.after(self.FRAME_MS, self._drain)
 
-    def load_events(self):
-        self.tree.delete(*self.tree.get_children())
-        events = event_log.read_today_events()
-        for event in events:
-            row = (
-                event.get("timestamp"),
-                event.get("symbol"),
-                event.get("event_type"),
-                event.get("ltp"),
-                event.get("high"),
-                event.get("low"),
-                event.get("period"),
-            )
-            self.tree.insert("", END, values=row)
+    @staticmethod
+    def _key(event):
+        return (str(event.get("timestamp")), event.get("symbol"), event.get("event_type"))
+
+    def _matches(self, event):
+        symbol = self.symbol_filter.get().strip().upper()
+        if symbol and symbol not in str(event.get("symbol", "")).upper():
+            return False
+        event_type = self.type_filter.get()
+        return event_type == self.ALL_TYPES or event.get("event_type") == event_type
+
+    def _clear_filters(self):
+        self.symbol_filter.set("")
+        self.type_filter.set(self.ALL_TYPES)
 
     def add_event(self, event):
-        row = (
-            event.get("timestamp"),
-            event.get("symbol"),
-            event.get("event_type"),
-            event.get("ltp"),
-            event.get("high"),
-            event.get("low"),
-            event.get("period"),
-        )
-        self.tree.insert("", END, values=row)
+        """Thread-safe: queue an event for the next frame."""
+        self._pending.put(event)
+
+    def _drain(self):
+        batch = []
+        try:
+            while len(batch) < self.MAX_BATCH:
+                batch.append(self._pending.get_nowait())
+        except queue.Empty:
+            pass
+        if batch:
+            self._append(batch)
+        self.after(self.FRAME_MS, self._drain)
+
+    def _append(self, events):
+        visible = []
+        new_types = False
+        for event in events:
+            key = self._key(event)
+            if key in self._seen:
+                continue
+            if len(self.events) == self.events.maxlen:
+                # The oldest event is about to fall out of the deque; forget its key with it
+                self._seen.discard(self._key(self.events[0]))
+            self._seen.add(key)
+            self.events.append(event)
+            if event.get("event_type") not in self._event_types:
+                self._event_types.add(event.get("event_type"))
+                new_types = True
+            if self._matches(event):
+                visible.append(event)
+        if new_types:
+            self.type_box.configure(values=[self.ALL_TYPES] + sorted(t for t in self._event_types if t))
+        if not visible:
+            return
+        at_bottom = self.tree.yview()[1] >= 0.999
+        for event in visible[-self.MAX_ROWS:]:
+            self.tree.insert("", END, values=tuple(event.get(col) for col in self.COLUMNS))
+        children = self.tree.get_children()
+        if len(children) > self.MAX_ROWS:
+            self.tree.delete(*children[:len(children) - self.MAX_ROWS])
+        if at_bottom:
+            self.tree.yview_moveto(1.0)
+
+    def _refilter(self):
+        self.tree.delete(*self.tree.get_children())
+        rows = []
+        for event in reversed(self.events):
+            if self._matches(event):
+                rows.append(event)
+                if len(rows) >= self.MAX_ROWS:
+                    break
+        for event in reversed(rows):
+            self.tree.insert("", END, values=tuple(event.get(col) for col in self.COLUMNS))
         self.tree.yview_moveto(1.0)
 
+    def load_events(self):
+        """Show the window and pick up events appended to today's log since the last load."""
+        self.deiconify()
+        logfile = event_log.get_today_logfile()
+        if logfile != self._logfile:
+            # New day: start over with the new log file
+            self._logfile = logfile
+            self._log_offset = 0
+            self.events.clear()
+            self._seen.clear()
+            self.tree.delete(*self.tree.get_children())
+        events, self._log_offset = event_log.read_events_since(self._log_offset, logfile)
+        if events:
+            self._append(events)
+
+def _pct_distance(ltp, level):
+    """Percent distance from ltp to level (positive when level is above ltp)."""
+    if ltp is None or not level:
+        return None
+    return (level - ltp) / ltp * 100.0
+
+class WatchlistWindow(Toplevel):
+    """
+    Live grid of every symbol in the collector's LatestTickStore.
+
+    Every REFRESH_MS only symbols that changed since the last refresh are
+    recomputed, and a row is touched only if its formatted values differ.
+    Sorting and filtering work on the cached row model and move/detach the
+    existing rows instead of rebuilding them.
+    """
+    REFRESH_MS = 500
+    COLUMNS = ("symbol", "ltp", "chg_pct", "to_upper_ckt", "to_lower_ckt",
+               "to_week_high", "to_week_low", "to_month_high", "to_month_low")
+    HEADINGS = ("Symbol", "LTP", "% Chg", "% to UC", "% to LC",
+                "% to W High", "% to W Low", "% to M High", "% to M Low")
+
+    def __init__(self, parent, latest_ticks, highlow_source=None):
+        super().__init__(parent)
+        self.title("Watchlist")
+        self.geometry("1000x500")
+        self.protocol("WM_DELETE_WINDOW", self.withdraw)
+        self.latest_ticks = latest_ticks
+        # Callable returning (weekly_high_low, monthly_high_low) dicts, e.g. from the screener
+        self.highlow_source = highlow_source
+        self._seq = 0
+        self._numeric = {}  # symbol -> raw values (for sorting)
+        self._rows = {}     # symbol -> formatted values currently shown
+        self._order = []    # symbols in display order
+        self._attached = set()
+        self._sort_col = "symbol"
+        self._sort_desc = False
+
+        filter_bar = Frame(self)
+        filter_bar.pack(fill=X)
+        Label(filter_bar, text="Filter:").pack(side=LEFT, padx=4)
+        self.filter_var = StringVar()
+        Entry(filter_bar, textvariable=self.filter_var, width=24).pack(side=LEFT)
+        self.filter_var.trace_add("write", lambda *_: self._apply_order())
+
+        body = Frame(self)
+        body.pack(fill=BOTH, expand=True)
+        self.tree = ttk.Treeview(body, columns=self.COLUMNS, show="headings")
+        for col, heading in zip(self.COLUMNS, self.HEADINGS):
+            self.tree.heading(col, text=heading, command=lambda c=col: self.sort_by(c))
+            self.tree.column(col, anchor="center", width=100)
+        scrollbar = ttk.Scrollbar(body, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=RIGHT, fill=Y)
+        self.tree.pack(fill=BOTH, expand=True)
+
+        self.after(self.REFRESH_MS, self._refresh)
+
+    def show(self):
+        self.deiconify()
+        self.lift()
+
+    def _compute(self, symbol, weekly, monthly):
+        tick = self.latest_ticks.get(symbol)
+        if tick is None:
+            return None
+        ltp = tick.get("ltp")
+        prev_close = self.latest_ticks.prev_close.get(symbol)
+        week_high, week_low, _ = weekly.get(symbol, (None, None, 0))
+        month_high, month_low, _ = monthly.get(symbol, (None, None, 0))
+        return (
+            symbol,
+            ltp,
+            _pct_distance(prev_close, ltp),
+            _pct_distance(ltp, tick.get("upper_ckt")),
+            _pct_distance(ltp, tick.get("lower_ckt")),
+            _pct_distance(ltp, week_high),
+            _pct_distance(ltp, week_low),
+            _pct_distance(ltp, month_high),
+            _pct_distance(ltp, month_low),
+        )
+
+    @staticmethod
+    def _format(values):
+        return tuple(values[0:1]) + tuple("" if v is None else f"{v:.2f}" for v in values[1:])
+
+    def _refresh(self):
+        if self.state() == "withdrawn":
+            # Hidden: leave changes pending until the window is shown again
+            self.after(self.REFRESH_MS, self._refresh)
+            return
+        try:
+            changed, self._seq = self.latest_ticks.changed_since(self._seq)
+            weekly, monthly = self.highlow_source() if self.highlow_source else ({}, {})
+            added = False
+            for symbol in changed:
+                values = self._compute(symbol, weekly, monthly)
+                if values is None:
+                    if symbol in self._rows:
+                        self._remove_row(symbol)
+                    continue
+                self._numeric[symbol] = values
+                row = self._format(values)
+                if symbol not in self._rows:
+                    self._rows[symbol] = row
+                    self.tree.insert("", END, iid=symbol, values=row)
+                    self._attached.add(symbol)
+                    self._order.append(symbol)
+                    added = True
+                elif self._rows[symbol] != row:
+                    self._rows[symbol] = row
+                    self.tree.item(symbol, values=row)
+            if added:
+                self._sort_model()
+                self._apply_order()
+        finally:
+            self.after(self.REFRESH_MS, self._refresh)
+
+    def _remove_row(self, symbol):
+        """Drop a symbol removed from the universe."""
+        del self._rows[symbol]
+        self._numeric.pop(symbol, None)
+        self._order.remove(symbol)
+        self._attached.discard(symbol)
+        self.tree.delete(symbol)
+
+    def _sort_model(self):
+        idx = self.COLUMNS.index(self._sort_col)
+        if idx == 0:
+            key = lambda s: s
+        else:
+            # Missing values sort last regardless of direction
+            missing = float("-inf") if self._sort_desc else float("inf")
+            key = lambda s: missing if self._numeric[s][idx] is None else self._numeric[s][idx]
+        self._order.sort(key=key, reverse=self._sort_desc)
+
+    def sort_by(self, col):
+        if col == self._sort_col:
+            self._sort_desc = not self._sort_desc
+        else:
+            self._sort_col, self._sort_desc = col, False
+        self._sort_model()
+        self._apply_order()
+
+    def _apply_order(self):
+        text = self.filter_var.get().strip().upper()
+        position = 0
+        for symbol in self._order:
+            if text and text not in symbol.upper():
+                if symbol in self._attached:
+                    self.tree.detach(symbol)
+                    self._attached.discard(symbol)
+                continue
+            self.tree.move(symbol, "", position)
+            self._attached.add(symbol)
+            position += 1
+
 def show_profile(parent):
     try:
-        profile = fyers_service.get_profile()
+        profile = get_service().get_profile()
     except Exception as e:
         show_error(parent, f"Error fetching profile: {str(e)}")
         return
@@ -87,7 +325,7 @@ def show_profile(parent):
 
 def show_funds(parent):
     try:
-        funds = fyers_service.get_funds()
+        funds = get_service().get_funds()
     except Exception as e:
         show_error(parent, f"Error fetching funds: {str(e)}")
         return
@@ -113,7 +351,7 @@ def show_session_over_message():
         "Please try again during the next session window."
     )
 
-def launch_gui():
+def launch_gui(timer=None):
     global auth_http_server, auth_http_thread
 
     main = Tk()
@@ -151,28 +389,20 @@ def launch_gui():
     Button(main, text="Authenticate", command=on_authenticate).pack(pady=5)
     Button(main, text="Generate Access Token", command=lambda: generate_token(auth_entry.get())).pack(pady=5)
 
-    collector_manager.set_closed_callback(lambda: main.after(0, show_session_over_message))
-
-    ws_scheduler.run_ws_collector_at_schedule(
-        start_time_str="09:14:58",
-        end_time_str="15:30:05",
-        start_callback=collector_manager.start,
-        stop_callback=collector_manager.stop
-    )
-
-    from db import DB_PATH
-
     # --- Noticeboard setup
     noticeboard = NoticeBoard(main)
 
-    def notice_callback(event):
-        noticeboard.add_event(event)
+    from daemon import start_services
+    services = start_services(
+        notice_callback=noticeboard.add_event,
+        closed_callback=lambda: main.after(0, show_session_over_message),
+        timer=timer
+    )
+    collector_manager = services.collector_manager
+    screener = services.screener
 
     # Session guard for live screener
-    if is_market_open():
-        screener = Screener(db_path=DB_PATH, notice_callback=notice_callback, proximity_threshold_percent=1.0, poll_interval=2.0)
-        screener.start()
-    else:
+    if not is_market_open():
         def show_guard_msg():
             messagebox.showinfo("Market Session Inactive", "Live screening and alerts are available only during market hours (09:15–15:30 IST).")
         main.after(1000, show_guard_msg)
@@ -180,6 +410,19 @@ def launch_gui():
     # Button to open/reload noticeboard window
     Button(main, text="Show Noticeboard", command=noticeboard.load_events).pack(pady=8)
 
+    watchlist = WatchlistWindow(
+        main,
+        collector_manager.latest_ticks,
+        highlow_source=lambda: (screener.weekly_high_low, screener.monthly_high_low)
+    )
+    watchlist.withdraw()
+    Button(main, text="Show Watchlist", command=watchlist.show).pack(pady=4)
+
+    if timer is not None:
+        def report_startup():
+            timer.mark("window")
+            timer.report("GUI")
+        main.after(0, report_startup)
     main.mainloop()
 
 if __name__ == "__main__":
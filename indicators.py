@@ -0,0 +1,343 @@
+"""
+Incremental per-symbol indicators.
+
+Each symbol keeps a small rolling state that every tick (or completed daily
+bar) updates in O(1):
+
+  - session VWAP, from the increase in vol_traded_today between ticks, priced
+    at the tick's ltp (covers the volume seen since our first tick of the day),
+  - day high/low and volume,
+  - N-day and 52-week high/low over completed days, via monotonic deques over
+    a fixed ring of daily highs/lows (amortized O(1) per day close),
+  - average daily range and average daily volume over N days, as running sums,
+    and today's volume relative to that average.
+
+Completed days come from the ticks themselves (a day is closed by the first
+tick of the next one) or from daily_bars. The whole state is checkpointed to
+a JSON file once a day and on shutdown, so a restart resumes without
+rescanning history; daily_bars only seeds symbols (and days) the checkpoint
+does not have.
+"""
+import json
+import os
+import threading
+import time
+from array import array
+from collections import deque
+from typing import Dict, Optional
+
+import db
+import trading_calendar
+from paths import INDICATOR_STATE_PATH
+
+N_DAYS = 20
+YEAR_DAYS = 252  # trading days in 52 weeks
+
+
+class SymbolIndicators:
+    __slots__ = (
+        "n_days", "year_days", "day", "high", "low", "volume", "pv", "vwap_volume", "last_volume",
+        "last_closed_day", "count", "highs", "lows", "volumes",
+        "_n_max", "_n_min", "_year_max", "_year_min", "range_sum", "volume_sum",
+    )
+
+    def __init__(self, n_days: int = N_DAYS, year_days: int = YEAR_DAYS):
+        self.n_days = n_days
+        self.year_days = max(year_days, n_days)
+        # Current (open) day
+        self.day: Optional[int] = None
+        self.high: Optional[float] = None
+        self.low: Optional[float] = None
+        self.volume = 0
+        self.pv = 0.0
+        self.vwap_volume = 0
+        self.last_volume: Optional[int] = None
+        # Completed days: ring of the last year_days (high, low, volume); index i lives at i % year_days
+        self.last_closed_day: Optional[int] = None
+        self.count = 0
+        self.highs = array("d", [0.0]) * self.year_days
+        self.lows = array("d", [0.0]) * self.year_days
+        self.volumes = array("d", [0.0]) * self.year_days
+        self._n_max = deque()  # day indices with decreasing highs over the last n_days
+        self._n_min = deque()
+        self._year_max = deque()
+        self._year_min = deque()
+        self.range_sum = 0.0
+        self.volume_sum = 0.0
+
+    # --- Updates ---
+
+    def on_tick(self, day: int, ltp: float, volume: Optional[int] = None):
+        if day != self.day:
+            if self.day is not None and day < self.day:
+                return
+            self._roll(day)
+        if self.high is None:
+            self.high = self.low = ltp
+        elif ltp > self.high:
+            self.high = ltp
+        elif ltp < self.low:
+            self.low = ltp
+        if volume is not None:
+            if self.last_volume is not None and volume > self.last_volume:
+                delta = volume - self.last_volume
+                self.pv += ltp * delta
+                self.vwap_volume += delta
+            if self.last_volume is None or volume > self.last_volume:
+                self.last_volume = volume
+                self.volume = volume
+
+    def add_daily_bar(self, day: int, high: float, low: float, volume: float):
+        """A completed day's bar. Days at or before the last closed day, or the open day, are ignored."""
+        if self.last_closed_day is not None and day <= self.last_closed_day:
+            return
+        if self.day is not None:
+            if day == self.day:
+                return
+            if day > self.day:
+                self._roll(None)
+        self._push(high, low, volume or 0)
+        self.last_closed_day = day
+
+    def _roll(self, day: Optional[int]):
+        if self.day is not None and self.high is not None:
+            self._push(self.high, self.low, self.volume)
+            self.last_closed_day = self.day
+        self.day = day
+        self.high = self.low = None
+        self.volume = 0
+        self.pv = 0.0
+        self.vwap_volume = 0
+        self.last_volume = None
+
+    def _push(self, high: float, low: float, volume: float):
+        i = self.count
+        size = self.year_days
+        if i >= self.n_days:
+            old = (i - self.n_days) % size
+            self.range_sum -= self.highs[old] - self.lows[old]
+            self.volume_sum -= self.volumes[old]
+        slot = i % size
+        self.highs[slot] = high
+        self.lows[slot] = low
+        self.volumes[slot] = volume
+        self.range_sum += high - low
+        self.volume_sum += volume
+        self.count = i + 1
+        for window, maxima, minima in ((self.n_days, self._n_max, self._n_min),
+                                       (size, self._year_max, self._year_min)):
+            while maxima and self.highs[maxima[-1] % size] <= high:
+                maxima.pop()
+            maxima.append(i)
+            while minima and self.lows[minima[-1] % size] >= low:
+                minima.pop()
+            minima.append(i)
+            while maxima[0] <= i - window:
+                maxima.popleft()
+            while minima[0] <= i - window:
+                minima.popleft()
+
+    # --- Values ---
+
+    @property
+    def history_days(self) -> int:
+        return min(self.count, self.year_days)
+
+    @property
+    def vwap(self) -> Optional[float]:
+        return self.pv / self.vwap_volume if self.vwap_volume else None
+
+    def _extreme(self, dq, values):
+        return values[dq[0] % self.year_days] if dq else None
+
+    @property
+    def n_day_high(self) -> Optional[float]:
+        return self._extreme(self._n_max, self.highs)
+
+    @property
+    def n_day_low(self) -> Optional[float]:
+        return self._extreme(self._n_min, self.lows)
+
+    @property
+    def year_high(self) -> Optional[float]:
+        return self._extreme(self._year_max, self.highs)
+
+    @property
+    def year_low(self) -> Optional[float]:
+        return self._extreme(self._year_min, self.lows)
+
+    @property
+    def avg_range(self) -> Optional[float]:
+        n = min(self.count, self.n_days)
+        return self.range_sum / n if n else None
+
+    @property
+    def avg_volume(self) -> Optional[float]:
+        n = min(self.count, self.n_days)
+        return self.volume_sum / n if n else None
+
+    @property
+    def volume_ratio(self) -> Optional[float]:
+        avg = self.avg_volume
+        return self.volume / avg if avg else None
+
+    def snapshot(self) -> dict:
+        """
+        Current values. n_day_*/year_* cover completed days only (the levels
+        today's price is compared against); day_* are today's.
+        """
+        return {
+            "day": self.day,
+            "vwap": self.vwap,
+            "day_high": self.high,
+            "day_low": self.low,
+            "volume": self.volume,
+            "n_day_high": self.n_day_high,
+            "n_day_low": self.n_day_low,
+            "year_high": self.year_high,
+            "year_low": self.year_low,
+            "avg_range": self.avg_range,
+            "avg_volume": self.avg_volume,
+            "volume_ratio": self.volume_ratio,
+            "history_days": self.history_days,
+        }
+
+    # --- Checkpoint ---
+
+    def to_dict(self) -> dict:
+        size = self.year_days
+        start = max(0, self.count - size)
+        history = [[self.highs[i % size], self.lows[i % size], self.volumes[i % size]] for i in range(start, self.count)]
+        return {
+            "day": self.day, "high": self.high, "low": self.low, "volume": self.volume,
+            "pv": self.pv, "vwap_volume": self.vwap_volume, "last_volume": self.last_volume,
+            "last_closed_day": self.last_closed_day, "history": history,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, n_days: int = N_DAYS, year_days: int = YEAR_DAYS) -> "SymbolIndicators":
+        state = cls(n_days, year_days)
+        for high, low, volume in data.get("history", [])[-state.year_days:]:
+            state._push(high, low, volume)
+        state.last_closed_day = data.get("last_closed_day")
+        state.day = data.get("day")
+        state.high = data.get("high")
+        state.low = data.get("low")
+        state.volume = data.get("volume") or 0
+        state.pv = data.get("pv") or 0.0
+        state.vwap_volume = data.get("vwap_volume") or 0
+        state.last_volume = data.get("last_volume")
+        return state
+
+
+class IndicatorEngine:
+    """Indicator state for all symbols, fed by the collectors and read by the screener."""
+
+    def __init__(self, n_days: int = N_DAYS, year_days: int = YEAR_DAYS, path: str = INDICATOR_STATE_PATH):
+        self.n_days = n_days
+        self.year_days = year_days
+        self.path = path
+        self.symbols: Dict[str, SymbolIndicators] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def _state(self, symbol) -> SymbolIndicators:
+        state = self.symbols.get(symbol)
+        if state is None:
+            with self._lock:
+                state = self.symbols.setdefault(symbol, SymbolIndicators(self.n_days, self.year_days))
+        return state
+
+    def update_tick(self, tick: dict):
+        ltp = tick.get("ltp")
+        t = tick.get("exch_feed_time")
+        if ltp is None or not t:
+            return
+        self._state(tick["symbol"]).on_tick(trading_calendar.ist_day_number(t), ltp, tick.get("vol_traded_today"))
+
+    def update_bar(self, symbol, day_epoch: int, high, low, volume):
+        """A completed daily bar (day_epoch = IST midnight epoch, as in daily_bars)."""
+        if high is None or low is None:
+            return
+        self._state(symbol).add_daily_bar(trading_calendar.ist_day_number(day_epoch), high, low, volume)
+
+    def get(self, symbol) -> Optional[SymbolIndicators]:
+        return self.symbols.get(symbol)
+
+    def snapshot(self, symbol) -> Optional[dict]:
+        state = self.symbols.get(symbol)
+        return state.snapshot() if state is not None else None
+
+    def remove(self, symbol):
+        with self._lock:
+            self.symbols.pop(symbol, None)
+
+    # --- Persistence ---
+
+    def seed_from_db(self, db_path: str = db.DB_PATH, lookback_days: int = 400) -> int:
+        """Add daily_bars newer than each symbol's last closed day. Returns the number of bars applied."""
+        since = trading_calendar.ist_day_start(time.time()) - lookback_days * trading_calendar.SECONDS_PER_DAY
+        conn = db._connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute(
+                "SELECT symbol, day, high, low, volume FROM daily_bars WHERE day>=? ORDER BY symbol, day", (since,)
+            ).fetchall()
+        finally:
+            conn.close()
+        applied = 0
+        for symbol, day, high, low, volume in rows:
+            state = self._state(symbol)
+            before = state.count
+            self.update_bar(symbol, day, high, low, volume)
+            applied += state.count - before
+        return applied
+
+    def save(self, path: Optional[str] = None):
+        path = path or self.path
+        with self._lock:
+            items = list(self.symbols.items())
+        data = {
+            "n_days": self.n_days,
+            "year_days": self.year_days,
+            "saved_at": time.time(),
+            "symbols": {symbol: state.to_dict() for symbol, state in items},
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, path)
+        print(f"[Indicators] Checkpointed {len(items)} symbols to {path}")
+
+    def load(self, path: Optional[str] = None) -> bool:
+        path = path or self.path
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            print(f"[Indicators] Failed to load checkpoint {path}: {e}")
+            return False
+        symbols = {
+            symbol: SymbolIndicators.from_dict(state, self.n_days, self.year_days)
+            for symbol, state in data.get("symbols", {}).items()
+        }
+        with self._lock:
+            self.symbols = symbols
+        return True
+
+
+def load_or_seed(db_path: str = db.DB_PATH, path: str = INDICATOR_STATE_PATH, **kwargs) -> IndicatorEngine:
+    """Engine restored from the last checkpoint, topped up with any newer daily_bars."""
+    engine = IndicatorEngine(path=path, **kwargs)
+    loaded = engine.load()
+    try:
+        applied = engine.seed_from_db(db_path)
+    except Exception as e:
+        print("[Indicators] Failed to seed from daily_bars:", e)
+        applied = 0
+    print(f"[Indicators] {len(engine)} symbols ({'checkpoint' if loaded else 'no checkpoint'}, "
+          f"{applied} daily bars applied).")
+    return engine
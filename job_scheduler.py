@@ -0,0 +1,167 @@
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import trading_calendar
+
+# Upper bound on a single wait, so wall-clock jumps (suspend/resume, NTP steps)
+# are noticed within a minute even when the next deadline is hours away.
+MAX_SLEEP = 60.0
+
+
+def daily_at(time_str: str, trading_days_only: bool = True) -> Callable[[float], Optional[float]]:
+    """
+    Schedule function for a job that runs every day at time_str (IST, HH:MM:SS),
+    optionally skipping weekends and exchange holidays.
+    """
+    offset = trading_calendar.parse_hms(time_str)
+
+    def next_run(after: float) -> Optional[float]:
+        day = trading_calendar.ist_day_number(after)
+        for _ in range(370):
+            midnight = day * trading_calendar.SECONDS_PER_DAY - trading_calendar.IST_OFFSET
+            at = midnight + offset
+            if at > after and (not trading_days_only or trading_calendar.get_calendar(midnight).is_trading_day(midnight)):
+                return at
+            day += 1
+        return None
+
+    return next_run
+
+
+class Job:
+    def __init__(self, name: str, callback: Callable[[], None], schedule: Callable[[float], Optional[float]],
+                 threaded: bool = False):
+        self.name = name
+        self.callback = callback
+        self.schedule = schedule
+        self.threaded = threaded  # Run in its own thread so a long job never delays the others
+        self.next_run: Optional[float] = None
+        self.last_run: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.run_count = 0
+        self.last_error: Optional[str] = None
+        self.running = False
+
+    def stats(self) -> dict:
+        def fmt(epoch):
+            return None if epoch is None else datetime.fromtimestamp(epoch, trading_calendar.IST).strftime("%Y-%m-%d %H:%M:%S")
+        return {
+            "name": self.name,
+            "next_run": fmt(self.next_run),
+            "last_run": fmt(self.last_run),
+            "last_duration": self.last_duration,
+            "run_count": self.run_count,
+            "last_error": self.last_error,
+            "running": self.running,
+        }
+
+
+class JobScheduler(threading.Thread):
+    """
+    Runs registered jobs at their deadlines.
+
+    Deadlines are kept in a heap and the thread sleeps until the earliest one
+    (or until a job is added), instead of polling every second. Recurring jobs
+    are re-armed from their schedule function after each run.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        super().__init__(daemon=True)
+        self.clock = clock
+        self.jobs: Dict[str, Job] = {}
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    def add_job(self, name, callback, schedule, threaded=False) -> Job:
+        job = Job(name, callback, schedule, threaded)
+        with self._cond:
+            if name in self.jobs:
+                raise ValueError(f"Job '{name}' is already registered")
+            self.jobs[name] = job
+            self._arm(job, self.clock())
+            self._cond.notify()
+        return job
+
+    def add_daily_job(self, name, callback, time_str, trading_days_only=True, threaded=False) -> Job:
+        return self.add_job(name, callback, daily_at(time_str, trading_days_only), threaded)
+
+    def run_once_at(self, name, callback, epoch, threaded=False) -> Job:
+        """Run callback once at epoch, or as soon as possible if epoch is already due when the job is added."""
+        armed = []
+
+        def next_run(after: float) -> Optional[float]:
+            if armed:
+                return None
+            armed.append(True)
+            return max(after, epoch)
+
+        return self.add_job(name, callback, next_run, threaded)
+
+    def remove_job(self, name):
+        with self._cond:
+            # Stale heap entries are skipped when popped
+            self.jobs.pop(name, None)
+
+    def _arm(self, job: Job, after: float):
+        job.next_run = job.schedule(after)
+        if job.next_run is not None:
+            heapq.heappush(self._heap, (job.next_run, next(self._seq), job))
+
+    def next_run_times(self) -> Dict[str, Optional[float]]:
+        with self._cond:
+            return {name: job.next_run for name, job in self.jobs.items()}
+
+    def stats(self) -> List[dict]:
+        with self._cond:
+            jobs = sorted(self.jobs.values(), key=lambda j: (j.next_run is None, j.next_run or 0))
+        return [job.stats() for job in jobs]
+
+    def _execute(self, job: Job):
+        job.running = True
+        started = time.perf_counter()
+        job.last_run = self.clock()
+        try:
+            job.callback()
+            job.last_error = None
+        except Exception as e:
+            job.last_error = str(e)
+            print(f"[JobScheduler] Job '{job.name}' failed:", e)
+        finally:
+            job.last_duration = time.perf_counter() - started
+            job.run_count += 1
+            job.running = False
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    now = self.clock()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    timeout = MAX_SLEEP if not self._heap else min(self._heap[0][0] - now, MAX_SLEEP)
+                    self._cond.wait(timeout)
+                if self._stopped:
+                    return
+                deadline, _, job = heapq.heappop(self._heap)
+                if self.jobs.get(job.name) is not job or job.next_run != deadline:
+                    continue
+                # Re-arm from now rather than the missed deadline, so a suspended
+                # process runs an overdue job once instead of catching up repeatedly
+                self._arm(job, max(deadline, now))
+            if job.running:
+                print(f"[JobScheduler] Skipping '{job.name}': previous run still in progress.")
+            elif job.threaded:
+                threading.Thread(target=self._execute, args=(job,), daemon=True).start()
+            else:
+                self._execute(job)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
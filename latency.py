@@ -0,0 +1,368 @@
+"""
+End-to-end tick latency tracing.
+
+Each tick is stamped with time.monotonic() as it moves through the pipeline
+and the gap between consecutive stamps goes into a log-bucketed histogram per
+stage:
+
+    exchange_to_received    wall clock on receipt minus exch_feed_time (1s resolution)
+    received_to_enqueued    TickCollector handing the tick to TickDBWorker
+    enqueued_to_committed   time in the DB worker queue plus the batch commit
+    committed_to_screened   commit to the first screener pass that sees the tick
+    received_to_screened    receipt to that screener pass (the screener reads the
+                            in-memory buffers, so it usually runs ahead of the commit)
+    screened_to_alert       screener pass start to the event being emitted
+    exchange_to_alert       whole path for ticks that raised an event
+
+Receive/enqueue stamps travel on the tick dict; commit and screen stamps are
+kept for the latest tick per symbol only. A bounded sample of slow ticks is
+kept with all their stamps. The tracker is saved per session and summarized
+with:
+
+    python latency.py report --date 2025-06-10
+"""
+import argparse
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from paths import LATENCY_LOG_DIR
+
+STAGES = (
+    "exchange_to_received",
+    "received_to_enqueued",
+    "enqueued_to_committed",
+    "committed_to_screened",
+    "received_to_screened",
+    "screened_to_alert",
+    "exchange_to_alert",
+)
+
+# Stamp keys added to tick dicts; not part of TICK_FIELDS so never stored
+RECEIVED_KEY = "_t_received"
+ENQUEUED_KEY = "_t_enqueued"
+
+
+class LogHistogram:
+    """
+    HDR-style histogram of non-negative durations in seconds.
+
+    Values are recorded in microseconds into `sub_buckets` linear buckets per
+    power of two, so percentiles are accurate to about 1/sub_buckets relative
+    error over the whole range, in constant memory and O(1) per record.
+    """
+
+    MAX_EXPONENT = 40  # 2**40 us, about 12 days
+
+    def __init__(self, sub_buckets: int = 32):
+        self.sub_buckets = sub_buckets
+        self.counts = [0] * ((self.MAX_EXPONENT + 1) * sub_buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.negative = 0  # clock skew (exchange stamps ahead of ours), recorded as zero
+
+    def _index(self, micros: int) -> int:
+        if micros <= 0:
+            return 0
+        mantissa, exponent = math.frexp(micros)
+        if exponent > self.MAX_EXPONENT:
+            return len(self.counts) - 1
+        return exponent * self.sub_buckets + int((mantissa - 0.5) * 2 * self.sub_buckets)
+
+    def _value(self, index: int) -> float:
+        """Upper edge of a bucket, in seconds."""
+        exponent, sub = divmod(index, self.sub_buckets)
+        if exponent == 0:
+            return 0.0
+        return math.ldexp(0.5 + (sub + 1) / (2 * self.sub_buckets), exponent) / 1e6
+
+    def record(self, seconds: float):
+        if seconds < 0:
+            self.negative += 1
+            seconds = 0.0
+        self.counts[self._index(int(seconds * 1e6))] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        target = max(1, math.ceil(self.count * q / 100.0))
+        seen = 0
+        for index, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return min(self._value(index), self.max)
+        return self.max
+
+    def merge(self, other: "LogHistogram"):
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.negative += other.negative
+
+    def to_dict(self) -> dict:
+        return {
+            "sub_buckets": self.sub_buckets,
+            "counts": {str(i): c for i, c in enumerate(self.counts) if c},
+            "count": self.count,
+            "total": self.total,
+            "max": self.max,
+            "negative": self.negative,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LogHistogram":
+        h = cls(data.get("sub_buckets", 32))
+        for i, c in data.get("counts", {}).items():
+            h.counts[int(i)] = c
+        h.count = data.get("count", 0)
+        h.total = data.get("total", 0.0)
+        h.max = data.get("max", 0.0)
+        h.negative = data.get("negative", 0)
+        return h
+
+
+class LatencyTracker:
+    """
+    Collects per-stage histograms and slow-tick samples for one process.
+
+    Called from the collector threads (received/enqueued: the WebSocket
+    collector and the RestPoller), the DB workers (committed: one each for the
+    WebSocket and REST queues) and the screener (screened/alerted). A stage can
+    be written by more than one thread, so each histogram has its own lock.
+    """
+
+    def __init__(self, enabled: bool = True, slow_threshold: float = 1.0, slow_sample_rate: float = 0.1,
+                 max_slow_traces: int = 200):
+        self.enabled = enabled
+        self.slow_threshold = slow_threshold
+        self.slow_sample_rate = slow_sample_rate
+        self.histograms: Dict[str, LogHistogram] = {stage: LogHistogram() for stage in STAGES}
+        self._stage_locks: Dict[str, threading.Lock] = {stage: threading.Lock() for stage in STAGES}
+        self.slow_traces = deque(maxlen=max_slow_traces)
+        # Latest tick per symbol: (received, exchange lag), committed, screened pass
+        self._received: Dict[str, tuple] = {}
+        self._committed: Dict[str, tuple] = {}
+        self._screened: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {stage: LogHistogram() for stage in STAGES}
+            self.slow_traces.clear()
+            self._received.clear()
+            self._committed.clear()
+            self._screened.clear()
+
+    def _threshold(self, stage: str) -> float:
+        # exch_feed_time is truncated to the second, so exchange stages carry up to 1s of noise
+        return self.slow_threshold + 1.0 if stage.startswith("exchange") else self.slow_threshold
+
+    def _maybe_trace(self, symbol: str, stage: str, value: float):
+        if value >= self._threshold(stage) and random.random() < self.slow_sample_rate:
+            received = self._received.get(symbol)
+            self.slow_traces.append({
+                "wall_time": time.time(),
+                "symbol": symbol,
+                "stage": stage,
+                "seconds": round(value, 6),
+                "exchange_lag": round(received[1], 3) if received else None,
+                "received": received[0] if received else None,
+                "committed": self._committed.get(symbol, (None, None))[1],
+                "screened": self._screened.get(symbol, (None, None))[1],
+            })
+
+    def _record(self, symbol: str, stage: str, value: float):
+        with self._stage_locks[stage]:
+            self.histograms[stage].record(value)
+        if value >= self.slow_threshold:
+            self._maybe_trace(symbol, stage, value)
+
+    # --- Collector thread ---
+
+    def received(self, tick: dict, wall_now: float, mono_now: float):
+        symbol = tick.get("symbol")
+        exch_time = tick.get("exch_feed_time")
+        lag = wall_now - exch_time if exch_time else 0.0
+        tick[RECEIVED_KEY] = mono_now
+        self._received[symbol] = (mono_now, lag)
+        if exch_time:
+            self._record(symbol, "exchange_to_received", lag)
+
+    def enqueued(self, tick: dict):
+        now = time.monotonic()
+        tick[ENQUEUED_KEY] = now
+        received = tick.get(RECEIVED_KEY)
+        if received is not None:
+            self._record(tick.get("symbol"), "received_to_enqueued", now - received)
+
+    # --- DB worker thread ---
+
+    def committed(self, ticks: List[dict]):
+        now = time.monotonic()
+        waits = []
+        for tick in ticks:
+            enqueued = tick.get(ENQUEUED_KEY)
+            if enqueued is None:
+                continue
+            symbol = tick.get("symbol")
+            waits.append(now - enqueued)
+            if now - enqueued >= self.slow_threshold:
+                self._maybe_trace(symbol, "enqueued_to_committed", now - enqueued)
+            self._committed[symbol] = (tick.get(RECEIVED_KEY), now)
+        with self._stage_locks["enqueued_to_committed"]:
+            histogram = self.histograms["enqueued_to_committed"]
+            for wait in waits:
+                histogram.record(wait)
+
+    # --- Screener thread ---
+
+    def screened(self, symbol: str, now: float):
+        """Mark the latest received tick of `symbol` as seen by the screener pass started at `now`."""
+        received = self._received.get(symbol)
+        if received is None:
+            return
+        last = self._screened.get(symbol)
+        if last is not None and last[0] == received[0]:
+            return
+        self._screened[symbol] = (received[0], now)
+        self._record(symbol, "received_to_screened", now - received[0])
+        committed = self._committed.get(symbol)
+        if committed is not None and committed[0] == received[0] and committed[1] <= now:
+            self._record(symbol, "committed_to_screened", now - committed[1])
+
+    def alerted(self, symbol: str):
+        screened = self._screened.get(symbol)
+        received = self._received.get(symbol)
+        if screened is None or received is None or screened[0] != received[0]:
+            return
+        now = time.monotonic()
+        self._record(symbol, "screened_to_alert", now - screened[1])
+        self._record(symbol, "exchange_to_alert", received[1] + (now - received[0]))
+
+    # --- Reporting ---
+
+    def summary(self) -> Dict[str, dict]:
+        return {
+            stage: {
+                "count": h.count,
+                "p50": h.percentile(50),
+                "p99": h.percentile(99),
+                "p99.9": h.percentile(99.9),
+                "max": h.max,
+            }
+            for stage, h in self.histograms.items()
+        }
+
+    def _histogram_dicts(self) -> Dict[str, dict]:
+        out = {}
+        for stage, h in self.histograms.items():
+            with self._stage_locks[stage]:
+                out[stage] = h.to_dict()
+        return out
+
+    def to_dict(self) -> dict:
+        return {
+            "saved_at": datetime.now().isoformat(timespec="seconds"),
+            "histograms": self._histogram_dicts(),
+            "slow_traces": list(self.slow_traces),
+        }
+
+    def save(self, path: Optional[str] = None) -> Optional[str]:
+        """Merge this session's histograms into the day's file and reset."""
+        if not any(h.count for h in self.histograms.values()):
+            return None
+        path = path or session_file()
+        with self._lock:
+            data = self.to_dict()
+            if os.path.exists(path):
+                previous = load_session(path)
+                for stage, h in previous["histograms"].items():
+                    merged = LogHistogram.from_dict(data["histograms"].get(stage, LogHistogram().to_dict()))
+                    merged.merge(h)
+                    data["histograms"][stage] = merged.to_dict()
+                data["slow_traces"] = (previous["slow_traces"] + data["slow_traces"])[-self.slow_traces.maxlen:]
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+        self.reset()
+        print(f"[Latency] Saved latency histograms to {path}")
+        return path
+
+
+def session_file(day: Optional[str] = None) -> str:
+    day = day or datetime.now().strftime("%Y%m%d")
+    return os.path.join(LATENCY_LOG_DIR, f"latency_{day}.json")
+
+
+def load_session(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {
+        "histograms": {stage: LogHistogram.from_dict(h) for stage, h in data.get("histograms", {}).items()},
+        "slow_traces": data.get("slow_traces", []),
+    }
+
+
+def format_report(histograms: Dict[str, LogHistogram], slow_traces: List[dict], max_traces: int = 10) -> str:
+    def ms(seconds):
+        return f"{seconds * 1000:10.2f}"
+
+    lines = [f"{'stage':<24}{'count':>10}{'p50 ms':>11}{'p99 ms':>11}{'p99.9 ms':>11}{'max ms':>11}"]
+    for stage in STAGES:
+        h = histograms.get(stage)
+        if h is None or h.count == 0:
+            continue
+        lines.append(f"{stage:<24}{h.count:>10}{ms(h.percentile(50)):>11}{ms(h.percentile(99)):>11}"
+                     f"{ms(h.percentile(99.9)):>11}{ms(h.max):>11}")
+        if h.negative:
+            lines.append(f"{'':<24}({h.negative} negative values clamped to 0: clock skew)")
+    if slow_traces:
+        lines.append("")
+        lines.append(f"Slowest sampled ticks ({len(slow_traces)} retained):")
+        for trace in sorted(slow_traces, key=lambda t: t["seconds"], reverse=True)[:max_traces]:
+            at = datetime.fromtimestamp(trace["wall_time"]).strftime("%H:%M:%S")
+            lines.append(f"  {at} {trace['symbol']:<24} {trace['stage']:<24} {trace['seconds'] * 1000:.1f}ms "
+                         f"(exchange lag {trace['exchange_lag']}s)")
+    return "\n".join(lines)
+
+
+TRACKER = LatencyTracker(enabled=os.getenv("LATENCY_TRACING", "1") != "0")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tick latency reports.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report = sub.add_parser("report", help="Print p50/p99/p99.9 per stage for a session")
+    report.add_argument("--date", help="Session date (YYYY-MM-DD), default today")
+    report.add_argument("--file", help="Latency JSON file, overrides --date")
+    report.add_argument("--traces", type=int, default=10, help="Slow traces to show")
+    args = parser.parse_args()
+
+    if args.file:
+        path = args.file
+    else:
+        day = datetime.strptime(args.date, "%Y-%m-%d").strftime("%Y%m%d") if args.date else None
+        path = session_file(day)
+    if not os.path.exists(path):
+        print(f"No latency data at {path}")
+        return
+    session = load_session(path)
+    print(f"Latency report for {path}")
+    print(format_report(session["histograms"], session["slow_traces"], args.traces))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+class LatestTickStore:
+    """
+    Latest tick per symbol, kept in process by the collector.
+
+    Every update bumps a global sequence number and stamps the symbol with it,
+    so consumers (e.g. the watchlist) can ask for only the symbols that changed
+    since the sequence they last saw.
+    """
+
+    def __init__(self):
+        self.ticks: Dict[str, dict] = {}
+        self.prev_close: Dict[str, float] = {}
+        self._seq: Dict[str, int] = {}
+        self.seq = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def update(self, tick: dict, prev_close: Optional[float] = None):
+        symbol = tick.get("symbol")
+        if symbol is None:
+            return
+        with self._lock:
+            self.seq += 1
+            self.ticks[symbol] = tick
+            self._seq[symbol] = self.seq
+            if prev_close:
+                self.prev_close[symbol] = prev_close
+
+    def get(self, symbol) -> Optional[dict]:
+        return self.ticks.get(symbol)
+
+    def changed_since(self, seq: int) -> Tuple[List[str], int]:
+        """Symbols updated after `seq`, and the sequence number to pass next time."""
+        with self._lock:
+            current = self.seq
+            if seq >= current:
+                return [], current
+            changed = [symbol for symbol, s in self._seq.items() if s > seq]
+        return changed, current
+
+    def remove(self, symbol):
+        """Drop a symbol. It is still reported once by changed_since(), with get() returning None."""
+        with self._lock:
+            self.ticks.pop(symbol, None)
+            self.prev_close.pop(symbol, None)
+            self.seq += 1
+            self._seq[symbol] = self.seq
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return dict(self.ticks)
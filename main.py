@@ -1,4 +1,23 @@
-from gui import launch_gui
+import time
+_t0 = time.perf_counter()
+
+import argparse
+
+def main():
+    parser = argparse.ArgumentParser(description="Fyers tick collector and screener.")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run collector, scheduler and screener without the Tk GUI")
+    args = parser.parse_args()
+
+    from daemon import StartupTimer
+    timer = StartupTimer(t0=_t0)
+    if args.headless:
+        from daemon import run_headless
+        run_headless(timer)
+    else:
+        from gui import launch_gui
+        timer.mark("gui imports")
+        launch_gui(timer)
 
 if __name__ == "__main__":
-    launch_gui()
\ No newline at end of file
+    main()
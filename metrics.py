@@ -0,0 +1,291 @@
+"""
+In-process metrics with a Prometheus text endpoint.
+
+Counters, gauges and histograms are plain Python objects updated from the hot
+paths (collector, DB worker, screener) without locks: an increment is a single
+attribute update, so a scrape may be off by an in-flight increment but never
+blocks ingest. Labelled metrics hand out a child per label set; callers on hot
+paths should look the child up once and keep it.
+
+    curl http://127.0.0.1:9108/metrics
+    curl http://127.0.0.1:9108/profile?seconds=60   (see profiling.py)
+"""
+import abc
+import bisect
+import http.server
+import json
+import os
+import socketserver
+import threading
+import urllib.parse
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# Seconds, from 100us to 10s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(abc.ABC):
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """A fresh child holding the value(s) for one label set."""
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _unlabelled(self):
+        return self._children[()]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for key, child in list(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.get())}"]
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def get(self):
+        return self.value
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._unlabelled().inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        """Evaluate `function` at scrape time instead of storing a value (e.g. a queue's qsize)."""
+        self.function = function
+
+    def get(self):
+        if self.function is not None:
+            try:
+                return self.function()
+            except Exception:
+                return float("nan")
+        return self.value
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._unlabelled().set(value)
+
+    def set_function(self, function):
+        self._unlabelled().set_function(function)
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._unlabelled().observe(value)
+
+    def _render_child(self, key, child) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {child.sum!r}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# --- Metrics for the ingest and screening paths ---
+TICKS_RECEIVED = Counter("ticks_received_total", "Ticks received, per collector source", ["source"])
+DB_QUEUE_DEPTH = Gauge("db_worker_queue_depth", "Ticks waiting in a DB worker queue", ["worker"])
+DB_BATCH_SIZE = Histogram("db_worker_batch_size", "Ticks written per DB commit", ["worker"], buckets=SIZE_BUCKETS)
+DB_COMMIT_SECONDS = Histogram("db_worker_commit_seconds", "Time to insert and commit one batch", ["worker"])
+SCREENER_CYCLE_SECONDS = Histogram("screener_cycle_seconds", "Time for one screening pass over the latest ticks")
+SCREENER_REFRESH_SECONDS = Histogram("screener_highlow_refresh_seconds", "Time to reload weekly/monthly high/lows")
+SCREENER_SYMBOLS = Gauge("screener_symbols", "Symbols screened in the last pass")
+EVENTS_EMITTED = Counter("screener_events_total", "Events emitted by the screener, per period", ["period"])
+
+
+# --- HTTP endpoint ---
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        parsed = urllib.parse.urlparse(self.path)
+        if parsed.path in ("/", "/metrics"):
+            self._send(200, self.server.registry.render(), "text/plain; version=0.0.4; charset=utf-8")
+        elif parsed.path.startswith("/profile"):
+            self._profile(parsed.path, urllib.parse.parse_qs(parsed.query))
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+    def _profile(self, path, params):
+        """/profile?seconds=60&cpu=1&memory=0&sql=1 opens a window; /profile/stop and /profile/status."""
+        from profiling import PROFILER
+
+        def flag(name, default):
+            return params.get(name, [default])[0] not in ("0", "false", "no")
+
+        if path == "/profile/stop":
+            status = PROFILER.stop()
+        elif path == "/profile/status":
+            status = PROFILER.status()
+        else:
+            try:
+                seconds = float(params.get("seconds", ["60"])[0])
+            except ValueError:
+                self._send(400, "seconds must be a number\n", "text/plain")
+                return
+            status = PROFILER.start(seconds, cpu=flag("cpu", "1"), memory=flag("memory", "0"), sql=flag("sql", "1"))
+        self._send(200, json.dumps(status, indent=2) + "\n", "application/json")
+
+    def _send(self, code, text, content_type):
+        body = text.encode()
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        return
+
+
+class MetricsHTTPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, server_address, RequestHandlerClass, registry):
+        super().__init__(server_address, RequestHandlerClass)
+        self.registry = registry
+
+
+def start_metrics_server(port: int = METRICS_PORT, registry: MetricsRegistry = REGISTRY, host: str = "127.0.0.1"):
+    server = MetricsHTTPServer((host, port), MetricsRequestHandler, registry)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f"[Metrics] Serving on http://{host}:{server.server_address[1]}/metrics")
+    return server, thread
+
+
+def stop_metrics_server(server, thread):
+    if server:
+        server.shutdown()
+        server.server_close()
+    if thread:
+        thread.join(timeout=2)
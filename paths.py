@@ -6,4 +6,14 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 TOKEN_FILE_PATH = os.path.join(BASE_DIR, "tokens.txt")
 LOG_FILE_PATH = os.path.join(BASE_DIR, "fyers_auth_log.txt")
 # Add event log directory (used in event_log.py)
-EVENT_LOG_DIR = os.path.join(BASE_DIR, "event_logs")
\ No newline at end of file
+EVENT_LOG_DIR = os.path.join(BASE_DIR, "event_logs")
+# Exchange holidays, one YYYY-MM-DD per line (used by trading_calendar.py)
+HOLIDAYS_FILE_PATH = os.path.join(BASE_DIR, "market_holidays.txt")
+# Per-session tick latency histograms (used by latency.py)
+LATENCY_LOG_DIR = os.path.join(BASE_DIR, "latency_logs")
+# Profiling window output (used by profiling.py)
+PROFILE_DIR = os.path.join(BASE_DIR, "profiles")
+# Write-ahead tick journal segments and ingest cursor (used by tick_journal.py)
+JOURNAL_DIR = os.path.join(BASE_DIR, "tick_journal")
+# Daily checkpoint of the incremental indicator state (used by indicators.py)
+INDICATOR_STATE_PATH = os.path.join(BASE_DIR, "indicator_state.json")
@@ -0,0 +1,257 @@
+"""
+Runtime-toggleable profiling for the collector, DB worker and screener.
+
+A profiling window is started for a bounded number of seconds, either from
+the metrics server (GET /profile?seconds=60&memory=1) or at the session open
+via PROFILE_AT_OPEN=<seconds>. While it is open:
+
+  - each instrumented loop calls checkpoint(name); the first call inside the
+    window enables a cProfile.Profile for that thread and the first call after
+    it closes writes <name>.pstats and <name>.txt,
+  - tracemalloc tracks allocations (memory=1) and the growth between the start
+    and end snapshots is written to memory.txt,
+  - connections opened through db use TimedConnection, which times every
+    statement and commit (sql=1) into sql.txt.
+
+Output goes to profiles/<YYYYmmdd_HHMMSS>/ with fixed sort orders so two
+windows can be diffed. Outside a window checkpoint() is one attribute check.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from paths import PROFILE_DIR
+
+MAX_WINDOW_SECONDS = 600
+TOP_N = 40
+
+
+class Profiler:
+    def __init__(self, output_dir: str = PROFILE_DIR):
+        self.output_dir = output_dir
+        self.armed = False  # True while a window is open or a thread still holds an open profile
+        self.active = False
+        self.cpu = False
+        self.sql_active = False
+        self.window_dir: Optional[str] = None
+        self.window_id = 0
+        self.started_at = None
+        self.ends_at = None
+        self._open_profiles = 0
+        self._memory = False
+        self._memory_start = None
+        self._sql_stats: Dict[str, list] = {}  # statement -> [count, total seconds, max seconds]
+        self._threads = set()  # checkpoint names profiled in the current window
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        self._sql_lock = threading.Lock()  # record_sql runs on every DB thread; kept apart from _lock
+        self._local = threading.local()
+
+    # --- Window control ---
+
+    def start(self, seconds: float = 60, cpu: bool = True, memory: bool = False, sql: bool = True) -> dict:
+        seconds = max(1.0, min(float(seconds), MAX_WINDOW_SECONDS))
+        with self._lock:
+            if self.active:
+                return self.status()
+            self.window_id += 1
+            self.window_dir = os.path.join(self.output_dir, datetime.now().strftime("%Y%m%d_%H%M%S"))
+            os.makedirs(self.window_dir, exist_ok=True)
+            self.cpu = cpu
+            self.sql_active = sql
+            self._sql_stats = {}
+            self._threads = set()
+            self._memory = memory
+            if memory:
+                import tracemalloc
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(10)
+                self._memory_start = tracemalloc.take_snapshot()
+            self.started_at = time.time()
+            self.ends_at = self.started_at + seconds
+            self.active = True
+            self.armed = True
+            self._timer = threading.Timer(seconds, self.stop)
+            self._timer.daemon = True
+            self._timer.start()
+        print(f"[Profiler] Window open for {seconds:.0f}s, writing to {self.window_dir}")
+        return self.status()
+
+    def stop(self) -> dict:
+        with self._lock:
+            if not self.active:
+                return self.status()
+            self.active = False
+            self.sql_active = False
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            window_dir = self.window_dir
+            self._write_memory(window_dir)
+            self._write_sql(window_dir)
+            self._write_summary(window_dir)
+            self.armed = self._open_profiles > 0
+        print("[Profiler] Window closed; thread profiles are written at each thread's next checkpoint.")
+        return self.status()
+
+    def status(self) -> dict:
+        return {
+            "active": self.active,
+            "window_dir": self.window_dir,
+            "started_at": self.started_at,
+            "ends_at": self.ends_at,
+            "threads": sorted(self._threads),
+            "open_profiles": self._open_profiles,
+        }
+
+    # --- Thread checkpoints ---
+
+    def _checkpoint(self, name: str):
+        local = self._local
+        profile = getattr(local, "profile", None)
+        if profile is not None and (not self.active or local.window_id != self.window_id):
+            profile.disable()
+            local.profile = None
+            self._write_thread_profile(local.name, profile, local.window_dir)
+            with self._lock:
+                self._open_profiles -= 1
+                if not self.active and self._open_profiles == 0:
+                    self.armed = False
+            profile = None
+        if profile is None and self.active and self.cpu and getattr(local, "window_id", None) != self.window_id:
+            local.window_id = self.window_id
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError as e:
+                # Python 3.12+ allows only one active profiler per process
+                print(f"[Profiler] Cannot profile {name}: {e}")
+                return
+            local.profile = profile
+            local.name = name
+            local.window_dir = self.window_dir
+            with self._lock:
+                self._open_profiles += 1
+                self._threads.add(name)
+
+    def _write_thread_profile(self, name: str, profile: cProfile.Profile, window_dir: str):
+        stem = os.path.join(window_dir, name.replace("/", "_"))
+        try:
+            profile.dump_stats(stem + ".pstats")
+            out = io.StringIO()
+            stats = pstats.Stats(profile, stream=out)
+            stats.sort_stats("cumulative").print_stats(TOP_N)
+            stats.sort_stats("tottime").print_stats(TOP_N)
+            with open(stem + ".txt", "w", encoding="utf-8") as f:
+                f.write(out.getvalue())
+        except Exception as e:
+            print(f"[Profiler] Failed to write profile for {name}: {e}")
+
+    # --- SQL timing ---
+
+    def record_sql(self, statement: str, seconds: float):
+        key = " ".join(statement.split())[:200]
+        with self._sql_lock:
+            entry = self._sql_stats.get(key)
+            if entry is None:
+                self._sql_stats[key] = [1, seconds, seconds]
+            else:
+                entry[0] += 1
+                entry[1] += seconds
+                if seconds > entry[2]:
+                    entry[2] = seconds
+
+    def _sql_snapshot(self) -> Dict[str, list]:
+        with self._sql_lock:
+            return {statement: list(entry) for statement, entry in self._sql_stats.items()}
+
+    def _write_sql(self, window_dir: str):
+        stats = self._sql_snapshot()
+        if not stats:
+            return
+        rows = sorted(stats.items(), key=lambda item: item[1][1], reverse=True)
+        with open(os.path.join(window_dir, "sql.txt"), "w", encoding="utf-8") as f:
+            f.write(f"{'total ms':>12}{'count':>10}{'mean ms':>10}{'max ms':>10}  statement\n")
+            for statement, (count, total, worst) in rows:
+                f.write(f"{total * 1000:12.2f}{count:>10}{total / count * 1000:10.3f}{worst * 1000:10.3f}  {statement}\n")
+
+    # --- Memory ---
+
+    def _write_memory(self, window_dir: str):
+        if not self._memory or self._memory_start is None:
+            return
+        import tracemalloc
+        end = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        diff = end.compare_to(self._memory_start, "lineno")
+        with open(os.path.join(window_dir, "memory.txt"), "w", encoding="utf-8") as f:
+            f.write(f"traced current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB\n\n")
+            f.write(f"Top {TOP_N} allocation growth by line:\n")
+            for stat in diff[:TOP_N]:
+                f.write(f"{stat}\n")
+        self._memory_start = None
+
+    def _write_summary(self, window_dir: str):
+        summary = dict(self.status(), stopped_at=time.time(),
+                       sql_statements=sum(entry[0] for entry in self._sql_snapshot().values()))
+        with open(os.path.join(window_dir, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        if not PROFILER.sql_active:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            PROFILER.record_sql(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not PROFILER.sql_active:
+            return super().executemany(sql, seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            PROFILER.record_sql(sql, time.perf_counter() - started)
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection factory whose statements are timed while a profiling window is open."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        if not PROFILER.sql_active:
+            return super().commit()
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            PROFILER.record_sql("COMMIT", time.perf_counter() - started)
+
+
+PROFILER = Profiler()
+
+
+def checkpoint(name: str):
+    """Call from a thread's loop; cheap unless a profiling window is open."""
+    if PROFILER.armed:
+        PROFILER._checkpoint(name)
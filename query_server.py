@@ -0,0 +1,430 @@
+"""
+Read-only HTTP query service over ticks_data.db.
+
+External tools query captured data here instead of opening the database
+themselves. Every request runs on a pooled `mode=ro` connection (the database
+is in WAL mode, so readers never block the ingest writer), large tick ranges
+are streamed as chunked NDJSON, and results are kept in an LRU cache.
+
+Cache entries are tagged with the ingest watermark, PRAGMA data_version of a
+dedicated connection, which changes whenever any other connection commits.
+The watermark is sampled at most every watermark_interval seconds, so a
+dashboard polling the same query repeatedly only reaches SQLite again after
+new data has been committed. Tick ranges that end before today's IST midnight
+cannot change any more and stay cached across watermarks.
+
+    python query_server.py --port 9110
+    curl 'http://127.0.0.1:9110/latest?symbols=NSE:SBIN-EQ,NSE:TCS-EQ'
+    curl 'http://127.0.0.1:9110/range?symbol=NSE:SBIN-EQ&start=1718000000&end=1718020000'
+    curl 'http://127.0.0.1:9110/bars?symbol=NSE:SBIN-EQ&resolution=1&start=1718000000&end=1718020000'
+    curl 'http://127.0.0.1:9110/highlow?symbol=NSE:SBIN-EQ&period=week'
+"""
+import argparse
+import contextlib
+import http.server
+import itertools
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import db
+import trading_calendar
+
+QUERY_PORT = int(os.getenv("QUERY_PORT", "9110"))
+CHUNK_ROWS = 1000  # rows per streamed chunk
+MAX_CACHED_ROWS = 50000  # larger ranges are streamed but not cached
+
+
+class QueryError(Exception):
+    """A bad request; the message is returned to the client with status 400."""
+
+
+class ReadConnectionPool:
+    def __init__(self, db_path: str = db.DB_PATH, size: int = 4):
+        self.db_path = db_path
+        self.size = size
+        self._pool = queue.Queue()
+        for _ in range(size):
+            self._pool.put(self._open())
+
+    def _open(self):
+        conn = db._connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only=1")
+        return conn
+
+    @contextlib.contextmanager
+    def connection(self, timeout: float = 30.0):
+        conn = self._pool.get(timeout=timeout)
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class Watermark:
+    """Ingest watermark: PRAGMA data_version of a private connection, re-read at most every interval seconds."""
+
+    def __init__(self, db_path: str = db.DB_PATH, interval: float = 1.0, clock=time.monotonic):
+        self.interval = interval
+        self.clock = clock
+        self._conn = db._connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._value = None
+        self._checked = None
+
+    def current(self) -> int:
+        with self._lock:
+            now = self.clock()
+            if self._checked is None or now - self._checked >= self.interval:
+                self._value = self._conn.execute("PRAGMA data_version").fetchone()[0]
+                self._checked = now
+            return self._value
+
+    def close(self):
+        self._conn.close()
+
+
+class ResultCache:
+    """LRU of encoded responses keyed by request; entries carry the watermark they were computed at (None: sealed)."""
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, Tuple[Optional[int], str, List[bytes], int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, watermark: int) -> Optional[Tuple[str, List[bytes]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[0] is not None and entry[0] != watermark):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key, watermark: Optional[int], content_type: str, chunks: List[bytes]):
+        size = sum(len(c) for c in chunks)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[3]
+            self._entries[key] = (watermark, content_type, chunks, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted[3]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+# --- Queries (each returns or yields JSON-serializable rows) ---
+
+def _param(params, name, default=None, cast=str):
+    values = params.get(name)
+    if not values or values[0] == "":
+        if default is None:
+            raise QueryError(f"missing parameter: {name}")
+        return default
+    try:
+        return cast(values[0])
+    except ValueError:
+        raise QueryError(f"invalid {name}: {values[0]}")
+
+
+def query_latest(conn, symbols: Optional[List[str]]) -> dict:
+    fields = ", ".join(db.TICK_FIELDS)
+    if symbols:
+        out = {}
+        for symbol in symbols:
+            row = conn.execute(
+                f"SELECT {fields} FROM ticks WHERE symbol=? ORDER BY exch_feed_time DESC LIMIT 1", (symbol,)
+            ).fetchone()
+            if row is not None:
+                out[symbol] = dict(zip(db.TICK_FIELDS, row))
+        return out
+    rows = conn.execute(f"""
+        SELECT {", ".join("t1." + f for f in db.TICK_FIELDS)}
+        FROM ticks t1
+        INNER JOIN (
+            SELECT symbol, MAX(exch_feed_time) AS max_time FROM ticks GROUP BY symbol
+        ) t2
+        ON t1.symbol = t2.symbol AND t1.exch_feed_time = t2.max_time
+    """).fetchall()
+    return {row[0]: dict(zip(db.TICK_FIELDS, row)) for row in rows}
+
+
+def query_range(conn, symbol: str, start: int, end: int, fields: List[str]) -> Iterator[list]:
+    cursor = conn.execute(
+        f"SELECT {', '.join(fields)} FROM ticks WHERE symbol=? AND exch_feed_time>=? AND exch_feed_time<=? "
+        "ORDER BY exch_feed_time",
+        (symbol, start, end),
+    )
+    while True:
+        rows = cursor.fetchmany(CHUNK_ROWS)
+        if not rows:
+            return
+        yield rows
+
+
+def query_bars(conn, symbol: str, start: int, end: int, resolution: str) -> List[list]:
+    """[time, open, high, low, close, volume] rows. '1': minute_bars, with minutes built from ticks where missing; 'D': daily_bars."""
+    if resolution == "D":
+        return [list(r) for r in conn.execute(
+            "SELECT day, open, high, low, close, volume FROM daily_bars WHERE symbol=? AND day>=? AND day<=? ORDER BY day",
+            (symbol, start, end),
+        )]
+    if resolution != "1":
+        raise QueryError("resolution must be 1 or D")
+    bars = {r[0]: list(r) for r in conn.execute(
+        "SELECT time, open, high, low, close, volume FROM minute_bars WHERE symbol=? AND time>=? AND time<=?",
+        (symbol, start, end),
+    )}
+    built = {}
+    prev_volume = None
+    for t, ltp, volume in conn.execute(
+        "SELECT exch_feed_time, ltp, vol_traded_today FROM ticks WHERE symbol=? AND exch_feed_time>=? AND exch_feed_time<=? "
+        "AND ltp IS NOT NULL ORDER BY exch_feed_time",
+        (symbol, start, end),
+    ):
+        # Volume is the increase in vol_traded_today over the minute's ticks
+        delta = volume - prev_volume if volume is not None and prev_volume is not None and volume > prev_volume else 0
+        if volume is not None:
+            prev_volume = volume
+        minute = t - t % 60
+        if minute in bars:
+            continue
+        bar = built.get(minute)
+        if bar is None:
+            built[minute] = [minute, ltp, ltp, ltp, ltp, delta]
+            continue
+        if ltp > bar[2]:
+            bar[2] = ltp
+        if ltp < bar[3]:
+            bar[3] = ltp
+        bar[4] = ltp
+        bar[5] += delta
+    bars.update(built)
+    return [bars[t] for t in sorted(bars)]
+
+
+def query_highlow(conn, symbol: str, start: int, end: int) -> dict:
+    high, low, days = db.get_high_low_days_for_period(symbol, start, end, conn=conn)
+    return {"symbol": symbol, "start": start, "end": end, "high": high, "low": low, "days": days}
+
+
+# --- HTTP ---
+
+class QueryRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        parsed = urllib.parse.urlparse(self.path)
+        params = urllib.parse.parse_qs(parsed.query)
+        self._streaming = False
+        try:
+            if parsed.path == "/latest":
+                symbols = [s for s in _param(params, "symbols", "").split(",") if s]
+                self._cached_json(("latest", tuple(symbols)),
+                                  lambda conn: query_latest(conn, symbols))
+            elif parsed.path == "/range":
+                self._range(params)
+            elif parsed.path == "/bars":
+                symbol = _param(params, "symbol")
+                start, end = self._window(params)
+                resolution = _param(params, "resolution", "1")
+                self._cached_json(("bars", symbol, start, end, resolution),
+                                  lambda conn: query_bars(conn, symbol, start, end, resolution))
+            elif parsed.path == "/highlow":
+                symbol = _param(params, "symbol")
+                period = _param(params, "period", "custom")
+                if period in ("week", "month"):
+                    start, end = trading_calendar.get_calendar().period_bounds(period)
+                else:
+                    start, end = self._window(params)
+                self._cached_json(("highlow", symbol, start, end),
+                                  lambda conn: query_highlow(conn, symbol, start, end))
+            elif parsed.path == "/stats":
+                self._send(200, json.dumps(self.server.stats()).encode(), "application/json")
+            else:
+                self._send(404, b'{"error": "not found"}', "application/json")
+        except QueryError as e:
+            self._send(400, json.dumps({"error": str(e)}).encode(), "application/json")
+        except queue.Empty:
+            self._send(503, b'{"error": "all read connections busy"}', "application/json")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            print(f"[QueryServer] {parsed.path} failed: {e!r}")
+            if self._streaming:
+                # Headers and part of the body are out; drop the connection so the client sees a truncated stream
+                self.close_connection = True
+            else:
+                self._send(500, json.dumps({"error": f"{type(e).__name__}: {e}"}).encode(), "application/json")
+
+    def _window(self, params) -> Tuple[int, int]:
+        end = _param(params, "end", int(time.time()), int)
+        start = _param(params, "start", end - trading_calendar.SECONDS_PER_DAY, int)
+        if start > end:
+            raise QueryError("start must not be after end")
+        return start, end
+
+    def _cached_json(self, key, compute):
+        server = self.server
+        watermark = server.watermark.current()
+        cached = server.cache.get(key, watermark)
+        if cached is not None:
+            self._send(200, b"".join(cached[1]), cached[0], cache="hit")
+            return
+        with server.pool.connection() as conn:
+            body = json.dumps(compute(conn)).encode()
+        server.cache.put(key, watermark, "application/json", [body])
+        self._send(200, body, "application/json", cache="miss")
+
+    def _range(self, params):
+        """Ticks as NDJSON (one JSON array per tick, after a header line naming the fields), sent chunked."""
+        server = self.server
+        symbol = _param(params, "symbol")
+        start, end = self._window(params)
+        fields = [f for f in _param(params, "fields", ",".join(db.TICK_FIELDS[1:])).split(",") if f]
+        unknown = [f for f in fields if f not in db.TICK_FIELDS]
+        if unknown:
+            raise QueryError(f"unknown fields: {','.join(unknown)}")
+        key = ("range", symbol, start, end, tuple(fields))
+        sealed = end < trading_calendar.ist_day_start(time.time())
+        watermark = server.watermark.current()
+        cached = server.cache.get(key, watermark)
+        if cached is not None:
+            self._send_chunked(cached[1], "application/x-ndjson", cache="hit")
+            return
+        header = (json.dumps({"symbol": symbol, "fields": fields}) + "\n").encode()
+        with server.pool.connection() as conn:
+            kept = [header]
+            rows_seen = 0
+
+            batches = query_range(conn, symbol, start, end, fields)
+            # Run the query before the 200 goes out, so SQL errors still get a proper error response
+            first = next(batches, None)
+
+            def chunks():
+                nonlocal kept, rows_seen
+                yield header
+                for rows in itertools.chain([first] if first else [], batches):
+                    chunk = "".join(json.dumps(list(r)) + "\n" for r in rows).encode()
+                    rows_seen += len(rows)
+                    if kept is not None:
+                        if rows_seen > MAX_CACHED_ROWS:
+                            kept = None
+                        else:
+                            kept.append(chunk)
+                    yield chunk
+                # Cache before _send_chunked writes the terminating chunk, so a client that
+                # re-requests as soon as this response ends already gets a hit
+                if kept is not None:
+                    server.cache.put(key, None if sealed else watermark, "application/x-ndjson", kept)
+
+            self._send_chunked(chunks(), "application/x-ndjson", cache="miss")
+
+    def _send(self, code, body: bytes, content_type, cache=None):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if cache:
+            self.send_header("X-Cache", cache)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunked(self, chunks: Iterable[bytes], content_type, cache=None):
+        self._streaming = True
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        if cache:
+            self.send_header("X-Cache", cache)
+        self.end_headers()
+        for chunk in chunks:
+            if chunk:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        return
+
+
+class QueryHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, server_address, db_path: str = db.DB_PATH, pool_size: int = 4,
+                 watermark_interval: float = 1.0, cache_entries: int = 512):
+        super().__init__(server_address, QueryRequestHandler)
+        self.pool = ReadConnectionPool(db_path, pool_size)
+        self.watermark = Watermark(db_path, watermark_interval)
+        self.cache = ResultCache(cache_entries)
+
+    def stats(self) -> dict:
+        return {"cache": self.cache.stats(), "watermark": self.watermark.current(), "pool_size": self.pool.size}
+
+    def server_close(self):
+        super().server_close()
+        self.pool.close()
+        self.watermark.close()
+
+
+def start_query_server(port: int = QUERY_PORT, db_path: str = db.DB_PATH, host: str = "127.0.0.1", **kwargs):
+    server = QueryHTTPServer((host, port), db_path, **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f"[QueryServer] Serving {db_path} read-only on http://{host}:{server.server_address[1]}/")
+    return server, thread
+
+
+def stop_query_server(server, thread):
+    if server:
+        server.shutdown()
+        server.server_close()
+    if thread:
+        thread.join(timeout=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read-only query server over the tick database.")
+    parser.add_argument("--db", default=db.DB_PATH)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=QUERY_PORT)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--watermark-interval", type=float, default=1.0)
+    args = parser.parse_args()
+    server = QueryHTTPServer((args.host, args.port), args.db, pool_size=args.pool_size,
+                             watermark_interval=args.watermark_interval)
+    print(f"[QueryServer] Serving {args.db} read-only on http://{args.host}:{server.server_address[1]}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket: `rate` tokens per second, bursts of up to `burst`.
+    acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens: float = 1.0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+
+class AsyncRateLimiter:
+    """
+    asyncio token bucket with the same semantics as RateLimiter, for use inside
+    a single event loop. await acquire() sleeps until a token is available.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        import asyncio
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    async def acquire(self, tokens: float = 1.0):
+        import asyncio
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            while True:
+                self._refill(time.monotonic())
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
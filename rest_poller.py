@@ -0,0 +1,380 @@
+"""
+REST quote polling for symbols that are not streamed over the WebSocket.
+
+RestPoller runs an asyncio loop on its own thread and polls the Fyers quotes
+endpoint for symbols_rest.txt over one pooled aiohttp session. Symbols are
+split into 50-symbol chunks, each polled on its own jittered schedule, with a
+concurrency cap and a shared token bucket keeping the request rate under the
+API limit. New quotes are fed to the same ingest path as TickCollector:
+TickDBWorker, TickRingBuffers and LatestTickStore.
+
+    python rest_poller.py --mock --symbols 2000 --seconds 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import urllib.parse
+from collections import deque
+from typing import Dict, List, Optional
+
+import latency
+import metrics
+from rate_limit import AsyncRateLimiter
+
+REST_SYMBOLS_FILE = "symbols_rest.txt"
+QUOTES_URL = "https://api-t1.fyers.in/data/quotes"
+CHUNK_SIZE = 50  # symbols per quotes request
+REQUEST_TIMES_KEPT = 10000  # request start times kept for max_requests_per_window
+
+
+def quote_to_tick(symbol: str, v: dict, received_time: int) -> dict:
+    """Map a quotes 'v' payload onto the tick fields stored by TickDBWorker."""
+    return {
+        "symbol": symbol,
+        "exch_feed_time": int(v.get("tt") or received_time),
+        "ltp": v.get("lp"),
+        "vol_traded_today": v.get("volume"),
+        "last_traded_time": int(v.get("tt") or received_time),
+        "bid_size": None,
+        "ask_size": None,
+        "bid_price": v.get("bid"),
+        "ask_price": v.get("ask"),
+        "tot_buy_qty": None,
+        "tot_sell_qty": None,
+        "avg_trade_price": v.get("atp"),
+        "lower_ckt": v.get("lower_ckt"),
+        "upper_ckt": v.get("upper_ckt"),
+        "received_time": received_time,
+    }
+
+
+class RestPoller(threading.Thread):
+    """
+    Polls quotes for `symbols` every `interval` seconds (+/- `jitter` fraction).
+
+    Chunks start at random offsets across the first interval so requests are
+    spread out rather than fired in bursts. Only quotes whose (tt, lp, volume)
+    changed since the last poll are ingested.
+    """
+
+    def __init__(self, symbols: List[str], auth_header: str, db_worker=None, tick_buffers=None, latest_ticks=None,
+                 circuit_bands=None, indicators=None,
+                 url: str = QUOTES_URL, interval: float = 5.0, jitter: float = 0.2, chunk_size: int = CHUNK_SIZE,
+                 max_concurrency: int = 4, requests_per_second: float = 8.0, burst: int = 2, timeout: float = 10.0):
+        super().__init__(daemon=True)
+        self.symbols = list(dict.fromkeys(symbols))
+        self.auth_header = auth_header
+        self.db_worker = db_worker
+        self.tick_buffers = tick_buffers
+        self.latest_ticks = latest_ticks
+        self.circuit_bands = circuit_bands
+        self.indicators = indicators
+        self.url = url
+        self.interval = interval
+        self.jitter = jitter
+        self.chunk_size = chunk_size
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.timeout = timeout
+        self._last_seen: Dict[str, tuple] = {}
+        self._loop = None
+        self._stop_event = None
+        self._stop_requested = threading.Event()
+        self.stopped = threading.Event()
+        # Stats
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.tick_count = 0
+        self.put_errors = 0
+        self.request_latencies = latency.LogHistogram()
+        self.request_times = deque(maxlen=REQUEST_TIMES_KEPT)  # start times for max_requests_per_window
+        self._ticks_metric = metrics.TICKS_RECEIVED.labels("rest")
+
+    def chunks(self) -> List[List[str]]:
+        return [self.symbols[i:i + self.chunk_size] for i in range(0, len(self.symbols), self.chunk_size)]
+
+    def _ingest(self, quotes: list):
+        wall_now = time.time()
+        now = int(wall_now)
+        tracker = latency.TRACKER if latency.TRACKER.enabled else None
+        for item in quotes:
+            v = item.get("v")
+            if item.get("s") != "ok" or not isinstance(v, dict):
+                continue
+            symbol = item.get("n") or v.get("symbol")
+            key = (v.get("tt"), v.get("lp"), v.get("volume"))
+            if self._last_seen.get(symbol) == key:
+                continue
+            self._last_seen[symbol] = key
+            tick = quote_to_tick(symbol, v, now)
+            if tracker:
+                tracker.received(tick, wall_now, time.monotonic())
+            if self.db_worker is not None:
+                if tracker:
+                    tracker.enqueued(tick)
+                try:
+                    self.db_worker.put(tick)
+                except Exception as e:
+                    self.put_errors += 1
+                    if self.put_errors == 1 or self.put_errors % 1000 == 0:
+                        print(f"[RestPoller] Failed to persist tick: {e} ({self.put_errors} ticks not persisted)")
+            if self.tick_buffers is not None:
+                self.tick_buffers.append_tick(tick)
+            if self.latest_ticks is not None:
+                self.latest_ticks.update(tick, v.get("prev_close_price"))
+            if self.circuit_bands is not None:
+                self.circuit_bands.update_from_tick(tick)
+            if self.indicators is not None:
+                self.indicators.update_tick(tick)
+            self.tick_count += 1
+            self._ticks_metric.inc()
+
+    async def _fetch(self, session, chunk: List[str], semaphore, limiter):
+        async with semaphore:
+            await limiter.acquire()
+            self.requests += 1
+            started = time.perf_counter()
+            self.request_times.append(time.monotonic())
+            try:
+                async with session.get(self.url, params={"symbols": ",".join(chunk)}) as response:
+                    if response.status == 429:
+                        self.throttled += 1
+                        return
+                    payload = await response.json(content_type=None)
+            except Exception as e:
+                self.errors += 1
+                print(f"[RestPoller] Request failed: {e}")
+                return
+            finally:
+                self.request_latencies.record(time.perf_counter() - started)
+        if payload.get("s") != "ok":
+            self.errors += 1
+            print(f"[RestPoller] Quotes error: {payload.get('message')}")
+            return
+        self._ingest(payload.get("d", []))
+
+    async def _poll_chunk(self, session, chunk: List[str], semaphore, limiter):
+        delay = random.uniform(0, self.interval)
+        while True:
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=delay)
+                return
+            except asyncio.TimeoutError:
+                pass
+            started = time.monotonic()
+            await self._fetch(session, chunk, semaphore, limiter)
+            period = self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+            delay = max(0.0, period - (time.monotonic() - started))
+
+    async def _main(self):
+        import aiohttp
+        self._stop_event = asyncio.Event()
+        if self._stop_requested.is_set():
+            return
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        limiter = AsyncRateLimiter(self.requests_per_second, self.burst)
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+        headers = {"Authorization": self.auth_header}
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, headers=headers, timeout=timeout) as session:
+            await asyncio.gather(*(self._poll_chunk(session, chunk, semaphore, limiter) for chunk in self.chunks()))
+
+    def run(self):
+        print(f"[RestPoller] Polling {len(self.symbols)} symbols in {len(self.chunks())} chunks every {self.interval}s")
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._main())
+        finally:
+            self._loop.close()
+            self.stopped.set()
+            print(f"[RestPoller] Stopped after {self.requests} requests, {self.tick_count} ticks.")
+
+    def stop(self, timeout: float = 10.0):
+        self._stop_requested.set()
+        if self._loop is not None and self._stop_event is not None and not self.stopped.is_set():
+            try:
+                self._loop.call_soon_threadsafe(self._stop_event.set)
+            except RuntimeError:
+                pass  # Loop already closed
+        if self.is_alive():
+            self.join(timeout)
+
+    def max_requests_per_window(self, window: float = 1.0) -> int:
+        """Most requests started inside any `window`-second span (over the last REQUEST_TIMES_KEPT requests)."""
+        times = sorted(self.request_times)
+        best, lo = 0, 0
+        for hi, t in enumerate(times):
+            while t - times[lo] >= window:
+                lo += 1
+            best = max(best, hi - lo + 1)
+        return best
+
+
+def load_rest_symbols(path=REST_SYMBOLS_FILE) -> List[str]:
+    if not os.path.exists(path):
+        return []
+    from ws_collector import load_symbols
+    return load_symbols(path)
+
+
+def start_rest_poller(db_worker, tick_buffers=None, latest_ticks=None, path=REST_SYMBOLS_FILE, **kwargs) -> Optional[RestPoller]:
+    """Start a RestPoller for symbols_rest.txt with the current tokens, or return None if there is nothing to poll."""
+    from config import config
+    symbols = load_rest_symbols(path)
+    if not symbols:
+        return None
+    config.ensure_tokens_loaded()
+    access_token, _ = config.get_tokens()
+    if not config.CLIENT_ID or not access_token:
+        print("[RestPoller] Missing CLIENT_ID or access_token; not polling.")
+        return None
+    poller = RestPoller(symbols, f"{config.CLIENT_ID}:{access_token}", db_worker,
+                        tick_buffers=tick_buffers, latest_ticks=latest_ticks, **kwargs)
+    poller.start()
+    return poller
+
+
+# --- Local mock server ---
+
+class MockQuotesServer:
+    """
+    Stdlib HTTP server imitating the quotes endpoint. Returns 429 when more than
+    `rate_limit` requests arrive within one second, so a run shows whether the
+    poller stayed under the limit.
+    """
+
+    def __init__(self, rate_limit: int = 10, latency: float = 0.02, port: int = 0):
+        import http.server
+        self.rate_limit = rate_limit
+        self.latency = latency
+        self.requests = 0
+        self.rejected = 0
+        self._recent: List[float] = []
+        self._lock = threading.Lock()
+        mock = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                now = time.monotonic()
+                with mock._lock:
+                    mock.requests += 1
+                    mock._recent = [t for t in mock._recent if now - t < 1.0]
+                    over = len(mock._recent) >= mock.rate_limit
+                    mock._recent.append(now)
+                    if over:
+                        mock.rejected += 1
+                if over:
+                    body = json.dumps({"s": "error", "code": 429, "message": "request limit reached"}).encode()
+                    self.send_response(429)
+                else:
+                    time.sleep(mock.latency)
+                    query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                    symbols = query.get("symbols", [""])[0].split(",")
+                    tt = int(time.time())
+                    quotes = [{"n": s, "s": "ok", "v": {
+                        "symbol": s, "tt": tt, "lp": round(100 + random.random(), 2), "volume": tt,
+                        "bid": 100.0, "ask": 100.1, "prev_close_price": 99.5,
+                    }} for s in symbols if s]
+                    body = json.dumps({"s": "ok", "code": 200, "d": quotes}).encode()
+                    self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                return
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/data/quotes"
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join(timeout=2)
+
+
+def run_mock(symbols: int, seconds: float, interval: float, rate: float, burst: int, concurrency: int, rate_limit: int):
+    import tempfile
+    from db import TickDBWorker, init_db
+    from latest_ticks import LatestTickStore
+
+    server = MockQuotesServer(rate_limit=rate_limit)
+    server.start()
+    db_path = os.path.join(tempfile.mkdtemp(), "rest_poller_mock.db")
+    init_db(db_path)
+    db_worker = TickDBWorker(db_path=db_path, batch_size=500, label="rest")
+    db_worker.start()
+    latest = LatestTickStore()
+    poller = RestPoller([f"NSE:MOCK{i}-EQ" for i in range(symbols)], "mock:token", db_worker, latest_ticks=latest,
+                        url=server.url, interval=interval, max_concurrency=concurrency,
+                        requests_per_second=rate, burst=burst)
+    started = time.perf_counter()
+    poller.start()
+    time.sleep(seconds)
+    poller.stop()
+    elapsed = time.perf_counter() - started
+    db_worker.stop()
+    server.stop()
+
+    print(f"[Mock] {poller.requests} requests, {poller.tick_count} ticks in {elapsed:.1f}s "
+          f"({poller.requests / elapsed:.1f} req/s, {poller.tick_count / elapsed:.0f} quotes/s)")
+    print(f"[Mock] Latency p50 {poller.request_latencies.percentile(50) * 1000:.1f}ms, "
+          f"p99 {poller.request_latencies.percentile(99) * 1000:.1f}ms")
+    print(f"[Mock] Client limit {rate}/s burst {burst}; max requests in any 1s window: "
+          f"{poller.max_requests_per_window()} (server limit {rate_limit})")
+    print(f"[Mock] Server rejected {server.rejected} requests (429), client errors {poller.errors}; "
+          f"{len(latest)} symbols in latest-tick store")
+    return server.rejected == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Poll quotes over REST for symbols not on the WebSocket.")
+    parser.add_argument("--mock", action="store_true", help="Run against a local mock quotes server")
+    parser.add_argument("--symbols", type=int, default=2000, help="Mock symbol count")
+    parser.add_argument("--seconds", type=float, default=20.0, help="Mock run length")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between polls of each chunk")
+    parser.add_argument("--rate", type=float, default=8.0, help="Requests per second")
+    parser.add_argument("--burst", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--server-limit", type=int, default=10, help="Mock server requests per second")
+    args = parser.parse_args()
+
+    if args.mock:
+        ok = run_mock(args.symbols, args.seconds, args.interval, args.rate, args.burst, args.concurrency, args.server_limit)
+        raise SystemExit(0 if ok else 1)
+
+    from db import DB_PATH, TickDBWorker, init_db
+    init_db(DB_PATH)
+    db_worker = TickDBWorker(db_path=DB_PATH, batch_size=50, label="rest")
+    db_worker.start()
+    poller = start_rest_poller(db_worker, interval=args.interval, max_concurrency=args.concurrency,
+                               requests_per_second=args.rate, burst=args.burst)
+    if poller is None:
+        print(f"Nothing to poll: {REST_SYMBOLS_FILE} missing or empty, or no token.")
+    else:
+        try:
+            poller.stopped.wait()
+        except KeyboardInterrupt:
+            poller.stop()
+    db_worker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,17 +4,20 @@ import db
 import analytics
 from typing import Dict, Any, Callable
 from datetime import datetime, date
-import csv
-import os
-from zoneinfo import ZoneInfo
+from collections import deque
 import event_log
+import latency
+import metrics
+import profiling
+import trading_calendar
+from circuit_bands import CIRCUIT_FILE, CircuitBandStore
 
 class Screener(threading.Thread):
-    CIRCUIT_RELOAD_INTERVAL = 600  # seconds
     PERIODIC_HIGHLOW_REFRESH = 300  # seconds
 
     WEEK_MIN_DAYS = 4
     MONTH_MIN_DAYS = 18
+    YEAR_MIN_DAYS = 200  # completed days of indicator history before 52-week alerts fire
 
     SESSION_START = "09:14:58"
     SESSION_END = "15:30:05"
@@ -25,9 +28,15 @@ class Screener(threading.Thread):
         notice_callback: Callable[[dict], None],
         proximity_threshold_percent=1.0,
         poll_interval=2.0,
-        circuit_file="daily_circuits.csv",
+        circuit_file=CIRCUIT_FILE,
+        circuit_file_override=False,
         session_start=SESSION_START,
-        session_end=SESSION_END
+        session_end=SESSION_END,
+        clock: Callable[[], float] = time.time,
+        event_sink: Callable[[dict], None] = event_log.log_event,
+        tick_buffers=None,
+        circuit_bands=None,
+        indicators=None
     ):
         super().__init__(daemon=True)
         self.db_path = db_path
@@ -36,10 +45,19 @@ class Screener(threading.Thread):
         self.poll_interval = poll_interval
         self.prev_ltp: Dict[str, float] = {}
         self.last_alert: Dict[str, str] = {}
+        self.clock = clock
+        self.event_sink = event_sink
+        self.tick_buffers = tick_buffers  # Optional TickRingBuffers fed by an in-process collector
+        # Bands come from the tick stream (shared with an in-process collector); the CSV is an optional seed/override
+        self.circuits: Dict[str, Dict[str, float]] = {}
+        self.circuit_bands = circuit_bands if circuit_bands is not None else CircuitBandStore()
+        self.circuit_bands.add_listener(self.on_circuit_change)
+        for symbol, (lower, upper) in self.circuit_bands.snapshot().items():
+            self.on_circuit_change(symbol, lower, upper)
         self.circuit_file = circuit_file
-        self.circuits = self.load_circuit_file(circuit_file)
-        self._last_circuit_reload = time.time()
-        self._last_circuit_mtime = self.get_circuit_file_mtime()
+        self.indicators = indicators  # Optional indicators.IndicatorEngine for 52-week and other rolling levels
+        if circuit_file:
+            self.circuit_bands.load_csv(circuit_file, override=circuit_file_override)
         self.weekly_high_low: Dict[str, Any] = {}
         self.monthly_high_low: Dict[str, Any] = {}
         self._last_highlow_refresh = 0
@@ -47,48 +65,70 @@ class Screener(threading.Thread):
         self.session_start = session_start
         self.session_end = session_end
         self._last_alert_reset_date = None
+        self._symbol_changes = deque()  # (added, removed) from update_symbols(), applied by the run loop
+
+    def update_symbols(self, added, removed):
+        """Queue a universe change; applied at the start of the next screening cycle."""
+        self._symbol_changes.append((list(added), list(removed)))
+
+    def apply_symbol_changes(self):
+        """Drop state for removed symbols and load period high/lows for added ones, without a full reset."""
+        while self._symbol_changes:
+            added, removed = self._symbol_changes.popleft()
+            for symbol in removed:
+                self.prev_ltp.pop(symbol, None)
+                self.last_alert.pop(symbol, None)
+                self.highlow_alert_flags.pop(symbol, None)
+                self.weekly_high_low.pop(symbol, None)
+                self.monthly_high_low.pop(symbol, None)
+            for symbol in added:
+                if symbol in self.weekly_high_low:
+                    continue
+                try:
+                    weekly = analytics.get_weekly_high_low_with_days(symbol, self.db_path)
+                    monthly = analytics.get_monthly_high_low_with_days(symbol, self.db_path)
+                except Exception as e:
+                    print(f"[Screener] Failed to load high/lows for {symbol}:", e)
+                    continue
+                if weekly and weekly[2]:
+                    self.weekly_high_low[symbol] = weekly
+                if monthly and monthly[2]:
+                    self.monthly_high_low[symbol] = monthly
+            if added or removed:
+                print(f"[Screener] Symbols updated: +{len(added)} -{len(removed)}")
 
     def is_market_open(self):
-        TZ = ZoneInfo("Asia/Kolkata")
-        now = datetime.now(TZ).time()
-        start = datetime.strptime(self.session_start, "%H:%M:%S").time()
-        end = datetime.strptime(self.session_end, "%H:%M:%S").time()
-        return start <= now <= end
+        now = self.clock()
+        return trading_calendar.get_calendar(now, self.session_start, self.session_end).is_open(now)
 
-    def get_circuit_file_mtime(self):
-        try:
-            return os.path.getmtime(self.circuit_file)
-        except Exception:
-            return None
+    def on_circuit_change(self, symbol, lower, upper):
+        """CircuitBandStore listener: use the new band from the next cycle and let its alerts fire again."""
+        previous = self.circuits.get(symbol)
+        self.circuits[symbol] = {"upper": upper, "lower": lower}
+        if previous is not None:
+            self.last_alert.pop(symbol, None)
 
-    def load_circuit_file(self, path) -> Dict[str, Dict[str, float]]:
-        circuits = {}
-        try:
-            with open(path, newline='') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    symbol = row["symbol"].strip()
-                    try:
-                        upper = float(row["upper_ckt"].replace(",", ""))
-                        lower = float(row["lower_ckt"].replace(",", ""))
-                        circuits[symbol] = {"upper": upper, "lower": lower}
-                    except Exception:
-                        continue
-        except Exception as e:
-            print(f"[Screener] Failed to load circuit file: {e}")
-        return circuits
+    ALERT_FLAG_KEYS = (
+        "WEEKLY_HIGH_NEAR",
+        "WEEKLY_HIGH_CROSSED",
+        "WEEKLY_LOW_NEAR",
+        "WEEKLY_LOW_CROSSED",
+        "MONTHLY_HIGH_NEAR",
+        "MONTHLY_HIGH_CROSSED",
+        "MONTHLY_LOW_NEAR",
+        "MONTHLY_LOW_CROSSED",
+        "YEARLY_HIGH_NEAR",
+        "YEARLY_HIGH_CROSSED",
+        "YEARLY_LOW_NEAR",
+        "YEARLY_LOW_CROSSED",
+    )
 
-    def maybe_reload_circuits(self):
-        now = time.time()
-        if now - self._last_circuit_reload >= self.CIRCUIT_RELOAD_INTERVAL:
-            current_mtime = self.get_circuit_file_mtime()
-            if current_mtime != self._last_circuit_mtime:
-                print("[Screener] Detected change in daily_circuits.csv, reloading circuit bands.")
-                new_circuits = self.load_circuit_file(self.circuit_file)
-                if new_circuits:
-                    self.circuits = new_circuits
-                    self._last_circuit_mtime = current_mtime
-            self._last_circuit_reload = now
+    def _get_alert_flags(self, symbol) -> Dict[str, bool]:
+        flags = self.highlow_alert_flags.get(symbol)
+        if flags is None:
+            flags = dict.fromkeys(self.ALERT_FLAG_KEYS, False)
+            self.highlow_alert_flags[symbol] = flags
+        return flags
 
     def reset_all_alert_flags(self):
         # Called at the start of each new trading session (date)
@@ -98,27 +138,19 @@ class Screener(threading.Thread):
 
     def _reset_alert_flags_if_period_changed(self, symbol, old_period_highlow, new_period_highlow, period_prefix):
         if old_period_highlow != new_period_highlow:
-            flags = self.highlow_alert_flags.setdefault(symbol, {
-                "WEEKLY_HIGH_NEAR": False,
-                "WEEKLY_HIGH_CROSSED": False,
-                "WEEKLY_LOW_NEAR": False,
-                "WEEKLY_LOW_CROSSED": False,
-                "MONTHLY_HIGH_NEAR": False,
-                "MONTHLY_HIGH_CROSSED": False,
-                "MONTHLY_LOW_NEAR": False,
-                "MONTHLY_LOW_CROSSED": False,
-            })
+            flags = self._get_alert_flags(symbol)
             for key in flags:
                 if key.startswith(period_prefix):
                     flags[key] = False
 
     def refresh_high_lows(self):
+        started = time.perf_counter()
         try:
             old_weekly = self.weekly_high_low.copy()
             old_monthly = self.monthly_high_low.copy()
             self.weekly_high_low = analytics.get_all_symbols_weekly_high_low_with_days(self.db_path)
             self.monthly_high_low = analytics.get_all_symbols_monthly_high_low_with_days(self.db_path)
-            self._last_highlow_refresh = time.time()
+            self._last_highlow_refresh = self.clock()
             # Also reset period-specific flags if period boundary crossed
             for symbol, new_highlow in self.weekly_high_low.items():
                 old_highlow = old_weekly.get(symbol)
@@ -128,14 +160,15 @@ class Screener(threading.Thread):
                 self._reset_alert_flags_if_period_changed(symbol, old_highlow, new_highlow, "MONTHLY_")
         except Exception as e:
             print("[Screener] Failed to refresh weekly/monthly high/lows:", e)
+        metrics.SCREENER_REFRESH_SECONDS.observe(time.perf_counter() - started)
 
     def run(self):
         self.refresh_high_lows()
         self._last_alert_reset_date = None
         while True:
+            profiling.checkpoint("Screener.run")
             # Reset alert flags at the start of every new date (trading session)
-            tz = ZoneInfo("Asia/Kolkata")
-            today = datetime.now(tz).date()
+            today = trading_calendar.ist_day_number(self.clock())
             if today != self._last_alert_reset_date:
                 self.reset_all_alert_flags()
                 self._last_alert_reset_date = today
@@ -144,31 +177,52 @@ class Screener(threading.Thread):
                 time.sleep(30)
                 continue
             try:
-                self.maybe_reload_circuits()
-                now = time.time()
+                self.apply_symbol_changes()
+                now = self.clock()
                 if now - self._last_highlow_refresh >= self.PERIODIC_HIGHLOW_REFRESH:
                     self.refresh_high_lows()
-                latest_ticks = db.get_latest_ticks(self.db_path)
-                for symbol, tick in latest_ticks.items():
-                    ltp = tick.get("ltp")
-                    circuit = self.circuits.get(symbol)
-                    if ltp is not None and circuit:
-                        upper_ckt = circuit["upper"]
-                        lower_ckt = circuit["lower"]
-                        if upper_ckt != 0 and lower_ckt != 0:
-                            prev_ltp = self.prev_ltp.get(symbol, ltp)
-                            event_type = self.detect_event(symbol, ltp, prev_ltp, upper_ckt, lower_ckt)
-                            if event_type and self.last_alert.get(symbol) != event_type:
-                                self.last_alert[symbol] = event_type
-                                event = self._make_event_dict(symbol, event_type, ltp, upper_ckt, lower_ckt, "circuit")
-                                event_log.log_event(event)
-                                self.notice_callback(event)
-                            self.prev_ltp[symbol] = ltp
-                    self.check_highlow_alert(symbol, ltp)
+                started = time.perf_counter()
+                latest_ticks = self.get_latest_ticks()
+                self.screen_ticks(latest_ticks)
+                metrics.SCREENER_CYCLE_SECONDS.observe(time.perf_counter() - started)
+                metrics.SCREENER_SYMBOLS.set(len(latest_ticks))
             except Exception as e:
                 print("[Screener Error]", e)
             time.sleep(self.poll_interval)
 
+    def get_latest_ticks(self) -> Dict[str, dict]:
+        # Prefer the in-memory buffers when the collector runs in this process
+        if self.tick_buffers is not None and len(self.tick_buffers):
+            return self.tick_buffers.latest_ticks()
+        return db.get_latest_ticks(self.db_path)
+
+    def screen_ticks(self, latest_ticks: Dict[str, dict]):
+        """Run one screening pass over the latest tick per symbol."""
+        tracker = latency.TRACKER if latency.TRACKER.enabled else None
+        pass_started = time.monotonic()
+        for symbol, tick in latest_ticks.items():
+            if tracker:
+                tracker.screened(symbol, pass_started)
+            ltp = tick.get("ltp")
+            if "upper_ckt" in tick:
+                # Rows read from the DB carry the band; in-process collectors feed the store directly
+                self.circuit_bands.update(symbol, tick["lower_ckt"], tick["upper_ckt"])
+            circuit = self.circuits.get(symbol)
+            if ltp is not None and circuit:
+                upper_ckt = circuit["upper"]
+                lower_ckt = circuit["lower"]
+                if upper_ckt != 0 and lower_ckt != 0:
+                    prev_ltp = self.prev_ltp.get(symbol, ltp)
+                    event_type = self.detect_event(symbol, ltp, prev_ltp, upper_ckt, lower_ckt)
+                    if event_type and self.last_alert.get(symbol) != event_type:
+                        self.last_alert[symbol] = event_type
+                        event = self._make_event_dict(symbol, event_type, ltp, upper_ckt, lower_ckt, "circuit")
+                        self._emit(event)
+                    self.prev_ltp[symbol] = ltp
+            self.check_highlow_alert(symbol, ltp)
+            if self.indicators is not None:
+                self.check_indicator_alert(symbol, ltp)
+
     def detect_event(self, symbol, ltp, prev_ltp, upper_ckt, lower_ckt):
         proximity = self.threshold / 100.0
         upper_threshold = upper_ckt * (1 - proximity)
@@ -190,133 +244,86 @@ class Screener(threading.Thread):
     def check_highlow_alert(self, symbol, ltp):
         if ltp is None:
             return
-        flags = self.highlow_alert_flags.setdefault(symbol, {
-            "WEEKLY_HIGH_NEAR": False,
-            "WEEKLY_HIGH_CROSSED": False,
-            "WEEKLY_LOW_NEAR": False,
-            "WEEKLY_LOW_CROSSED": False,
-            "MONTHLY_HIGH_NEAR": False,
-            "MONTHLY_HIGH_CROSSED": False,
-            "MONTHLY_LOW_NEAR": False,
-            "MONTHLY_LOW_CROSSED": False,
-        })
+        flags = self._get_alert_flags(symbol)
         week_high, week_low, week_days = self.weekly_high_low.get(symbol, (None, None, 0))
         month_high, month_low, month_days = self.monthly_high_low.get(symbol, (None, None, 0))
         proximity = self.threshold / 100.0
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
         # Weekly high/low events
         if week_days >= self.WEEK_MIN_DAYS and week_high is not None and week_low is not None:
             if abs(ltp - week_high) / week_high <= proximity and not flags["WEEKLY_HIGH_NEAR"]:
                 flags["WEEKLY_HIGH_NEAR"] = True
-                event = {
-                    "timestamp": now,
-                    "symbol": symbol,
-                    "event_type": "VERY CLOSE TO WEEKLY HIGH",
-                    "ltp": ltp,
-                    "high": week_high,
-                    "low": week_low,
-                    "period": "week"
-                }
-                event_log.log_event(event)
-                self.notice_callback(event)
+                event = self._make_event_dict(symbol, "VERY CLOSE TO WEEKLY HIGH", ltp, week_high, week_low, "week")
+                self._emit(event)
             elif ltp > week_high and not flags["WEEKLY_HIGH_CROSSED"]:
                 flags["WEEKLY_HIGH_CROSSED"] = True
-                event = {
-                    "timestamp": now,
-                    "symbol": symbol,
-                    "event_type": "CROSSED WEEKLY HIGH",
-                    "ltp": ltp,
-                    "high": week_high,
-                    "low": week_low,
-                    "period": "week"
-                }
-                event_log.log_event(event)
-                self.notice_callback(event)
+                event = self._make_event_dict(symbol, "CROSSED WEEKLY HIGH", ltp, week_high, week_low, "week")
+                self._emit(event)
             elif abs(ltp - week_low) / week_low <= proximity and not flags["WEEKLY_LOW_NEAR"]:
                 flags["WEEKLY_LOW_NEAR"] = True
-                event = {
-                    "timestamp": now,
-                    "symbol": symbol,
-                    "event_type": "VERY CLOSE TO WEEKLY LOW",
-                    "ltp": ltp,
-                    "high": week_high,
-                    "low": week_low,
-                    "period": "week"
-                }
-                event_log.log_event(event)
-                self.notice_callback(event)
+                event = self._make_event_dict(symbol, "VERY CLOSE TO WEEKLY LOW", ltp, week_high, week_low, "week")
+                self._emit(event)
             elif ltp < week_low and not flags["WEEKLY_LOW_CROSSED"]:
                 flags["WEEKLY_LOW_CROSSED"] = True
-                event = {
-                    "timestamp": now,
-                    "symbol": symbol,
-                    "event_type": "CROSSED WEEKLY LOW",
-                    "ltp": ltp,
-                    "high": week_high,
-                    "low": week_low,
-                    "period": "week"
-                }
-                event_log.log_event(event)
-                self.notice_callback(event)
+                event = self._make_event_dict(symbol, "CROSSED WEEKLY LOW", ltp, week_high, week_low, "week")
+                self._emit(event)
 
         # Monthly high/low events
         if month_days >= self.MONTH_MIN_DAYS and month_high is not None and month_low is not None:
             if abs(ltp - month_high) / month_high <= proximity and not flags["MONTHLY_HIGH_NEAR"]:
                 flags["MONTHLY_HIGH_NEAR"] = True
-                event = {
-                    "timestamp": now,
-                    "symbol": symbol,
-                    "event_type": "VERY CLOSE TO MONTHLY HIGH",
-                    "ltp": ltp,
-                    "high": month_high,
-                    "low": month_low,
-                    "period": "month"
-                }
-                event_log.log_event(event)
-                self.notice_callback(event)
+                event = self._make_event_dict(symbol, "VERY CLOSE TO MONTHLY HIGH", ltp, month_high, month_low, "month")
+                self._emit(event)
             elif ltp > month_high and not flags["MONTHLY_HIGH_CROSSED"]:
                 flags["MONTHLY_HIGH_CROSSED"] = True
-                event = {
-                    "timestamp": now,
-                    "symbol": symbol,
-                    "event_type": "CROSSED MONTHLY HIGH",
-                    "ltp": ltp,
-                    "high": month_high,
-                    "low": month_low,
-                    "period": "month"
-                }
-                event_log.log_event(event)
-                self.notice_callback(event)
+                event = self._make_event_dict(symbol, "CROSSED MONTHLY HIGH", ltp, month_high, month_low, "month")
+                self._emit(event)
             elif abs(ltp - month_low) / month_low <= proximity and not flags["MONTHLY_LOW_NEAR"]:
                 flags["MONTHLY_LOW_NEAR"] = True
-                event = {
-                    "timestamp": now,
-                    "symbol": symbol,
-                    "event_type": "VERY CLOSE TO MONTHLY LOW",
-                    "ltp": ltp,
-                    "high": month_high,
-                    "low": month_low,
-                    "period": "month"
-                }
-                event_log.log_event(event)
-                self.notice_callback(event)
+                event = self._make_event_dict(symbol, "VERY CLOSE TO MONTHLY LOW", ltp, month_high, month_low, "month")
+                self._emit(event)
             elif ltp < month_low and not flags["MONTHLY_LOW_CROSSED"]:
                 flags["MONTHLY_LOW_CROSSED"] = True
-                event = {
-                    "timestamp": now,
-                    "symbol": symbol,
-                    "event_type": "CROSSED MONTHLY LOW",
-                    "ltp": ltp,
-                    "high": month_high,
-                    "low": month_low,
-                    "period": "month"
-                }
-                event_log.log_event(event)
-                self.notice_callback(event)
+                event = self._make_event_dict(symbol, "CROSSED MONTHLY LOW", ltp, month_high, month_low, "month")
+                self._emit(event)
+
+    def check_indicator_alert(self, symbol, ltp):
+        """52-week high/low events against the completed-day levels kept by the indicator engine."""
+        if ltp is None:
+            return
+        state = self.indicators.get(symbol)
+        if state is None or state.history_days < self.YEAR_MIN_DAYS:
+            return
+        year_high, year_low = state.year_high, state.year_low
+        if not year_high or not year_low:
+            return
+        flags = self._get_alert_flags(symbol)
+        proximity = self.threshold / 100.0
+        if ltp > year_high and not flags["YEARLY_HIGH_CROSSED"]:
+            flags["YEARLY_HIGH_CROSSED"] = flags["YEARLY_HIGH_NEAR"] = True
+            self._emit(self._make_event_dict(symbol, "CROSSED 52 WEEK HIGH", ltp, year_high, year_low, "year"))
+        elif abs(ltp - year_high) / year_high <= proximity and not flags["YEARLY_HIGH_NEAR"]:
+            flags["YEARLY_HIGH_NEAR"] = True
+            self._emit(self._make_event_dict(symbol, "VERY CLOSE TO 52 WEEK HIGH", ltp, year_high, year_low, "year"))
+        elif ltp < year_low and not flags["YEARLY_LOW_CROSSED"]:
+            flags["YEARLY_LOW_CROSSED"] = flags["YEARLY_LOW_NEAR"] = True
+            self._emit(self._make_event_dict(symbol, "CROSSED 52 WEEK LOW", ltp, year_high, year_low, "year"))
+        elif abs(ltp - year_low) / year_low <= proximity and not flags["YEARLY_LOW_NEAR"]:
+            flags["YEARLY_LOW_NEAR"] = True
+            self._emit(self._make_event_dict(symbol, "VERY CLOSE TO 52 WEEK LOW", ltp, year_high, year_low, "year"))
+
+    def _now_str(self):
+        return datetime.fromtimestamp(self.clock()).strftime("%Y-%m-%d %H:%M:%S")
+
+    def _emit(self, event):
+        metrics.EVENTS_EMITTED.labels(event.get("period")).inc()
+        if latency.TRACKER.enabled:
+            latency.TRACKER.alerted(event["symbol"])
+        self.event_sink(event)
+        self.notice_callback(event)
 
     def _make_event_dict(self, symbol, event_type, ltp, high, low, period):
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        now = self._now_str()
         return {
             "timestamp": now,
             "symbol": symbol,
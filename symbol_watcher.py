@@ -0,0 +1,44 @@
+import os
+import threading
+
+import ws_collector
+
+
+class SymbolFileWatcher(threading.Thread):
+    """
+    Polls symbols.txt and symbols_lite.txt for changes and applies them to a
+    running CollectorManager through reload_symbols(), so the universe can be
+    edited without restarting the collector.
+    """
+
+    def __init__(self, manager, interval=5.0):
+        super().__init__(daemon=True)
+        self.manager = manager
+        self.interval = interval
+        self.paths = {ws_collector.SYMBOLS_FILE: False, ws_collector.LITE_SYMBOLS_FILE: True}
+        self._mtimes = {path: self._mtime(path) for path in self.paths}
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            stat = os.stat(path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            for path, lite in self.paths.items():
+                mtime = self._mtime(path)
+                if mtime == self._mtimes.get(path):
+                    continue
+                self._mtimes[path] = mtime
+                print(f"[SymbolFileWatcher] {path} changed; applying symbol list.")
+                try:
+                    self.manager.reload_symbols(lite=lite)
+                except Exception as e:
+                    print(f"[SymbolFileWatcher] Failed to apply {path}:", e)
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,233 @@
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Bytes stored per tick slot: time (int64), ltp/bid/ask (float64), volume (int64)
+SLOT_BYTES = 5 * 8
+
+
+class TickRingBuffers:
+    """
+    Fixed-capacity ring buffers of recent ticks, one row per symbol.
+
+    All storage is preallocated as (max_symbols, capacity) NumPy arrays, so
+    appending a tick only writes scalars into existing slots. Each symbol keeps
+    its last `capacity` ticks; queries can additionally be limited to the last
+    `max_age_seconds` (or an explicit window) of feed time.
+
+    Memory is bounded by estimate_bytes(max_symbols, capacity), e.g. about
+    51 MB for 5000 symbols x 256 ticks.
+    """
+
+    def __init__(self, max_symbols: int = 5000, capacity: int = 256, max_age_seconds: Optional[int] = 900):
+        self.max_symbols = max_symbols
+        self.capacity = capacity
+        self.max_age_seconds = max_age_seconds
+        self.times = np.zeros((max_symbols, capacity), dtype=np.int64)
+        self.ltp = np.zeros((max_symbols, capacity), dtype=np.float64)
+        self.volume = np.zeros((max_symbols, capacity), dtype=np.int64)
+        self.bid = np.zeros((max_symbols, capacity), dtype=np.float64)
+        self.ask = np.zeros((max_symbols, capacity), dtype=np.float64)
+        self.head = np.zeros(max_symbols, dtype=np.int64)
+        self.count = np.zeros(max_symbols, dtype=np.int64)
+        self.last_time = 0
+        self._index: Dict[str, int] = {}
+        self._free_rows = []  # rows released by remove(), reused before growing
+        self._lock = threading.Lock()
+        self._overflow_warned = False
+
+    def reserve(self, max_symbols: int):
+        """Grow to at least max_symbols rows, keeping the stored ticks. Never shrinks."""
+        with self._lock:
+            if max_symbols <= self.max_symbols:
+                return
+            n = self.max_symbols
+            for name in ("times", "ltp", "volume", "bid", "ask"):
+                old = getattr(self, name)
+                grown = np.zeros((max_symbols, self.capacity), dtype=old.dtype)
+                grown[:n] = old
+                setattr(self, name, grown)
+            for name in ("head", "count"):
+                old = getattr(self, name)
+                grown = np.zeros(max_symbols, dtype=old.dtype)
+                grown[:n] = old
+                setattr(self, name, grown)
+            self.max_symbols = max_symbols
+            self._overflow_warned = False
+        print(f"[TickRingBuffers] Grown to {max_symbols} symbols "
+              f"({self.memory_bytes() / 1e6:.0f} MB at {self.capacity} ticks each).")
+
+    @staticmethod
+    def estimate_bytes(max_symbols: int, capacity: int) -> int:
+        return max_symbols * capacity * SLOT_BYTES
+
+    def memory_bytes(self) -> int:
+        return self.estimate_bytes(self.max_symbols, self.capacity)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, symbol):
+        return symbol in self._index
+
+    def symbols(self):
+        return list(self._index)
+
+    def _row_for(self, symbol) -> Optional[int]:
+        row = self._index.get(symbol)
+        if row is None:
+            if len(self._index) >= self.max_symbols:
+                if not self._overflow_warned:
+                    print(f"[TickRingBuffers] Capacity of {self.max_symbols} symbols reached; ignoring {symbol}.")
+                    self._overflow_warned = True
+                return None
+            row = self._free_rows.pop() if self._free_rows else len(self._index)
+            self._index[symbol] = row
+        return row
+
+    def remove(self, symbol) -> bool:
+        """Drop a symbol's ticks and release its row for reuse."""
+        with self._lock:
+            row = self._index.pop(symbol, None)
+            if row is None:
+                return False
+            self.head[row] = 0
+            self.count[row] = 0
+            self._free_rows.append(row)
+        return True
+
+    def append(self, symbol, t, ltp, volume=0, bid=0.0, ask=0.0):
+        if ltp is None or t is None:
+            return
+        with self._lock:
+            row = self._row_for(symbol)
+            if row is None:
+                return
+            i = self.head[row]
+            self.times[row, i] = t
+            self.ltp[row, i] = ltp
+            self.volume[row, i] = volume or 0
+            self.bid[row, i] = bid or 0.0
+            self.ask[row, i] = ask or 0.0
+            self.head[row] = (i + 1) % self.capacity
+            if self.count[row] < self.capacity:
+                self.count[row] += 1
+            if t > self.last_time:
+                self.last_time = t
+
+    def append_tick(self, tick: dict):
+        """Append a tick dict in the db.TICK_FIELDS layout."""
+        self.append(
+            tick.get("symbol"),
+            tick.get("exch_feed_time"),
+            tick.get("ltp"),
+            tick.get("vol_traded_today"),
+            tick.get("bid_price"),
+            tick.get("ask_price"),
+        )
+
+    def _ordered(self, row, arrays, seconds=None, now=None):
+        """Return chronological copies of the requested arrays for one row, windowed by time."""
+        with self._lock:
+            n = int(self.count[row])
+            head = int(self.head[row])
+            if n < self.capacity:
+                picked = [a[row, :n].copy() for a in (self.times,) + arrays]
+            else:
+                picked = [np.concatenate((a[row, head:], a[row, :head])) for a in (self.times,) + arrays]
+            last_time = self.last_time
+        if seconds is None:
+            seconds = self.max_age_seconds
+        if seconds is not None and n:
+            cutoff = (last_time if now is None else now) - seconds
+            start = int(np.searchsorted(picked[0], cutoff, side="left"))
+            picked = [a[start:] for a in picked]
+        return picked
+
+    def window(self, symbol, seconds=None, now=None) -> Optional[Dict[str, np.ndarray]]:
+        """Chronological (time, ltp, volume, bid, ask) arrays for the symbol's recent window."""
+        row = self._index.get(symbol)
+        if row is None:
+            return None
+        times, ltp, volume, bid, ask = self._ordered(row, (self.ltp, self.volume, self.bid, self.ask), seconds, now)
+        return {"time": times, "ltp": ltp, "volume": volume, "bid": bid, "ask": ask}
+
+    def last_ticks(self, symbol, n: int) -> Optional[Dict[str, np.ndarray]]:
+        w = self.window(symbol, seconds=float("inf"))
+        if w is None:
+            return None
+        return {k: v[-n:] for k, v in w.items()}
+
+    def latest(self, symbol) -> Optional[Tuple[int, float, int, float, float]]:
+        row = self._index.get(symbol)
+        if row is None:
+            return None
+        with self._lock:
+            if not self.count[row]:
+                return None
+            i = (self.head[row] - 1) % self.capacity
+            return (int(self.times[row, i]), float(self.ltp[row, i]), int(self.volume[row, i]),
+                    float(self.bid[row, i]), float(self.ask[row, i]))
+
+    def latest_ticks(self) -> Dict[str, dict]:
+        """Latest tick per symbol, shaped like db.get_latest_ticks() rows (subset of fields)."""
+        with self._lock:
+            rows = list(self._index.items())
+            last = (self.head - 1) % self.capacity
+            out = {}
+            for symbol, row in rows:
+                if not self.count[row]:
+                    continue
+                i = last[row]
+                out[symbol] = {
+                    "symbol": symbol,
+                    "exch_feed_time": int(self.times[row, i]),
+                    "ltp": float(self.ltp[row, i]),
+                    "vol_traded_today": int(self.volume[row, i]),
+                    "bid_price": float(self.bid[row, i]),
+                    "ask_price": float(self.ask[row, i]),
+                }
+        return out
+
+    def range(self, symbol, seconds=None, now=None) -> Tuple[Optional[float], Optional[float]]:
+        """(high, low) of ltp over the window."""
+        row = self._index.get(symbol)
+        if row is None:
+            return (None, None)
+        _, ltp = self._ordered(row, (self.ltp,), seconds, now)
+        if not len(ltp):
+            return (None, None)
+        return (float(ltp.max()), float(ltp.min()))
+
+    def momentum(self, symbol, seconds=None, now=None) -> Optional[float]:
+        """Percent change of ltp from the first to the last tick in the window."""
+        row = self._index.get(symbol)
+        if row is None:
+            return None
+        _, ltp = self._ordered(row, (self.ltp,), seconds, now)
+        if len(ltp) < 2 or ltp[0] == 0:
+            return None
+        return float((ltp[-1] - ltp[0]) / ltp[0] * 100.0)
+
+    def volume_traded(self, symbol, seconds=None, now=None) -> Optional[int]:
+        """Volume traded within the window, from the cumulative vol_traded_today."""
+        row = self._index.get(symbol)
+        if row is None:
+            return None
+        _, volume = self._ordered(row, (self.volume,), seconds, now)
+        if len(volume) < 2:
+            return 0
+        return int(volume[-1] - volume[0])
+
+    def spread_stats(self, symbol, seconds=None, now=None) -> Optional[Dict[str, float]]:
+        """Mean/max/last bid-ask spread over ticks with a two-sided quote."""
+        row = self._index.get(symbol)
+        if row is None:
+            return None
+        _, bid, ask = self._ordered(row, (self.bid, self.ask), seconds, now)
+        quoted = (bid > 0) & (ask > 0)
+        if not quoted.any():
+            return None
+        spread = ask[quoted] - bid[quoted]
+        return {"mean": float(spread.mean()), "max": float(spread.max()), "last": float(spread[-1])}
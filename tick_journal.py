@@ -0,0 +1,359 @@
+"""
+Crash-safe write-ahead journal for raw ticks.
+
+The collector appends every tick to a memory-mapped, preallocated segment
+file instead of an in-memory queue; JournaledTickDBWorker tails the journal,
+inserts into SQLite and then persists its read cursor. A process crash loses
+nothing that reached the mapping (the page cache outlives the process), a
+background flusher msyncs every flush_interval seconds against OS crashes,
+and ticks past the cursor are replayed into SQLite on the next start. Since
+ticks are UNIQUE(symbol, exch_feed_time) and inserted with OR IGNORE, replaying
+a batch that was committed just before the cursor was saved is harmless.
+
+Record layout (little endian, padded to 8 bytes):
+    u32 length | u32 crc32(payload) | payload
+A length of 0 means no more data yet; ROTATE means continue in the next segment.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Callable, List, Optional, Tuple
+
+import latency
+import metrics
+from db import DB_PATH, TickDBWorker, _connect, checkpoint
+from paths import JOURNAL_DIR
+
+SEGMENT_SIZE = 64 * 1024 * 1024
+HEADER = struct.Struct("<II")
+ROTATE = 0xFFFFFFFF
+# Longest JournaledTickDBWorker.stop() waits for the final flush; anything left stays in the journal
+STOP_TIMEOUT = 10.0
+
+# (field, struct code) in db.TICK_FIELDS order, excluding symbol
+NUMERIC_FIELDS = (
+    ("exch_feed_time", "q"), ("ltp", "d"), ("vol_traded_today", "q"), ("last_traded_time", "q"),
+    ("bid_size", "q"), ("ask_size", "q"), ("bid_price", "d"), ("ask_price", "d"),
+    ("tot_buy_qty", "q"), ("tot_sell_qty", "q"), ("avg_trade_price", "d"),
+    ("lower_ckt", "d"), ("upper_ckt", "d"), ("received_time", "q"),
+)
+# Numeric fields, enqueue wall time and the two latency stamps, null mask, symbol length
+PAYLOAD = struct.Struct("<" + "".join(code for _, code in NUMERIC_FIELDS) + "dddHB")
+_CASTS = tuple(int if code == "q" else float for _, code in NUMERIC_FIELDS)
+
+Position = Tuple[int, int]  # (segment number, byte offset)
+
+
+def _segment_path(directory: str, number: int) -> str:
+    return os.path.join(directory, f"segment_{number:08d}.log")
+
+
+def _list_segments(directory: str) -> List[int]:
+    numbers = []
+    for name in os.listdir(directory):
+        if name.startswith("segment_") and name.endswith(".log"):
+            numbers.append(int(name[8:-4]))
+    return sorted(numbers)
+
+
+def _payload(buf, offset: int, length: int) -> bytes:
+    """The payload of the record at offset, without its padding."""
+    start = offset + HEADER.size
+    symbol_len = buf[start + PAYLOAD.size - 1] if length >= HEADER.size + PAYLOAD.size else 0
+    return buf[start:min(offset + length, start + PAYLOAD.size + symbol_len)]
+
+
+def encode_tick(tick: dict, enqueued_wall: float) -> bytes:
+    values = []
+    nulls = 0
+    for i, ((field, _), cast) in enumerate(zip(NUMERIC_FIELDS, _CASTS)):
+        value = tick.get(field)
+        if value is None:
+            nulls |= 1 << i
+            values.append(cast(0))
+        else:
+            values.append(cast(value))
+    symbol = (tick.get("symbol") or "").encode("utf-8")[:255]
+    payload = PAYLOAD.pack(*values, enqueued_wall, tick.get(latency.RECEIVED_KEY) or 0.0,
+                           tick.get(latency.ENQUEUED_KEY) or 0.0, nulls, len(symbol)) + symbol
+    length = HEADER.size + len(payload)
+    padding = -length % 8
+    return HEADER.pack(length + padding, zlib.crc32(payload)) + payload + b"\0" * padding
+
+
+def decode_tick(payload: bytes, stamps_since: Optional[float] = None) -> dict:
+    """Decode a payload. Latency stamps are kept only for ticks enqueued at or after stamps_since (this process)."""
+    unpacked = PAYLOAD.unpack_from(payload, 0)
+    n = len(NUMERIC_FIELDS)
+    nulls = unpacked[n + 3]
+    symbol_len = unpacked[n + 4]
+    tick = {"symbol": payload[PAYLOAD.size:PAYLOAD.size + symbol_len].decode("utf-8")}
+    for i, (field, _) in enumerate(NUMERIC_FIELDS):
+        tick[field] = None if nulls & (1 << i) else unpacked[i]
+    if stamps_since is not None and unpacked[n] >= stamps_since:
+        if unpacked[n + 1]:
+            tick[latency.RECEIVED_KEY] = unpacked[n + 1]
+        if unpacked[n + 2]:
+            tick[latency.ENQUEUED_KEY] = unpacked[n + 2]
+    return tick
+
+
+class TickJournal:
+    """Append side: thread-safe appends into the current mmap'd segment, msync'd periodically."""
+
+    def __init__(self, directory: str = JOURNAL_DIR, segment_size: int = SEGMENT_SIZE, flush_interval: float = 0.5):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+        self.opened_at = time.time()
+        self.appended = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stop_event = threading.Event()
+        segments = _list_segments(directory)
+        self.segment = segments[-1] if segments else 0
+        self._mm = self._open_segment(self.segment)
+        self.offset = self._find_tail()
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+    def _open_segment(self, number: int) -> mmap.mmap:
+        path = _segment_path(self.directory, number)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < self.segment_size:
+                if hasattr(os, "posix_fallocate"):
+                    os.posix_fallocate(fd, 0, self.segment_size)
+                else:
+                    os.ftruncate(fd, self.segment_size)
+            return mmap.mmap(fd, self.segment_size)
+        finally:
+            os.close(fd)
+
+    def _find_tail(self) -> int:
+        """Offset after the last complete record of the current segment (resuming after a restart)."""
+        offset = 0
+        while offset + HEADER.size <= self.segment_size:
+            length, crc = HEADER.unpack_from(self._mm, offset)
+            if length == 0 or length == ROTATE or offset + length > self.segment_size:
+                break
+            if length < HEADER.size + PAYLOAD.size or zlib.crc32(_payload(self._mm, offset, length)) != crc:
+                break
+            offset += length
+        if offset + HEADER.size <= self.segment_size and HEADER.unpack_from(self._mm, offset)[0] == ROTATE:
+            # Crashed between the rotate marker and switching to the next segment
+            mm = self._open_segment(self.segment + 1)
+            self._mm.close()
+            self._mm = mm
+            self.segment += 1
+            return 0
+        # Zero anything after the tail (a torn record) so readers stop there
+        if offset < self.segment_size:
+            end = min(self.segment_size, offset + 65536)
+            self._mm[offset:end] = b"\0" * (end - offset)
+        return offset
+
+    def append(self, tick: dict):
+        record = encode_tick(tick, time.time())
+        with self._lock:
+            if self.offset + len(record) > self.segment_size:
+                self._rotate()
+            start = self.offset
+            # Body first, length last, so a reader never sees a partial record
+            self._mm[start + 4:start + len(record)] = record[4:]
+            self._mm[start:start + 4] = record[:4]
+            self.offset += len(record)
+            self.appended += 1
+            self._dirty = True
+
+    def _rotate(self):
+        # Open the next segment first: if that fails (e.g. disk full) the current
+        # segment stays mapped and usable, and append() raises to the caller
+        mm = self._open_segment(self.segment + 1)
+        if self.offset + 4 <= self.segment_size:
+            struct.pack_into("<I", self._mm, self.offset, ROTATE)
+        self._mm.flush()
+        self._mm.close()
+        self._mm = mm
+        self.segment += 1
+        self.offset = 0
+
+    def position(self) -> Position:
+        return self.segment, self.offset
+
+    def flush(self):
+        with self._lock:
+            if self._dirty:
+                self._mm.flush()
+                self._dirty = False
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print("[TickJournal] Flush failed:", e)
+
+    def close(self):
+        self._stop_event.set()
+        self._flusher.join(timeout=2)
+        with self._lock:
+            self._mm.flush()
+            self._mm.close()
+
+
+class JournalReader:
+    """Read side with a cursor persisted in cursor.json; commit() advances it and drops consumed segments."""
+
+    def __init__(self, directory: str = JOURNAL_DIR):
+        self.directory = directory
+        self.cursor_path = os.path.join(directory, "cursor.json")
+        self.segment, self.offset = self._load_cursor()
+        self._mm = None
+        self._mm_segment = None
+        self.consumed = 0
+
+    def _load_cursor(self) -> Position:
+        try:
+            with open(self.cursor_path, encoding="utf-8") as f:
+                data = json.load(f)
+            return int(data["segment"]), int(data["offset"])
+        except (OSError, ValueError, KeyError):
+            segments = _list_segments(self.directory)
+            return (segments[0] if segments else 0), 0
+
+    def _map(self, number: int) -> bool:
+        if self._mm_segment == number:
+            return True
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        path = _segment_path(self.directory, number)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return False
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mm_segment = number
+        return True
+
+    def read(self, max_records: int = 1000, stamps_since: Optional[float] = None) -> Tuple[List[dict], Position]:
+        """Up to max_records ticks after the cursor, and the position after them (pass to commit())."""
+        ticks = []
+        segment, offset = self.segment, self.offset
+        while len(ticks) < max_records:
+            if not self._map(segment):
+                break
+            size = len(self._mm)
+            if offset + HEADER.size > size:
+                length = ROTATE
+            else:
+                length, crc = HEADER.unpack_from(self._mm, offset)
+            if length == ROTATE:
+                if not os.path.exists(_segment_path(self.directory, segment + 1)):
+                    break
+                segment, offset = segment + 1, 0
+                continue
+            if length == 0 and os.path.exists(_segment_path(self.directory, segment + 1)):
+                # The writer created the next segment but stopped before the rotate marker
+                segment, offset = segment + 1, 0
+                continue
+            if length == 0 or offset + length > size:
+                break
+            payload = _payload(self._mm, offset, length)
+            if zlib.crc32(payload) != crc:
+                print(f"[JournalReader] Corrupt record at segment {segment} offset {offset}; skipping to next segment.")
+                segment, offset = segment + 1, 0
+                continue
+            ticks.append(decode_tick(payload, stamps_since))
+            offset += length
+        return ticks, (segment, offset)
+
+    def commit(self, position: Position):
+        previous = self.segment
+        self.segment, self.offset = position
+        tmp = self.cursor_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"segment": self.segment, "offset": self.offset}, f)
+        os.replace(tmp, self.cursor_path)
+        if self.segment > previous:
+            for number in _list_segments(self.directory):
+                if number < self.segment:
+                    try:
+                        os.remove(_segment_path(self.directory, number))
+                    except OSError:
+                        pass
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+            self._mm_segment = None
+
+
+class JournaledTickDBWorker(TickDBWorker):
+    """
+    TickDBWorker whose put() appends to a TickJournal; the worker thread tails
+    the journal, commits batches to SQLite, then advances the persisted cursor
+    and calls on_commit(ticks, position). Anything left in the journal from a
+    previous run is replayed first.
+    """
+
+    def __init__(self, db_path=DB_PATH, journal_dir: str = JOURNAL_DIR, max_batch: int = 1000,
+                 poll_interval: float = 0.05, on_commit: Optional[Callable[[List[dict], Position], None]] = None,
+                 label="ticks"):
+        super().__init__(db_path=db_path, batch_size=max_batch, label=label)
+        self.journal = TickJournal(journal_dir)
+        self.reader = JournalReader(journal_dir)
+        self.poll_interval = poll_interval
+        self.on_commit = on_commit
+        self._stopping = threading.Event()
+        metrics.DB_QUEUE_DEPTH.labels(label).set_function(lambda: max(0, self.journal.appended - self.reader.consumed))
+
+    def put(self, tick):
+        self.journal.append(tick)
+
+    def run(self):
+        conn = _connect(self.db_path)
+        if (self.reader.segment, self.reader.offset) < self.journal.position():
+            print(f"[JournaledTickDBWorker] Replaying journal from segment {self.reader.segment} "
+                  f"offset {self.reader.offset} to {self.journal.position()}.")
+        while True:
+            checkpoint(self._profile_name)
+            stopping = self._stopping.is_set()
+            ticks, position = self.reader.read(self.batch_size, stamps_since=self.journal.opened_at)
+            if ticks:
+                try:
+                    self._flush(ticks, conn)
+                except Exception as e:
+                    # Cursor not advanced: the batch is retried (or replayed after a restart)
+                    if stopping or self._stopping.is_set():
+                        print("[JournaledTickDBWorker] Insert failed while stopping; batch left in the journal:", e)
+                        break
+                    print("[JournaledTickDBWorker] Insert failed, retrying:", e)
+                    self._stopping.wait(1.0)
+                    continue
+                self.reader.commit(position)
+                self.reader.consumed += len(ticks)
+                if self.on_commit is not None:
+                    try:
+                        self.on_commit(ticks, position)
+                    except Exception as e:
+                        print("[JournaledTickDBWorker] on_commit callback failed:", e)
+                continue
+            if stopping:
+                break
+            time.sleep(self.poll_interval)
+        conn.close()
+        self.reader.close()
+        self.journal.close()
+
+    def stop(self, timeout: Optional[float] = STOP_TIMEOUT):
+        self._stopping.set()
+        self.join(timeout)
+        if self.is_alive():
+            print(f"[JournaledTickDBWorker] Still flushing after {timeout}s; unflushed ticks stay in the journal.")
@@ -0,0 +1,215 @@
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from paths import HOLIDAYS_FILE_PATH
+
+# IST is a fixed UTC+05:30 offset (no DST), so day/period boundaries can be computed
+# with integer arithmetic on epoch seconds.
+IST_OFFSET = 19800
+SECONDS_PER_DAY = 86400
+IST = timezone(timedelta(seconds=IST_OFFSET))
+
+SESSION_START = "09:14:58"
+SESSION_END = "15:30:05"
+
+
+def ist_day_number(epoch: float) -> int:
+    """Days since 1970-01-01 in IST for the given epoch."""
+    return int((epoch + IST_OFFSET) // SECONDS_PER_DAY)
+
+
+def ist_day_start(epoch: float) -> int:
+    """Epoch of IST midnight on the day containing epoch."""
+    return ist_day_number(epoch) * SECONDS_PER_DAY - IST_OFFSET
+
+
+def ist_midnight_epoch(d: date) -> int:
+    return (d - date(1970, 1, 1)).days * SECONDS_PER_DAY - IST_OFFSET
+
+
+def parse_hms(value: str) -> int:
+    """'HH:MM:SS' -> seconds after midnight."""
+    h, m, s = (int(part) for part in value.split(":"))
+    return h * 3600 + m * 60 + s
+
+
+def load_holidays(path: str = HOLIDAYS_FILE_PATH) -> List[date]:
+    """
+    Read exchange holidays, one YYYY-MM-DD per line. Anything after the date
+    (e.g. a description) and lines starting with '#' are ignored.
+    """
+    holidays = []
+    if not os.path.exists(path):
+        return holidays
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                holidays.append(datetime.strptime(line[:10], "%Y-%m-%d").date())
+            except ValueError:
+                print(f"[TradingCalendar] Ignoring malformed holiday line: {line}")
+    return holidays
+
+
+class TradingCalendar:
+    """
+    Precomputed session and period boundaries (IST epochs) for one calendar year.
+
+    Everything is indexed by the day's offset within the year, so is_open,
+    session_bounds and period_bounds are list lookups with no datetime parsing.
+    """
+
+    def __init__(self, year: int, session_start: str = SESSION_START, session_end: str = SESSION_END,
+                 holidays: Optional[List[date]] = None):
+        self.year = year
+        self.session_start = session_start
+        self.session_end = session_end
+        if holidays is None:
+            holidays = load_holidays()
+        self.holidays = sorted(d for d in set(holidays) if d.year == year)
+        holiday_set = set(self.holidays)
+
+        first = date(year, 1, 1)
+        n_days = (date(year + 1, 1, 1) - first).days
+        self.first_day = (first - date(1970, 1, 1)).days
+        self.start_epoch = ist_midnight_epoch(first)
+        self.end_epoch = self.start_epoch + n_days * SECONDS_PER_DAY - 1
+
+        open_offset = parse_hms(session_start)
+        close_offset = parse_hms(session_end)
+        self._sessions: List[Optional[Tuple[int, int]]] = []
+        self._weeks: List[Tuple[int, int]] = []
+        self._months: List[Tuple[int, int]] = []
+        month_bounds: Dict[int, Tuple[int, int]] = {}
+        for i in range(n_days):
+            d = first + timedelta(days=i)
+            midnight = self.start_epoch + i * SECONDS_PER_DAY
+            if d.weekday() < 5 and d not in holiday_set:
+                self._sessions.append((midnight + open_offset, midnight + close_offset))
+            else:
+                self._sessions.append(None)
+            monday = midnight - d.weekday() * SECONDS_PER_DAY
+            self._weeks.append((monday, monday + 7 * SECONDS_PER_DAY - 1))
+            if d.month not in month_bounds:
+                next_month = date(year + 1, 1, 1) if d.month == 12 else date(year, d.month + 1, 1)
+                month_bounds[d.month] = (midnight, ist_midnight_epoch(next_month) - 1)
+            self._months.append(month_bounds[d.month])
+
+    def covers(self, epoch: float) -> bool:
+        return self.start_epoch <= epoch <= self.end_epoch
+
+    def _index(self, epoch: float) -> int:
+        return ist_day_number(epoch) - self.first_day
+
+    def is_trading_day(self, epoch: Optional[float] = None) -> bool:
+        if epoch is None:
+            epoch = time.time()
+        return self._sessions[self._index(epoch)] is not None
+
+    def is_holiday(self, epoch: Optional[float] = None) -> bool:
+        """True for exchange holidays falling on weekdays."""
+        if epoch is None:
+            epoch = time.time()
+        i = self._index(epoch)
+        return self._sessions[i] is None and (self.first_day + i + 3) % 7 < 5
+
+    def session_bounds(self, epoch: Optional[float] = None) -> Optional[Tuple[int, int]]:
+        """(open, close) epochs of the session on the epoch's IST date, or None if not a trading day."""
+        if epoch is None:
+            epoch = time.time()
+        return self._sessions[self._index(epoch)]
+
+    def is_open(self, epoch: Optional[float] = None) -> bool:
+        if epoch is None:
+            epoch = time.time()
+        bounds = self._sessions[self._index(epoch)]
+        return bounds is not None and bounds[0] <= epoch <= bounds[1]
+
+    def is_past_close(self, epoch: Optional[float] = None) -> bool:
+        """True once today's session has closed, or all day when today is not a trading day."""
+        if epoch is None:
+            epoch = time.time()
+        bounds = self._sessions[self._index(epoch)]
+        return bounds is None or epoch >= bounds[1]
+
+    def period_bounds(self, period: str, epoch: Optional[float] = None) -> Tuple[int, int]:
+        """Inclusive (start, end) epochs of the calendar week (Mon-Sun) or month containing epoch."""
+        if epoch is None:
+            epoch = time.time()
+        if period == "week":
+            return self._weeks[self._index(epoch)]
+        elif period == "month":
+            return self._months[self._index(epoch)]
+        raise ValueError("period must be 'week' or 'month'")
+
+    def trading_days(self) -> List[int]:
+        """Session open epochs of every trading day in the year."""
+        return [s[0] for s in self._sessions if s is not None]
+
+    def next_session(self, epoch: Optional[float] = None) -> Optional[Tuple[int, int]]:
+        """The first session (in this year) whose close is at or after epoch."""
+        if epoch is None:
+            epoch = time.time()
+        for i in range(max(self._index(epoch), 0), len(self._sessions)):
+            bounds = self._sessions[i]
+            if bounds is not None and bounds[1] >= epoch:
+                return bounds
+        return None
+
+
+_calendars: Dict[Tuple[int, str, str], TradingCalendar] = {}
+_latest: Dict[Tuple[str, str], TradingCalendar] = {}
+_lock = threading.Lock()
+
+
+def get_calendar(epoch: Optional[float] = None, session_start: str = SESSION_START,
+                 session_end: str = SESSION_END) -> TradingCalendar:
+    """Shared calendar covering epoch (default: now). Built once per year and session window."""
+    if epoch is None:
+        epoch = time.time()
+    cal = _latest.get((session_start, session_end))
+    if cal is not None and cal.covers(epoch):
+        return cal
+    year = datetime.fromtimestamp(epoch, IST).year
+    with _lock:
+        key = (year, session_start, session_end)
+        cal = _calendars.get(key)
+        if cal is None:
+            cal = TradingCalendar(year, session_start, session_end)
+            _calendars[key] = cal
+            if not cal.holidays and year >= datetime.now(IST).year:
+                print(f"[TradingCalendar] WARNING: no {year} holidays in {HOLIDAYS_FILE_PATH}; "
+                      f"every weekday will be treated as a trading day. Add them from the exchange circular.")
+        _latest[(session_start, session_end)] = cal
+    return cal
+
+
+def reload_holidays():
+    """Drop cached calendars so the next lookup re-reads the holiday file."""
+    with _lock:
+        _calendars.clear()
+        _latest.clear()
+
+
+def is_market_open(session_start: str = SESSION_START, session_end: str = SESSION_END,
+                   epoch: Optional[float] = None) -> bool:
+    if epoch is None:
+        epoch = time.time()
+    return get_calendar(epoch, session_start, session_end).is_open(epoch)
+
+
+def next_session(epoch: Optional[float] = None, session_start: str = SESSION_START,
+                 session_end: str = SESSION_END) -> Optional[Tuple[int, int]]:
+    """Next (open, close) session at or after epoch, looking into the following year if needed."""
+    if epoch is None:
+        epoch = time.time()
+    cal = get_calendar(epoch, session_start, session_end)
+    bounds = cal.next_session(epoch)
+    if bounds is None:
+        bounds = get_calendar(cal.end_epoch + 1, session_start, session_end).next_session(cal.end_epoch + 1)
+    return bounds
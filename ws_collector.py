@@ -1,17 +1,26 @@
 import os
 import threading
+import time
 from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
-from fyers_apiv3.FyersWebsocket import data_ws
-from db import init_db, TickDBWorker
+from db import init_db, LiteTickDBWorker, TickDBWorker
+from depth_store import DEPTH_DB_PATH, DEPTH_SYMBOLS_FILE, DepthDBWorker
 from config import config
+import latency
+import metrics
+import profiling
+from tick_journal import JournaledTickDBWorker
 
 # --- Config ---
 SYMBOLS_FILE = "symbols.txt"
+LITE_SYMBOLS_FILE = "symbols_lite.txt"  # LTP-only symbols (lite profile)
+MAX_SYMBOLS_PER_SOCKET = 5000
 DB_PATH = "ticks_data.db"
 TZ = ZoneInfo("Asia/Kolkata")
 RECEIVED_TIME_FIELD = "received_time"  # Now saving as IST epoch
+# Route ticks through the crash-safe journal (tick_journal.py); TICK_JOURNAL=0 uses the in-memory queue
+USE_TICK_JOURNAL = os.getenv("TICK_JOURNAL", "1") != "0"
 
 # --- Load .env and token ---
 load_dotenv()
@@ -32,35 +41,97 @@ def get_ist_epoch(dt_utc):
 
 # --- WebSocket Collector Class ---
 class TickCollector:
-    def __init__(self, symbols, ws_access_token, db_worker):
+    LITEMODE = False
+
+    def __init__(self, symbols, ws_access_token, db_worker, tick_buffers=None, latest_ticks=None,
+                 depth_symbols=None, depth_worker=None, circuit_bands=None, indicators=None):
         self.symbols = symbols
         self.ws_access_token = ws_access_token
         self.connected = threading.Event()
         self.stopped = threading.Event()
         self.tick_count = 0
+        self.put_errors = 0  # ticks the DB worker (journal) refused; screening state still sees them
         self.db_worker = db_worker
+        self.tick_buffers = tick_buffers  # Optional TickRingBuffers for in-memory window queries
+        self.latest_ticks = latest_ticks  # Optional LatestTickStore for in-process price views
+        self.circuit_bands = circuit_bands  # Optional CircuitBandStore fed from each tick's lower/upper_ckt
+        self.indicators = indicators  # Optional indicators.IndicatorEngine updated per tick
+        self.fyers = None
+        # Activity tracking for CollectorSupervisor (wall-clock epoch seconds)
+        self.started_time = None
+        self.first_tick_time = None
+        self.last_tick_time = None
+        self.symbol_last_tick = {}
+        self.symbol_tick_counts = {}
+        self.lag_ewma = None  # received_time - exch_feed_time, smoothed
+        self._ticks_metric = metrics.TICKS_RECEIVED.labels("ws")
+        # Optional depth mode: DepthUpdate for a subset of symbols, written by a separate DepthDBWorker
+        self.depth_symbols = list(depth_symbols or [])
+        self.depth_worker = depth_worker
+        self.depth_count = 0
+        self._depth_metric = metrics.TICKS_RECEIVED.labels("depth")
 
     def onopen(self):
         print("[WebSocket Open] Subscribing to symbols...")
-        fyers.subscribe(symbols=self.symbols, data_type="SymbolUpdate")
+        self.fyers.subscribe(symbols=self.symbols, data_type="SymbolUpdate")
+        if self.depth_symbols and self.depth_worker is not None:
+            print(f"[WebSocket Open] Subscribing to depth for {len(self.depth_symbols)} symbols...")
+            self.fyers.subscribe(symbols=self.depth_symbols, data_type="DepthUpdate")
         self.connected.set()
 
     def onmessage(self, message):
         print("[WebSocket Message]", message)  # Streaming print remains
+        profiling.checkpoint("TickCollector.onmessage")
         try:
             if not isinstance(message, dict):
                 print("Received non-dict message, skipping:", message)
                 return
+            if message.get("type") == "dp":
+                if self.depth_worker is not None:
+                    self.depth_worker.put(message)
+                    self.depth_count += 1
+                    self._depth_metric.inc()
+                return
             tick = {k: message.get(k) for k in [
                 "symbol", "exch_feed_time", "ltp", "vol_traded_today", "last_traded_time",
                 "bid_size", "ask_size", "bid_price", "ask_price", "tot_buy_qty",
                 "tot_sell_qty", "avg_trade_price", "lower_ckt", "upper_ckt"
             ]}
-            now_utc = datetime.utcnow().replace(tzinfo=timezone.utc)
-            tick[RECEIVED_TIME_FIELD] = get_ist_epoch(now_utc)
+            now = time.time()
+            # IST epoch seconds coincide with Unix epoch seconds (see get_ist_epoch)
+            tick[RECEIVED_TIME_FIELD] = int(now)
+            tracker = latency.TRACKER if latency.TRACKER.enabled else None
+            if tracker:
+                tracker.received(tick, now, time.monotonic())
+            symbol = tick["symbol"]
+            if self.first_tick_time is None:
+                self.first_tick_time = now
+            self.last_tick_time = now
+            self.symbol_last_tick[symbol] = now
+            self.symbol_tick_counts[symbol] = self.symbol_tick_counts.get(symbol, 0) + 1
+            if tick["exch_feed_time"]:
+                lag = now - tick["exch_feed_time"]
+                self.lag_ewma = lag if self.lag_ewma is None else 0.9 * self.lag_ewma + 0.1 * lag
             # Send tick to DB worker (queue) for fast, non-blocking insert
-            self.db_worker.put(tick)
+            if tracker:
+                tracker.enqueued(tick)
+            try:
+                self.db_worker.put(tick)
+            except Exception as e:
+                # e.g. the journal could not rotate (disk full): keep the in-memory views current
+                self.put_errors += 1
+                if self.put_errors == 1 or self.put_errors % 1000 == 0:
+                    print(f"[Tick Persist Error] {e} ({self.put_errors} ticks not persisted)")
+            if self.tick_buffers is not None:
+                self.tick_buffers.append_tick(tick)
+            if self.latest_ticks is not None:
+                self.latest_ticks.update(tick, message.get("prev_close_price"))
+            if self.circuit_bands is not None:
+                self.circuit_bands.update(symbol, tick["lower_ckt"], tick["upper_ckt"])
+            if self.indicators is not None:
+                self.indicators.update_tick(tick)
             self.tick_count += 1
+            self._ticks_metric.inc()
         except Exception as e:
             print("[Tick Insert Error]", e)
 
@@ -71,13 +142,43 @@ class TickCollector:
         print("[WebSocket Closed]", message)
         self.stopped.set()
 
+    def resubscribe(self, symbols):
+        """Unsubscribe and re-subscribe symbols on the live socket (used for per-symbol stalls)."""
+        if self.fyers is None or not self.connected.is_set():
+            return
+        self.fyers.unsubscribe(symbols=symbols, data_type="SymbolUpdate")
+        self.fyers.subscribe(symbols=symbols, data_type="SymbolUpdate")
+
+    def add_symbols(self, symbols):
+        """Subscribe additional symbols on the live socket (or at the next onopen if not connected yet)."""
+        current = set(self.symbols)
+        new = [s for s in symbols if s not in current]
+        if not new:
+            return
+        self.symbols = self.symbols + new
+        if self.fyers is not None and self.connected.is_set():
+            self.fyers.subscribe(symbols=new, data_type="SymbolUpdate")
+
+    def remove_symbols(self, symbols):
+        """Unsubscribe symbols on the live socket and forget their activity stats."""
+        gone = set(symbols) & set(self.symbols)
+        if not gone:
+            return
+        self.symbols = [s for s in self.symbols if s not in gone]
+        for symbol in gone:
+            self.symbol_last_tick.pop(symbol, None)
+            self.symbol_tick_counts.pop(symbol, None)
+        if self.fyers is not None and self.connected.is_set():
+            self.fyers.unsubscribe(symbols=list(gone), data_type="SymbolUpdate")
+
     def run(self):
-        global fyers
         print("Starting TickCollector with", len(self.symbols), "symbols")
-        fyers = data_ws.FyersDataSocket(
+        self.started_time = time.time()
+        from fyers_apiv3.FyersWebsocket import data_ws
+        self.fyers = data_ws.FyersDataSocket(
             access_token=self.ws_access_token,
             log_path="",
-            litemode=False,
+            litemode=self.LITEMODE,
             write_to_file=False,
             reconnect=True,
             on_connect=self.onopen,
@@ -86,16 +187,80 @@ class TickCollector:
             on_message=self.onmessage,
             reconnect_retry=10
         )
-        fyers.connect()
+        self.fyers.connect()
         self.stopped.wait()
-        fyers.disconnect()
+        self.fyers.disconnect()
 
     def stop(self):
         print("[TickCollector] Stop signal received.")
         self.stopped.set()
 
+class LiteTickCollector(TickCollector):
+    """
+    LTP-only collector for the lite profile: the socket runs in lite mode and
+    each message becomes a (symbol, time, ltp) row for LiteTickDBWorker.
+    """
+    LITEMODE = True
+
+    def __init__(self, symbols, ws_access_token, db_worker, tick_buffers=None, latest_ticks=None, indicators=None):
+        super().__init__(symbols, ws_access_token, db_worker, tick_buffers=tick_buffers, latest_ticks=latest_ticks,
+                         indicators=indicators)
+        self._ticks_metric = metrics.TICKS_RECEIVED.labels("lite")
+
+    def onmessage(self, message):
+        try:
+            if not isinstance(message, dict):
+                return
+            symbol = message.get("symbol")
+            ltp = message.get("ltp")
+            if symbol is None or ltp is None:
+                return
+            now = time.time()
+            t = int(now)
+            if self.first_tick_time is None:
+                self.first_tick_time = now
+            self.last_tick_time = now
+            self.symbol_last_tick[symbol] = now
+            self.db_worker.put((symbol, t, ltp))
+            if self.tick_buffers is not None:
+                self.tick_buffers.append(symbol, t, ltp)
+            if self.latest_ticks is not None or self.indicators is not None:
+                tick = {"symbol": symbol, "ltp": ltp, "exch_feed_time": t, RECEIVED_TIME_FIELD: t}
+                if self.latest_ticks is not None:
+                    self.latest_ticks.update(tick)
+                if self.indicators is not None:
+                    self.indicators.update_tick(tick)
+            self.tick_count += 1
+            self._ticks_metric.inc()
+        except Exception as e:
+            print("[Lite Tick Error]", e)
+
+def start_lite_collectors(ws_access_token, tick_buffers=None, latest_ticks=None, indicators=None, path=LITE_SYMBOLS_FILE):
+    """
+    Start lite-mode sockets for symbols_lite.txt, MAX_SYMBOLS_PER_SOCKET symbols each,
+    sharing one LiteTickDBWorker. Returns (collectors, db_worker, threads), or None without lite symbols.
+    """
+    if not os.path.exists(path):
+        return None
+    full = set(load_symbols()) if os.path.exists(SYMBOLS_FILE) else set()
+    symbols = [s for s in dict.fromkeys(load_symbols(path)) if s not in full]
+    if not symbols:
+        return None
+    db_worker = LiteTickDBWorker(db_path=DB_PATH)
+    db_worker.start()
+    collectors, threads = [], []
+    for i in range(0, len(symbols), MAX_SYMBOLS_PER_SOCKET):
+        collector = LiteTickCollector(symbols[i:i + MAX_SYMBOLS_PER_SOCKET], ws_access_token, db_worker,
+                                      tick_buffers=tick_buffers, latest_ticks=latest_ticks, indicators=indicators)
+        thread = threading.Thread(target=collector.run, daemon=True)
+        thread.start()
+        collectors.append(collector)
+        threads.append(thread)
+    print(f"Lite profile: {len(symbols)} symbols on {len(collectors)} socket(s).")
+    return collectors, db_worker, threads
+
 # --- Main entrypoint ---
-def main(return_collector=False):
+def main(return_collector=False, tick_buffers=None, latest_ticks=None, circuit_bands=None, indicators=None):
     print("=== ws_collector.py started ===")
     config.ensure_tokens_loaded()
     access_token, _ = config.get_tokens()
@@ -118,18 +283,36 @@ def main(return_collector=False):
     if not symbols:
         print("No symbols found in symbols.txt. Aborting.")
         return
+    if len(symbols) > MAX_SYMBOLS_PER_SOCKET:
+        # CollectorManager.update_symbols() spreads the rest over extra sockets
+        print(f"{len(symbols)} symbols exceed {MAX_SYMBOLS_PER_SOCKET} per socket; subscribing the first {MAX_SYMBOLS_PER_SOCKET}.")
+        symbols = symbols[:MAX_SYMBOLS_PER_SOCKET]
 
     # 3. Init DB (if not already)
     init_db(DB_PATH)
     print("Database initialized.")
 
-    # 4. Start DB worker thread
-    db_worker = TickDBWorker(db_path=DB_PATH, batch_size=5)
+    # 4. Start DB worker thread (replays any journaled ticks a crash left uncommitted)
+    if USE_TICK_JOURNAL:
+        db_worker = JournaledTickDBWorker(db_path=DB_PATH)
+    else:
+        db_worker = TickDBWorker(db_path=DB_PATH, batch_size=5)
     db_worker.start()
     print("DB worker thread started.")
 
+    # Optional depth mode for the symbols in symbols_depth.txt
+    depth_symbols, depth_worker = [], None
+    if os.path.exists(DEPTH_SYMBOLS_FILE):
+        depth_symbols = load_symbols(DEPTH_SYMBOLS_FILE)
+    if depth_symbols:
+        depth_worker = DepthDBWorker(db_path=DEPTH_DB_PATH)
+        depth_worker.start()
+        print(f"Depth mode enabled for {len(depth_symbols)} symbols.")
+
     # 5. Start WebSocket collector immediately
-    collector = TickCollector(symbols, ws_access_token, db_worker)
+    collector = TickCollector(symbols, ws_access_token, db_worker, tick_buffers=tick_buffers, latest_ticks=latest_ticks,
+                              depth_symbols=depth_symbols, depth_worker=depth_worker, circuit_bands=circuit_bands,
+                              indicators=indicators)
     ws_thread = threading.Thread(target=collector.run, daemon=True)
     ws_thread.start()
 
@@ -140,8 +323,10 @@ def main(return_collector=False):
     ws_thread.join(timeout=None)
     print(f"WebSocket closed. Total ticks received: {collector.tick_count}")
 
-    # 6. Stop DB worker thread gracefully
+    # 6. Stop DB worker threads gracefully
     db_worker.stop()
+    if depth_worker is not None:
+        depth_worker.stop()
     print("DB worker thread stopped.")
 
 if __name__ == "__main__":
@@ -1,37 +1,30 @@
-import threading
 import time
-from datetime import datetime, timedelta
-from zoneinfo import ZoneInfo
+import trading_calendar
+from job_scheduler import JobScheduler
 
-def run_ws_collector_at_schedule(start_time_str, end_time_str, start_callback, stop_callback):
+def run_ws_collector_at_schedule(start_time_str, end_time_str, start_callback, stop_callback, scheduler=None):
     """
-    Schedules the start_callback to run at start_time_str (IST) and stop_callback at end_time_str (IST).
-    This spawns a background thread and returns immediately.
+    Schedules the start_callback to run at start_time_str (IST) and stop_callback at end_time_str (IST)
+    on every trading day (weekends and exchange holidays are skipped).
+    Starts the JobScheduler thread if needed and returns it, so callers can register further jobs.
     """
-    def scheduler():
-        TZ = ZoneInfo("Asia/Kolkata")
-        START_TIME = datetime.strptime(start_time_str, "%H:%M:%S").time()
-        END_TIME = datetime.strptime(end_time_str, "%H:%M:%S").time()
-        started = False
-        stopped = False
-        warned = False
+    if scheduler is None:
+        scheduler = JobScheduler()
 
-        while True:
-            now_dt = datetime.now(TZ)
-            now = now_dt.time()
-            # Make start_dt timezone-aware
-            start_dt = datetime.combine(now_dt.date(), START_TIME, tzinfo=TZ)
-            delta_to_start = (start_dt - now_dt).total_seconds()
-            if not warned and 0 < delta_to_start <= 60:
-                print("Market data collection session will start in 60 seconds...")
-                warned = True
-            if not started and now >= START_TIME:
-                start_callback()
-                started = True
-            if not stopped and now >= END_TIME:
-                stop_callback()
-                stopped = True
-                break
-            time.sleep(1)
-    thread = threading.Thread(target=scheduler, daemon=True)
-    thread.start()
\ No newline at end of file
+    warn_offset = trading_calendar.parse_hms(start_time_str) - 60
+    warn_time_str = f"{warn_offset // 3600:02d}:{warn_offset % 3600 // 60:02d}:{warn_offset % 60:02d}"
+    scheduler.add_daily_job(
+        "collector_prestart_notice",
+        lambda: print("Market data collection session will start in 60 seconds..."),
+        warn_time_str,
+    )
+    scheduler.add_daily_job("collector_start", start_callback, start_time_str)
+    scheduler.add_daily_job("collector_stop", stop_callback, end_time_str, threaded=True)
+
+    # Launched mid-session: start right away rather than waiting for tomorrow's open
+    if trading_calendar.is_market_open(start_time_str, end_time_str):
+        scheduler.run_once_at("collector_start_now", start_callback, time.time())
+
+    if not scheduler.is_alive():
+        scheduler.start()
+    return scheduler